@@ -0,0 +1,82 @@
+"""
+Benchmark JobStatus.complete() for results of different sizes.
+
+Compares the current single-encode, single-transaction completion with the
+previous path (separate hset calls for status and result, then a publish,
+with the result serialized three times).
+
+Uses the same REDIS_* / KEYDB_* environment variables as the worker:
+
+    python benchmarks/bench_complete.py --repeat 20
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from job_manager_client.job_status import JobStatus
+
+SIZES = {
+    '1KB': 1024,
+    '1MB': 1024 * 1024,
+    '20MB': 20 * 1024 * 1024,
+}
+
+
+def make_result(size):
+    """Build a dict result whose JSON encoding is roughly size bytes."""
+    return {'data': 'x' * max(size - 12, 0)}
+
+
+def legacy_complete(job_status, result):
+    """The completion path before the single-round-trip change."""
+    job_status._update_job('status', 'COMPLETE')
+    job_status._update_job('result', result)
+    str_result = json.dumps(result)
+    message = {
+        'status': 'COMPLETE',
+        'success': True,
+        'timestamp': time.time(),
+        'result_size': len(str_result),
+        'result_key': job_status._status_key
+    }
+    if len(str_result) < 1000000:
+        message['result'] = result
+    job_status._send_status_message(message)
+
+
+def current_complete(job_status, result):
+    job_status.complete(result=result)
+
+
+def measure(complete_func, result, repeat):
+    timings = []
+    for i in range(repeat):
+        job_status = JobStatus(f'bench_complete_{i}')
+        start = time.perf_counter()
+        complete_func(job_status, result)
+        timings.append(time.perf_counter() - start)
+        job_status.keydb_conn.delete(job_status._status_key)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10, help='Completions per size and path')
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES))
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'legacy ms':>12} {'current ms':>12} {'speedup':>8}")
+    for name in args.sizes:
+        result = make_result(SIZES[name])
+        legacy = statistics.median(measure(legacy_complete, result, args.repeat))
+        current = statistics.median(measure(current_complete, result, args.repeat))
+        print(f"{name:>6} {legacy * 1000:>12.3f} {current * 1000:>12.3f} {legacy / current:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
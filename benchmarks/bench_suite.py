@@ -0,0 +1,316 @@
+"""
+Throughput and latency benchmark suite for the worker and job status.
+
+Measures:
+
+- throughput: jobs/sec of a burst worker running no-op tasks
+- latency: p50/p99 from enqueue to the COMPLETE message with a running worker
+- keepalive: CPU cost of the heartbeat scheduler with 1 to 1000 jobs in flight
+- complete: JobStatus.complete() time for results from 1KB to 100MB
+
+Results are written as JSON so runs of different releases can be compared:
+
+    python benchmarks/bench_suite.py --server redis --output results.json
+    python benchmarks/bench_suite.py --server redis --compare results.json
+
+``--server redis`` starts a throwaway redis-server, ``--server fake`` an
+in-process fakeredis server (needs the fakeredis package) and
+``--server env`` (the default) uses the REDIS_* / KEYDB_* environment
+variables like the worker.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import platform
+import threading
+import statistics
+import subprocess
+import multiprocessing
+from pathlib import Path
+from datetime import datetime, timezone
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+BENCHMARKS = ('throughput', 'latency', 'keepalive', 'complete')
+
+# Measured values, as opposed to the parameters recorded next to them
+MEASUREMENTS = ('jobs_per_sec', 'p50_ms', 'p99_ms', 'mean_ms', 'cpu_fraction',
+                'cpu_us_per_keepalive', 'median_ms', 'mb_per_sec')
+
+COMPLETE_SIZES = {
+    '1KB': 1024,
+    '64KB': 64 * 1024,
+    '1MB': 1024 * 1024,
+    '10MB': 10 * 1024 * 1024,
+    '100MB': 100 * 1024 * 1024,
+}
+
+
+def noop_task(params):
+    return {'ok': True}
+
+
+# RQ refuses functions from __main__; the workers call noop_task directly anyway
+NOOP_TASK = 'bench_suite.noop_task'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def start_server(kind):
+    """
+    Start the server to benchmark against and point the connection settings at it.
+
+    Must run before job_manager_client is imported, which reads the settings.
+
+    :return: Function stopping the server
+    """
+    if kind == 'env':
+        return lambda: None
+
+    port = _free_port()
+    if kind == 'redis':
+        binary = shutil.which('redis-server')
+        if binary is None:
+            raise RuntimeError("redis-server not found on PATH")
+        process = subprocess.Popen(
+            [binary, '--port', str(port), '--save', '', '--appendonly', 'no'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        stop = process.terminate
+    else:
+        import socketserver
+        from fakeredis import TcpFakeServer
+        # Small replies would otherwise wait for delayed ACKs
+        socketserver.StreamRequestHandler.disable_nagle_algorithm = True
+        server = TcpFakeServer(('127.0.0.1', port), server_type='redis')
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stop = server.shutdown
+    _wait_for_port(port)
+
+    for prefix in ('REDIS', 'KEYDB'):
+        os.environ[f'{prefix}_HOST'] = '127.0.0.1'
+        os.environ[f'{prefix}_PORT'] = str(port)
+        os.environ[f'{prefix}_PASSWORD'] = ''
+    return stop
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def bench_throughput(jobs, prefetch):
+    """Jobs/sec of a burst worker running no-op tasks."""
+    from job_manager_client.worker import start_worker
+    from job_manager_client.utils.connections import queue
+
+    queue.empty()
+    for i in range(jobs):
+        queue.enqueue(NOOP_TASK, job_id=f'bench_throughput_{i}', args=({'i': i},))
+    started = time.perf_counter()
+    start_worker(noop_task, prefetch=prefetch)
+    elapsed = time.perf_counter() - started
+    return {'jobs': jobs, 'prefetch': prefetch, 'seconds': elapsed, 'jobs_per_sec': jobs / elapsed}
+
+
+def _latency_worker():
+    from job_manager_client.worker import start_worker
+    start_worker(noop_task, burst=False, dequeue_timeout=1, max_idle_time=2)
+
+
+def bench_latency(jobs):
+    """Enqueue to COMPLETE message latency with a running worker, one job at a time."""
+    from job_manager_client.utils.connections import queue, redis_conn
+
+    queue.empty()
+    worker = multiprocessing.get_context('fork').Process(target=_latency_worker)
+    worker.start()
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    latencies = []
+    try:
+        # Warm up the worker and the connections
+        for i in range(-5, jobs):
+            job_id = f'bench_latency_{i}'
+            pubsub.subscribe(f'job:{job_id}')
+            started = time.perf_counter()
+            queue.enqueue(NOOP_TASK, job_id=job_id, args=({'i': i},))
+            deadline = started + 10
+            while True:
+                # Also None for the subscribe confirmation
+                message = pubsub.get_message(timeout=1)
+                if message is not None and json.loads(message['data']).get('status') == 'COMPLETE':
+                    break
+                if time.perf_counter() > deadline:
+                    raise RuntimeError(f"No COMPLETE message for {job_id}")
+            if i >= 0:
+                latencies.append(time.perf_counter() - started)
+            pubsub.unsubscribe(f'job:{job_id}')
+    finally:
+        pubsub.close()
+        worker.join()
+
+    return {
+        'jobs': jobs,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000,
+    }
+
+
+def bench_keepalive(counts, duration):
+    """CPU time the heartbeat scheduler uses for a number of in-flight jobs."""
+    from job_manager_client.job_status import JobStatus
+    from job_manager_client.heartbeat import HeartbeatScheduler
+    from job_manager_client.metrics import metrics
+
+    results = []
+    for count in counts:
+        scheduler = HeartbeatScheduler()
+        statuses = [JobStatus(f'bench_keepalive_{i}') for i in range(count)]
+        sent_before = metrics.keepalives_sent.value
+        cpu_before = time.process_time()
+        for job_status in statuses:
+            scheduler.register(job_status)
+        time.sleep(duration)
+        for job_status in statuses:
+            scheduler.unregister(job_status)
+        cpu = time.process_time() - cpu_before
+        sent = metrics.keepalives_sent.value - sent_before
+        results.append({
+            'jobs': count,
+            'keepalives': sent,
+            'cpu_fraction': cpu / duration,
+            'cpu_us_per_keepalive': cpu / sent * 1e6 if sent else None,
+        })
+    return results
+
+
+def bench_complete(sizes, repeat):
+    """JobStatus.complete() time for results of different sizes."""
+    from job_manager_client.job_status import JobStatus
+
+    results = []
+    for name in sizes:
+        size = COMPLETE_SIZES[name]
+        result = {'data': 'x' * max(size - 12, 0)}
+        # Fewer rounds for the large sizes
+        rounds = max(1, min(repeat, repeat * 1024 * 1024 // size))
+        timings = []
+        for i in range(rounds):
+            job_status = JobStatus(f'bench_complete_{i}')
+            started = time.perf_counter()
+            job_status.complete(result=result)
+            timings.append(time.perf_counter() - started)
+            keys = [job_status._status_key] + job_status.keydb_conn.keys(f'job:bench_complete_{i}:chunk:*')
+            job_status.keydb_conn.delete(*keys)
+        results.append({
+            'size': name,
+            'bytes': size,
+            'rounds': rounds,
+            'median_ms': statistics.median(timings) * 1000,
+            'mb_per_sec': size / statistics.median(timings) / 1e6,
+        })
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=Path(__file__).parent, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(value, prefix=''):
+    """Flatten nested results to {'complete.1MB.median_ms': 1.2, ...} for comparison."""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = ((str(entry.get('size', entry.get('jobs', index))), entry) for index, entry in enumerate(value))
+    else:
+        return {prefix: value} if isinstance(value, (int, float)) else {}
+    flat = {}
+    for key, entry in items:
+        flat.update(_flatten(entry, f'{prefix}.{key}' if prefix else key))
+    return flat
+
+
+def compare(baseline, current):
+    """Print the relative change of every metric against a baseline run."""
+    old = _flatten(baseline['results'])
+    new = _flatten(current['results'])
+    print(f"{'metric':<45} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        if key.rsplit('.', 1)[-1] in MEASUREMENTS and old[key]:
+            print(f"{key:<45} {old[key]:>12.3f} {new[key]:>12.3f} {(new[key] - old[key]) / old[key]:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=('env', 'redis', 'fake'), default='env')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument('--jobs', type=int, default=2000, help='Jobs for the throughput benchmark')
+    parser.add_argument('--prefetch', type=int, default=16)
+    parser.add_argument('--latency-jobs', type=int, default=200)
+    parser.add_argument('--keepalive-jobs', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--keepalive-seconds', type=float, default=3.0)
+    parser.add_argument('--sizes', nargs='+', default=list(COMPLETE_SIZES), choices=list(COMPLETE_SIZES))
+    parser.add_argument('--repeat', type=int, default=10, help='Completions per size (fewer for large sizes)')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Results file of an earlier run to compare against')
+    args = parser.parse_args()
+
+    stop_server = start_server(args.server)
+    try:
+        results = {}
+        if 'throughput' in args.only:
+            results['throughput'] = bench_throughput(args.jobs, args.prefetch)
+        if 'latency' in args.only:
+            results['latency'] = bench_latency(args.latency_jobs)
+        if 'keepalive' in args.only:
+            results['keepalive'] = bench_keepalive(args.keepalive_jobs, args.keepalive_seconds)
+        if 'complete' in args.only:
+            results['complete'] = bench_complete(args.sizes, args.repeat)
+    finally:
+        stop_server()
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'server': args.server,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,47 @@
-from .worker import start_worker
-from .job_status import JobStatus
+import importlib
 
 __version__ = "0.1.0"
 
-__all__ = [
-    "start_worker",
-    "JobStatus"  # Useful if users want to create custom status updates
-]
+# Public names are imported on first access so importing the package stays cheap
+_exports = {
+    "start_worker": ".worker",
+    "start_async_worker": ".async_worker",
+    "JobClient": ".client",
+    "AsyncJobClient": ".client",
+    "JobFailed": ".client",
+    "JobStatus": ".job_status",  # Useful if users want to create custom status updates
+    "AsyncJobStatus": ".async_worker",
+    "store_params": ".params",
+    "ResultCache": ".cache",
+    "SingleFlight": ".coalesce",
+    "report_progress": ".job_status",
+    "current_job_status": ".job_status",
+    "configure_heartbeat": ".heartbeat",
+    "configure_retention": ".retention",
+    "configure_status_transport": ".events",
+    "iter_status_events": ".events",
+    "configure_publisher": ".publisher",
+    "Sweeper": ".retention",
+    "add_metrics_hook": ".metrics",
+    "start_metrics_server": ".metrics",
+    "Profiler": ".profiling",
+    "queue_stats": ".scheduling",
+    "check_connections": ".utils.connections",
+    "configure_connections": ".utils.connections",
+    "pool_stats": ".utils.connections",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(_exports[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,287 @@
+import json
+import time
+import signal
+import asyncio
+import traceback
+from rq import Queue
+from redis.client import NEVER_DECODE
+from job_manager_client.utils.connections import redis_conn, queue, create_async_connections
+from job_manager_client.job_status import BaseJobStatus, _current_job
+from job_manager_client.params import params_key, decode_params
+from job_manager_client.metrics import metrics, queue_wait
+from job_manager_client import events, heartbeat
+
+
+class AsyncJobStatus(BaseJobStatus):
+    """
+    asyncio counterpart of JobStatus using redis.asyncio clients.
+
+    Publishes to the same ``job:{id}`` channel and writes the same
+    ``job:{id}:status`` hash, so clients cannot tell the two apart.
+    """
+
+    def __init__(self, job_id: str, redis_conn, keydb_conn, **codec_options):
+        super().__init__(job_id, **codec_options)
+        self.redis_conn = redis_conn
+        self.keydb_conn = keydb_conn
+
+    async def _send_status_message(self, message: dict):
+        """Send a status message to the client."""
+        try:
+            message['timestamp'] = time.time()
+            message_str = json.dumps(message)
+            await events.transport.send_async(self.redis_conn, self.job_id, message_str)
+            metrics.bytes_published.inc(len(message_str))
+        except Exception as e:
+            metrics.error('status_message')
+            print(f"Error sending status message: {e}")
+
+    async def _update_job(self, key: str, value):
+        """Update the status of the job in keydb."""
+        try:
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            elif not isinstance(value, str):
+                value = str(value)
+
+            await self.keydb_conn.hset(self._status_key, key, value)
+        except Exception as e:
+            metrics.error('status_update')
+            print(f"Error updating job status: {e}")
+
+    async def start(self):
+        """Send a start message to the client and update status in keydb."""
+        await self._send_status_message({
+            'status': 'IN_PROGRESS',
+            'timestamp': time.time()
+        })
+        await self._update_job('status', 'IN_PROGRESS')
+
+    async def send_keepalive(self, progress=None):
+        """
+        Send a keepalive message to the client.
+
+        :param progress: Progress report to send along and store in keydb
+        """
+        message = {
+            'status': 'IN_PROGRESS',
+            'keepalive': True,
+            'timestamp': time.time()
+        }
+        if progress is not None:
+            message['progress'] = progress
+            await self._update_job('progress', progress)
+        await self._send_status_message(message)
+        metrics.keepalives_sent.inc()
+
+    async def _write_completion(self, fields: dict, message_str: str):
+        """Store the completion fields and retention TTL in one MULTI/EXEC, then publish."""
+        started = time.perf_counter()
+        fields, expire_keys, ttl = self._apply_retention(fields)
+        async with self.keydb_conn.pipeline(transaction=True) as pipe:
+            pipe.hset(self._status_key, mapping=fields)
+            for key in expire_keys:
+                pipe.expire(key, ttl)
+            await pipe.execute()
+        written = time.perf_counter()
+        await events.transport.send_async(self.redis_conn, self.job_id, message_str)
+        self.timings['keydb_write'] = written - started
+        self.timings['publish'] = time.perf_counter() - written
+        metrics.bytes_published.inc(len(message_str))
+
+    async def complete(self, result=None, error=None):
+        """
+        Send complete message and set result or error
+
+        :param result: The result data to store
+        :param error: Error information if the job failed
+        """
+        self.outcome = 'error' if error is not None else 'success'
+        try:
+            started = time.perf_counter()
+            fields, message_str = self._completion(result, error)
+            self.timings['serialize'] = time.perf_counter() - started
+            await self._write_completion(fields, message_str)
+
+        except Exception as e:
+            self.outcome = 'error'
+            metrics.error('result')
+            error_info = f"Failed to handle result: {str(e)}"
+            await self._update_job('error', error_info)
+            await self._update_job('status', 'COMPLETE')
+            await self._send_status_message({
+                'status': 'COMPLETE',
+                'success': False,
+                'error': error_info,
+                'timestamp': time.time()
+            })
+
+        return None
+
+
+async def keepalive_task(job_status, stop_event, interval=None, progress_interval=None):
+    """
+    Send keepalive messages until the stop event is set
+
+    Unless given, the intervals and the adaptive back-off are those of the
+    heartbeat scheduler, see configure_heartbeat.
+
+    :param job_status: AsyncJobStatus instance to send keepalives
+    :param stop_event: asyncio event to signal when to stop
+    :param interval: Time between keepalive messages in seconds
+    :param progress_interval: Minimum time between progress updates
+    """
+    scheduler = heartbeat.scheduler
+    started = time.monotonic()
+    next_due = started
+    last_progress = None
+    # A stop event rather than cancel(): redis.asyncio can swallow a
+    # cancellation that lands in the middle of a command
+    while not stop_event.is_set():
+        now = time.monotonic()
+        min_progress_interval = progress_interval if progress_interval is not None else scheduler.progress_interval
+        progress_due = ((last_progress is None or now - last_progress >= min_progress_interval)
+                        and job_status._progress_pending())
+        if now >= next_due or progress_due:
+            try:
+                progress = job_status._take_progress() if progress_due else None
+                if progress is not None:
+                    last_progress = now
+                await job_status.send_keepalive(progress)
+            except Exception as e:
+                metrics.error('keepalive')
+                print(f"Error in keepalive task: {e}")
+            next_due = now + (interval if interval is not None else scheduler._job_interval(now - started))
+        # Check for progress every base interval, like the scheduler thread
+        tick = interval if interval is not None else scheduler.interval
+        delay = min(next_due, now + tick) - time.monotonic()
+        try:
+            await asyncio.wait_for(stop_event.wait(), max(delay, 0))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def async_process_job(task_function, job, redis_conn, keydb_conn):
+    """
+    Process a single job with a coroutine task function
+
+    :param task_function: The coroutine function to execute
+    :param job: The RQ job object
+    :param redis_conn: asyncio Redis client used for pub/sub
+    :param keydb_conn: asyncio KeyDB client used for status and params
+    """
+    job_id = job.id
+    params = job.args[0] if job.args else {}
+
+    job_status = AsyncJobStatus(job_id, redis_conn, keydb_conn)
+    job_status.queue = job.origin
+    job_status.timings['queue_wait'] = queue_wait(job)
+    await job_status.start()
+    # Each asyncio task runs in its own copy of the context
+    _current_job.set(job_status)
+
+    stop_keepalive = asyncio.Event()
+    keepalive = asyncio.create_task(keepalive_task(job_status, stop_keepalive))
+
+    try:
+        if not params:
+            started = time.perf_counter()
+            # Params blobs may be binary, read them without response decoding
+            stored_params = await keydb_conn.execute_command('GET', params_key(job_id), **{NEVER_DECODE: True})
+            if stored_params:
+                params = decode_params(stored_params)
+            job_status.timings['params'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        result = await task_function(params)
+        job_status.timings['task'] = time.perf_counter() - started
+        await job_status.complete(result=result)
+        return result
+
+    except Exception as e:
+        error_info = {
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }
+        await job_status.complete(error=error_info)
+        metrics.error('task')
+        print(f"Exception during job processing: {e}")
+        traceback.print_exc()
+        raise
+
+    finally:
+        stop_keepalive.set()
+        await keepalive
+        metrics.record_job(job_status)
+
+
+async def run_async_worker(task_function, concurrency=100):
+    """
+    Dequeue and run jobs on the running event loop until the queue is empty.
+
+    :param task_function: The coroutine function to execute for each job.
+    :param concurrency: Maximum number of jobs in flight at once.
+    """
+    async_redis_conn, async_keydb_conn = create_async_connections()
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    in_flight = set()
+
+    def job_done(task):
+        in_flight.discard(task)
+        slots.release()
+
+    async def run_job(job, job_queue):
+        try:
+            await async_process_job(task_function, job, async_redis_conn, async_keydb_conn)
+        finally:
+            # With a single queue on Redis 6.2+ RQ moves the job to the intermediate queue
+            try:
+                await async_redis_conn.lrem(job_queue.intermediate_queue_key, 1, job.id)
+            except Exception as e:
+                print(f"Error removing job {job.id} from the intermediate queue: {e}")
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        while not stop.is_set():
+            await slots.acquire()
+            if stop.is_set():
+                slots.release()
+                break
+
+            # RQ's dequeue is blocking, keep it off the event loop
+            result = await asyncio.to_thread(Queue.dequeue_any, [queue.get_client()], None,
+                                          connection=redis_conn.get_client())
+            if result is None:
+                slots.release()
+                break
+
+            job, job_queue = result
+            task = asyncio.create_task(run_job(job, job_queue))
+            in_flight.add(task)
+            task.add_done_callback(job_done)
+
+        # Let in-flight jobs finish before exiting
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        await async_redis_conn.aclose()
+        await async_keydb_conn.aclose()
+
+
+def start_async_worker(task_function, concurrency=100):
+    """
+    Starts an asyncio worker that runs ``async def`` task functions.
+
+    Up to ``concurrency`` jobs run at once on a single event loop, each with
+    its keepalive running as an asyncio task instead of a thread.
+
+    :param task_function: The coroutine function to execute for each job.
+    :param concurrency: Maximum number of jobs in flight at once.
+    """
+    asyncio.run(run_async_worker(task_function, concurrency))
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import collections
+from job_manager_client.utils.connections import keydb_raw_conn
+from job_manager_client.encoding import EncodedResult, TEXT_CODECS, payload_size
+
+# Seconds a cached result is kept
+RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', '3600'))
+# Number of cached results kept in KeyDB before the least recently used are evicted
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '10000'))
+# Number of cached results additionally kept in process memory (0 disables it)
+RESULT_CACHE_LOCAL_SIZE = int(os.getenv('RESULT_CACHE_LOCAL_SIZE', '256'))
+# Encoded results larger than this are not cached
+RESULT_CACHE_MAX_SIZE = int(os.getenv('RESULT_CACHE_MAX_SIZE', str(1024 * 1024)))
+
+
+def params_digest(params, version: str = '') -> str:
+    """
+    Hash params into a cache key component.
+
+    Dicts are canonicalized (sorted keys, no whitespace) so equal params give
+    the same digest regardless of key order. Bytes params are hashed as they are.
+    """
+    digest = hashlib.sha256(version.encode() + b'\x00')
+    if isinstance(params, (bytes, bytearray, memoryview)):
+        digest.update(b'b')
+        digest.update(params)
+    else:
+        digest.update(b'j')
+        digest.update(json.dumps(params, sort_keys=True, separators=(',', ':'), default=str).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of encoded task results.
+
+    Results are stored in KeyDB under ``job_cache:{digest}`` with a TTL, where
+    the digest covers the canonicalized params and the task version tag. A
+    sorted set indexes the entries by last use; when it grows beyond
+    ``max_entries`` the least recently used entries are evicted. An optional
+    in-process LRU in front of KeyDB serves hot entries without a network trip.
+    """
+
+    def __init__(self, version: str = '', ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX_ENTRIES,
+                 local_size=RESULT_CACHE_LOCAL_SIZE, max_size=RESULT_CACHE_MAX_SIZE,
+                 prefix='job_cache', connection=None):
+        """
+        :param version: Task version tag; bump it to invalidate old results
+        :param ttl: Seconds a cached result is kept
+        :param max_entries: Maximum number of results kept in KeyDB
+        :param local_size: Maximum number of results kept in process memory
+        :param max_size: Encoded results larger than this are not cached
+        :param prefix: Key prefix for the entries and the index
+        :param connection: KeyDB connection without response decoding
+        """
+        self.version = version
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.local_size = local_size
+        self.max_size = max_size
+        self.prefix = prefix
+        self.connection = connection if connection is not None else keydb_raw_conn
+        self._local = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+
+    @property
+    def _index_key(self):
+        return f'{self.prefix}:index'
+
+    def key(self, params) -> str:
+        return f'{self.prefix}:{params_digest(params, self.version)}'
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self) -> dict:
+        """Return the hit, miss, store and eviction counters of this process."""
+        with self._lock:
+            stats = dict(self._stats)
+        for name in ('hits', 'local_hits', 'misses', 'stores', 'evictions'):
+            stats.setdefault(name, 0)
+        return stats
+
+    def _get_local(self, key):
+        if not self.local_size:
+            return None
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires_at, encoded = entry
+            if expires_at <= time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return encoded
+
+    def _put_local(self, key, encoded):
+        if not self.local_size:
+            return
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.ttl, encoded)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def get(self, params):
+        """
+        Look up the cached result for params.
+
+        :return: EncodedResult, or None on a miss
+        """
+        key = self.key(params)
+        encoded = self._get_local(key)
+        if encoded is not None:
+            self._count('hits')
+            self._count('local_hits')
+            return encoded
+
+        # Read the entry and refresh its position in the LRU index in one round trip
+        pipe = self.connection.pipeline(transaction=False)
+        pipe.hmget(key, ['codec', 'result'])
+        pipe.zadd(self._index_key, {key: time.time()}, xx=True)
+        (codec_id, payload), _ = pipe.execute()
+        if codec_id is None:
+            self._count('misses')
+            return None
+
+        codec_id = codec_id.decode()
+        if codec_id in TEXT_CODECS:
+            payload = payload.decode('utf-8')
+        encoded = EncodedResult(codec_id, payload)
+        self._put_local(key, encoded)
+        self._count('hits')
+        return encoded
+
+    def put(self, params, encoded):
+        """
+        Cache an encoded result for params.
+
+        :param params: The params the result was computed from
+        :param encoded: EncodedResult to store
+        :return: True if the result was cached, False if it is too large
+        """
+        if payload_size(encoded.payload) > self.max_size:
+            return False
+
+        key = self.key(params)
+        now = time.time()
+        pipe = self.connection.pipeline(transaction=True)
+        pipe.hset(key, mapping={'codec': encoded.codec, 'result': encoded.payload})
+        pipe.expire(key, self.ttl)
+        pipe.zadd(self._index_key, {key: now})
+        # Entries that expired on their own only need to leave the index
+        pipe.zremrangebyscore(self._index_key, '-inf', now - self.ttl)
+        pipe.zcard(self._index_key)
+        size = pipe.execute()[-1]
+
+        if size > self.max_entries:
+            self._evict(size - self.max_entries)
+        self._put_local(key, encoded)
+        self._count('stores')
+        return True
+
+    def _evict(self, count):
+        """Remove the count least recently used entries."""
+        evicted = self.connection.zpopmin(self._index_key, count)
+        if evicted:
+            self.connection.delete(*[key for key, _ in evicted])
+            with self._lock:
+                for key, _ in evicted:
+                    self._local.pop(key.decode(), None)
+            self._count('evictions', len(evicted))
+
+    def clear_local(self):
+        """Drop the in-process entries."""
+        with self._lock:
+            self._local.clear()
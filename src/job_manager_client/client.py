@@ -0,0 +1,496 @@
+import json
+import time
+import uuid
+import asyncio
+import threading
+import traceback
+import concurrent.futures
+from rq import Queue
+from job_manager_client.utils.connections import redis_conn, keydb_conn, queue as default_queue
+from job_manager_client.utils.connections import create_async_connections
+from job_manager_client.job_status import JobStatus
+
+# Seconds after which pending jobs are checked in KeyDB in case their COMPLETE was missed
+CLIENT_POLL_INTERVAL = 5.0
+
+
+class JobFailed(Exception):
+    """Raised by JobClient.result() for a job that completed with an error."""
+
+    def __init__(self, job_id: str, error):
+        message = error.get('error') if isinstance(error, dict) else error
+        super().__init__(f"Job {job_id} failed: {message}")
+        self.job_id = job_id
+        self.error = error
+
+
+def _parse_error(error):
+    try:
+        return json.loads(error)
+    except ValueError:
+        return error
+
+
+def _completion_from_hash(job_id, status, error, chunked, result_ref, result_size):
+    """Build a COMPLETE message from the status hash, None if the job is not complete."""
+    if status != 'COMPLETE':
+        return None
+    if error is not None:
+        return {'status': 'COMPLETE', 'success': False, 'error': _parse_error(error)}
+    message = {'status': 'COMPLETE', 'success': True}
+    if chunked is not None or result_ref is not None or result_size:
+        # Read by the caller, not by the thread routing messages
+        message['result_key'] = f'job:{job_id}:status'
+    return message
+
+
+_STATUS_FIELDS = ['status', 'error', 'chunked', 'result_ref']
+
+
+def _remaining(deadline):
+    """Seconds left until a monotonic deadline, None without one."""
+    return max(deadline - time.monotonic(), 0) if deadline is not None else None
+
+
+class BaseJobClient:
+    """Job submission and COMPLETE handling shared by the sync and asyncio clients"""
+
+    def __init__(self, task, queue=None, poll_interval=CLIENT_POLL_INTERVAL):
+        """
+        :param task: The task as a function or dotted path. Workers run their
+            own task_function, it only names the job in RQ.
+        :param queue: RQ queue to submit to (defaults to the worker queue)
+        :param poll_interval: Seconds between checks of pending jobs in KeyDB,
+            for COMPLETE messages missed while the subscriber reconnected
+        """
+        self.task = task
+        self.queue = queue if queue is not None else default_queue.get_client()
+        self.poll_interval = poll_interval
+
+    def _job_data(self, params, job_id=None, **options):
+        job_id = job_id or str(uuid.uuid4())
+        return Queue.prepare_data(self.task, args=(params,), job_id=job_id, **options)
+
+    @staticmethod
+    def _job_id(channel):
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        return channel[len('job:'):]
+
+    @staticmethod
+    def _is_complete(data):
+        message = json.loads(data)
+        return message if message.get('status') == 'COMPLETE' else None
+
+    @staticmethod
+    def _needs_fetch(message):
+        """Whether the result has to be read from KeyDB, raising JobFailed for errors."""
+        if not message.get('success', True):
+            raise JobFailed(message.get('job_id'), message.get('error'))
+        return 'result' not in message and 'result_key' in message
+
+
+class JobClient(BaseJobClient):
+    """
+    Submits jobs and waits for their results.
+
+    A single pattern-subscribed pub/sub connection (``job:*``) routes COMPLETE
+    messages to the futures of all waiting jobs, on a background thread, so
+    waiting for thousands of jobs does not need a connection per job. Results
+    too large to be sent inline are read from the status hash, as are jobs
+    that completed before anyone waited for them.
+
+    Usage::
+
+        client = JobClient('myapp.tasks.run')
+        job_ids = client.submit_many([{"n": 1}, {"n": 2}])
+        results = client.results(job_ids, timeout=30)
+    """
+
+    def __init__(self, task, queue=None, poll_interval=CLIENT_POLL_INTERVAL):
+        super().__init__(task, queue, poll_interval)
+        self._futures = {}
+        # Callers of watch() and result() still waiting per future
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._subscribed = threading.Event()
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, params, job_id=None, **options) -> str:
+        """
+        Enqueue a job.
+
+        :param params: The job params
+        :param job_id: Job id (defaults to a random UUID)
+        :param options: Passed on to RQ, e.g. ``timeout``
+        :return: The job id
+        """
+        return self.queue.enqueue_many([self._job_data(params, job_id, **options)])[0].id
+
+    def submit_many(self, params_list, **options) -> list:
+        """
+        Enqueue several jobs in one pipelined round trip.
+
+        :param params_list: Params of every job
+        :param options: Passed on to RQ for every job
+        :return: The job ids in the order of params_list
+        """
+        jobs = self.queue.enqueue_many([self._job_data(params, **options) for params in params_list])
+        return [job.id for job in jobs]
+
+    def _start(self, timeout=None):
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._listen, name='job-client', daemon=True)
+                self._thread.start()
+        if not self._subscribed.wait(timeout):
+            raise ConnectionError(f"Could not subscribe to job status messages within {timeout} seconds")
+
+    def _listen(self):
+        while not self._stop.is_set():
+            pubsub = redis_conn.pubsub()
+            try:
+                pubsub.psubscribe('job:*')
+                while pubsub.get_message(timeout=1) is None:
+                    pass
+                self._subscribed.set()
+                # Anything that completed while (re)connecting is only in KeyDB
+                self._check_pending()
+                last_check = time.monotonic()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1)
+                    if message is not None and message['type'] == 'pmessage':
+                        self._dispatch(message['channel'], message['data'])
+                    if time.monotonic() - last_check >= self.poll_interval:
+                        self._check_pending()
+                        last_check = time.monotonic()
+            except Exception as e:
+                print(f"Error in job client subscriber, reconnecting: {e}")
+                traceback.print_exc()
+                self._stop.wait(1)
+            finally:
+                pubsub.close()
+
+    def _dispatch(self, channel, data):
+        job_id = self._job_id(channel)
+        # Keepalives of jobs nobody waits for are not even decoded
+        if job_id not in self._futures:
+            return
+        message = self._is_complete(data)
+        if message is not None:
+            self._resolve(job_id, message)
+
+    def _resolve(self, job_id, message):
+        with self._lock:
+            future = self._futures.pop(job_id, None)
+        if future is not None and not future.done():
+            message['job_id'] = job_id
+            future.set_result(message)
+
+    def _check(self, job_ids):
+        pipe = keydb_conn.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.hmget(f'job:{job_id}:status', _STATUS_FIELDS)
+            pipe.hstrlen(f'job:{job_id}:status', 'result')
+        replies = pipe.execute()
+        for job_id, fields, result_size in zip(job_ids, replies[::2], replies[1::2]):
+            message = _completion_from_hash(job_id, *fields, result_size)
+            if message is not None:
+                self._resolve(job_id, message)
+
+    def _check_pending(self):
+        with self._lock:
+            job_ids = list(self._futures)
+        if job_ids:
+            self._check(job_ids)
+
+    def watch(self, job_id: str, timeout=None) -> concurrent.futures.Future:
+        """
+        Return a future that resolves to the COMPLETE message of a job.
+
+        Use result() to get the decoded result instead. Cancelling the future
+        stops watching the job.
+
+        :param timeout: Seconds to wait for the subscriber to connect
+        :raises ConnectionError: The subscriber did not connect in time
+        """
+        return self._watch([job_id], timeout)[0]
+
+    def _watch(self, job_ids, timeout=None):
+        """Return a future per job, checking all newly watched jobs in one pipeline."""
+        self._start(timeout)
+        futures = []
+        created = {}
+        with self._lock:
+            for job_id in job_ids:
+                future = self._futures.get(job_id)
+                if future is None:
+                    future = created[job_id] = self._futures[job_id] = concurrent.futures.Future()
+                if not future.done():
+                    self._waiters[future] = self._waiters.get(future, 0) + 1
+                futures.append(future)
+        for job_id, future in created.items():
+            future.add_done_callback(lambda done, job_id=job_id: self._discard(job_id, done))
+        if created:
+            # Subscribed before this check, so a COMPLETE is either seen here or routed
+            self._check(list(created))
+        return futures
+
+    def _discard(self, job_id, future):
+        """Stop watching a job once its future is done or cancelled."""
+        with self._lock:
+            if self._futures.get(job_id) is future:
+                del self._futures[job_id]
+            self._waiters.pop(future, None)
+
+    def _release(self, future):
+        """Called by a waiter that gave up; the last one cancels the future."""
+        with self._lock:
+            waiters = self._waiters.get(future, 0) - 1
+            self._waiters[future] = waiters
+        if waiters <= 0:
+            future.cancel()
+
+    def _unwrap(self, message):
+        if self._needs_fetch(message):
+            return JobStatus(message['job_id']).get_result()
+        return message.get('result')
+
+    def result(self, job_id: str, timeout=None):
+        """
+        Wait for a job and return its result.
+
+        :param job_id: The job id
+        :param timeout: Seconds to wait, None waits forever
+        :raises JobFailed: The job completed with an error
+        :raises TimeoutError: The job did not complete in time
+        :raises ConnectionError: The subscriber did not connect in time
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        future = self.watch(job_id, timeout)
+        try:
+            message = future.result(_remaining(deadline))
+        except concurrent.futures.TimeoutError:
+            self._release(future)
+            raise TimeoutError(f"Job {job_id} did not complete within {timeout} seconds") from None
+        return self._unwrap(message)
+
+    def results(self, job_ids, timeout=None) -> list:
+        """
+        Wait for several jobs and return their results in order.
+
+        A failed job's entry is its JobFailed exception.
+
+        :raises TimeoutError: Not all jobs completed in time
+        :raises ConnectionError: The subscriber did not connect in time
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        futures = self._watch(job_ids, timeout)
+        _, not_done = concurrent.futures.wait(futures, _remaining(deadline))
+        if not_done:
+            for future in not_done:
+                self._release(future)
+            raise TimeoutError(f"{len(not_done)} of {len(futures)} jobs did not complete within {timeout} seconds")
+        results = []
+        for future in futures:
+            try:
+                results.append(self._unwrap(future.result()))
+            except JobFailed as e:
+                results.append(e)
+        return results
+
+    def close(self):
+        """Stop the subscriber thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._subscribed.clear()
+
+
+class AsyncJobClient(BaseJobClient):
+    """
+    asyncio counterpart of JobClient.
+
+    The subscriber runs as a task on the event loop the client is first used
+    on. RQ enqueueing and reading large results run in a thread.
+    """
+
+    def __init__(self, task, queue=None, poll_interval=CLIENT_POLL_INTERVAL):
+        super().__init__(task, queue, poll_interval)
+        self._futures = {}
+        self._waiters = {}
+        self._listener = None
+        self._subscribed = None
+        self._redis_conn = self._keydb_conn = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def submit(self, params, job_id=None, **options) -> str:
+        """See JobClient.submit"""
+        job_data = self._job_data(params, job_id, **options)
+        jobs = await asyncio.to_thread(self.queue.enqueue_many, [job_data])
+        return jobs[0].id
+
+    async def submit_many(self, params_list, **options) -> list:
+        """See JobClient.submit_many"""
+        job_datas = [self._job_data(params, **options) for params in params_list]
+        jobs = await asyncio.to_thread(self.queue.enqueue_many, job_datas)
+        return [job.id for job in jobs]
+
+    async def _start(self, timeout=None):
+        if self._listener is None:
+            self._redis_conn, self._keydb_conn = create_async_connections()
+            self._subscribed = asyncio.Event()
+            self._listener = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"Could not subscribe to job status messages within {timeout} seconds") from None
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis_conn.pubsub()
+            try:
+                await pubsub.psubscribe('job:*')
+                while await pubsub.get_message(timeout=1) is None:
+                    pass
+                self._subscribed.set()
+                await self._check(list(self._futures))
+                last_check = time.monotonic()
+                while True:
+                    message = await pubsub.get_message(timeout=1)
+                    if message is not None and message['type'] == 'pmessage':
+                        self._dispatch(message['channel'], message['data'])
+                    if time.monotonic() - last_check >= self.poll_interval:
+                        await self._check(list(self._futures))
+                        last_check = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in job client subscriber, reconnecting: {e}")
+                traceback.print_exc()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def _dispatch(self, channel, data):
+        job_id = self._job_id(channel)
+        if job_id not in self._futures:
+            return
+        message = self._is_complete(data)
+        if message is not None:
+            self._resolve(job_id, message)
+
+    def _resolve(self, job_id, message):
+        future = self._futures.pop(job_id, None)
+        if future is not None and not future.done():
+            message['job_id'] = job_id
+            future.set_result(message)
+
+    async def _check(self, job_ids):
+        if not job_ids:
+            return
+        async with self._keydb_conn.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.hmget(f'job:{job_id}:status', _STATUS_FIELDS)
+                pipe.hstrlen(f'job:{job_id}:status', 'result')
+            replies = await pipe.execute()
+        for job_id, fields, result_size in zip(job_ids, replies[::2], replies[1::2]):
+            message = _completion_from_hash(job_id, *fields, result_size)
+            if message is not None:
+                self._resolve(job_id, message)
+
+    async def watch(self, job_id: str, timeout=None) -> asyncio.Future:
+        """See JobClient.watch"""
+        return (await self._watch([job_id], timeout))[0]
+
+    async def _watch(self, job_ids, timeout=None):
+        """See JobClient._watch"""
+        await self._start(timeout)
+        loop = asyncio.get_running_loop()
+        futures = []
+        created = []
+        for job_id in job_ids:
+            future = self._futures.get(job_id)
+            if future is None:
+                future = self._futures[job_id] = loop.create_future()
+                future.add_done_callback(lambda done, job_id=job_id: self._discard(job_id, done))
+                created.append(job_id)
+            if not future.done():
+                self._waiters[future] = self._waiters.get(future, 0) + 1
+            futures.append(future)
+        await self._check(created)
+        return futures
+
+    def _discard(self, job_id, future):
+        if self._futures.get(job_id) is future:
+            del self._futures[job_id]
+        self._waiters.pop(future, None)
+
+    def _release(self, future):
+        waiters = self._waiters.get(future, 0) - 1
+        self._waiters[future] = waiters
+        if waiters <= 0:
+            future.cancel()
+
+    async def _unwrap(self, message):
+        if self._needs_fetch(message):
+            return await asyncio.to_thread(JobStatus(message['job_id']).get_result)
+        return message.get('result')
+
+    async def result(self, job_id: str, timeout=None):
+        """See JobClient.result"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        future = await self.watch(job_id, timeout)
+        try:
+            # Shielded, other waiters of the same job keep their future
+            message = await asyncio.wait_for(asyncio.shield(future), _remaining(deadline))
+        except asyncio.TimeoutError:
+            self._release(future)
+            raise TimeoutError(f"Job {job_id} did not complete within {timeout} seconds") from None
+        except asyncio.CancelledError:
+            self._release(future)
+            raise
+        return await self._unwrap(message)
+
+    async def results(self, job_ids, timeout=None) -> list:
+        """See JobClient.results"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        futures = await self._watch(job_ids, timeout)
+        _, not_done = await asyncio.wait(futures, timeout=_remaining(deadline))
+        if not_done:
+            for future in not_done:
+                self._release(future)
+            raise TimeoutError(f"{len(not_done)} of {len(futures)} jobs did not complete within {timeout} seconds")
+        results = []
+        for future in futures:
+            try:
+                results.append(await self._unwrap(future.result()))
+            except JobFailed as e:
+                results.append(e)
+        return results
+
+    async def close(self):
+        """Stop the subscriber task and close the connections."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+            await self._redis_conn.aclose()
+            await self._keydb_conn.aclose()
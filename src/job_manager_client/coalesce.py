@@ -0,0 +1,156 @@
+import os
+import json
+import time
+from job_manager_client.utils.connections import redis_conn, keydb_raw_conn
+from job_manager_client.encoding import EncodedResult, TEXT_CODECS
+from job_manager_client.cache import params_digest
+from job_manager_client.streaming import read_chunked_result
+from job_manager_client.retention import read_offloaded
+
+# Seconds the leader's lock lives without being refreshed by its keepalives
+COALESCE_LOCK_TTL = float(os.getenv('COALESCE_LOCK_TTL', '10'))
+
+
+class SingleFlight:
+    """
+    Coalesces identical jobs that are in flight at the same time.
+
+    The first job with a given params fingerprint claims a lock in KeyDB
+    holding its job id and runs the task. Jobs with the same fingerprint that
+    start while the lock is held wait for the leader's COMPLETE message on its
+    ``job:{id}`` channel and copy its result or error instead of running the
+    task.
+
+    The lock expires after ``lock_ttl`` seconds and is refreshed with every
+    keepalive of the leader, so a crashed leader's lock disappears quickly.
+    Waiting jobs notice the missing lock and one of them takes over.
+    """
+
+    def __init__(self, version: str = '', lock_ttl=COALESCE_LOCK_TTL, prefix='job_flight',
+                 connection=None, pubsub_connection=None):
+        """
+        :param version: Task version tag, part of the fingerprint
+        :param lock_ttl: Seconds the lock lives without a refresh
+        :param prefix: Key prefix for the locks
+        :param connection: KeyDB connection without response decoding
+        :param pubsub_connection: Redis connection the leader publishes on
+        """
+        self.version = version
+        self.lock_ttl = lock_ttl
+        self.prefix = prefix
+        self.connection = connection if connection is not None else keydb_raw_conn
+        self.pubsub_connection = pubsub_connection if pubsub_connection is not None else redis_conn
+
+    def key(self, params) -> str:
+        return f'{self.prefix}:{params_digest(params, self.version)}'
+
+    def _claim(self, key, job_status):
+        """
+        Try to become the leader for key.
+
+        :return: None if this job is the leader now, otherwise the leader's job id
+        """
+        while True:
+            if self.connection.set(key, job_status.job_id, nx=True, px=int(self.lock_ttl * 1000)):
+                # The heartbeat scheduler refreshes the lock with every keepalive
+                job_status._flight_lock = (key, self.lock_ttl)
+                return None
+            leader_id = self.connection.get(key)
+            if leader_id is not None:
+                return leader_id.decode()
+
+    def _read_outcome(self, leader_id):
+        """
+        Read the leader's outcome from its status hash.
+
+        :return: (result, error) once the leader is complete, otherwise None
+        """
+        status, result, codec_id, error, chunked, result_ref = self.connection.hmget(
+            f'job:{leader_id}:status', ['status', 'result', 'codec', 'error', 'chunked', 'result_ref']
+        )
+        if status != b'COMPLETE':
+            return None
+        if error is not None:
+            error = error.decode()
+            try:
+                return None, json.loads(error)
+            except ValueError:
+                return None, error
+        if chunked is not None:
+            # Chunked results are read back whole and stored for this job again
+            return read_chunked_result(leader_id, connection=self.connection), None
+        if result_ref is not None:
+            result = read_offloaded(result_ref)
+        if result is None:
+            return None, None
+        codec_id = codec_id.decode() if codec_id else 'text'
+        if codec_id in TEXT_CODECS:
+            result = result.decode('utf-8')
+        return EncodedResult(codec_id, result), None
+
+    def _wait(self, key, leader_id):
+        """
+        Wait for the leader to complete.
+
+        :return: (result, error) of the leader, or None if the leader is gone
+        """
+        pubsub = self.pubsub_connection.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f'job:{leader_id}')
+        try:
+            # Subscribed first, so a COMPLETE published from now on is not missed
+            last_seen = time.monotonic()
+            while True:
+                outcome = self._read_outcome(leader_id)
+                if outcome is not None:
+                    return outcome
+
+                message = pubsub.get_message(timeout=self.lock_ttl / 4)
+                if message is not None:
+                    last_seen = time.monotonic()
+                    continue
+
+                if time.monotonic() - last_seen > self.lock_ttl:
+                    current = self.connection.get(key)
+                    if current is None or current.decode() != leader_id:
+                        # The leader crashed or finished without a COMPLETE we could read
+                        outcome = self._read_outcome(leader_id)
+                        return outcome
+                    last_seen = time.monotonic()
+        finally:
+            pubsub.close()
+
+    def follow(self, job_status, params):
+        """
+        Lead the job with these params, or wait for the job that leads it.
+
+        :param job_status: Status of the job being processed
+        :param params: Its params
+        :return: None if this job is the leader and has to run the task,
+            otherwise the (result, error) copied from the leader
+        """
+        key = self.key(params)
+        while True:
+            leader_id = self._claim(key, job_status)
+            if leader_id is None or leader_id == job_status.job_id:
+                return None
+            outcome = self._wait(key, leader_id)
+            if outcome is not None:
+                return outcome
+
+    def release(self, job_status):
+        """Drop the lock if this job holds it, after its COMPLETE was sent."""
+        lock = job_status._flight_lock
+        if lock is None:
+            return
+        job_status._flight_lock = None
+        key, _ = lock
+        with self.connection.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) == job_status.job_id.encode():
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.execute()
+            except Exception as e:
+                # The lock expires on its own
+                print(f"Error releasing single-flight lock: {e}")
@@ -0,0 +1,138 @@
+import os
+import json
+import lzma
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional
+    msgpack = None
+
+# Default codec and compression for job results
+RESULT_CODEC = os.getenv('RESULT_CODEC', 'json')
+RESULT_COMPRESSION = os.getenv('RESULT_COMPRESSION') or None
+RESULT_COMPRESS_THRESHOLD = int(os.getenv('RESULT_COMPRESS_THRESHOLD', '65536'))
+
+# Codecs whose payload is text that can be sent inline in a JSON message
+TEXT_CODECS = ('json', 'text')
+
+# name -> (encode, decode)
+CODECS = {
+    'json': (json.dumps, json.loads),
+    'text': (str, lambda data: data.decode('utf-8') if isinstance(data, bytes) else data),
+    'raw': (bytes, bytes),
+}
+
+COMPRESSORS = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+}
+
+if msgpack is not None:
+    CODECS['msgpack'] = (
+        lambda value: msgpack.packb(value, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False)
+    )
+
+
+class EncodedResult:
+    """
+    A result that is already encoded, e.g. read back from a cache.
+
+    Passed to JobStatus.complete it is stored as it is, without encoding the
+    value again.
+    """
+
+    def __init__(self, codec: str, payload):
+        self.codec = codec
+        self.payload = payload
+
+    def decode(self):
+        return decode_result(self.codec, self.payload)
+
+
+def register_codec(name: str, encode, decode):
+    """
+    Register a result codec.
+
+    :param name: Codec id stored next to the result
+    :param encode: Function turning a result into str or bytes
+    :param decode: Function turning the stored bytes back into a result
+    """
+    if '+' in name:
+        raise ValueError("Codec names may not contain '+'")
+    CODECS[name] = (encode, decode)
+
+
+def check_codec(codec: str, compression=None):
+    """Raise ValueError if a codec or compression is not available."""
+    if codec not in CODECS:
+        if codec == 'msgpack':
+            raise ValueError("The msgpack codec requires the msgpack package")
+        raise ValueError(f"Unknown result codec: {codec}")
+    if compression is not None and compression not in COMPRESSORS:
+        raise ValueError(f"Unknown result compression: {compression}")
+
+
+def payload_size(payload) -> int:
+    """Size of an encoded payload (characters for str, bytes otherwise)."""
+    if isinstance(payload, memoryview):
+        return payload.nbytes
+    return len(payload)
+
+
+def encode_result(value, codec=RESULT_CODEC, compression=RESULT_COMPRESSION,
+                  compress_threshold=RESULT_COMPRESS_THRESHOLD):
+    """
+    Encode a result for storage.
+
+    bytes-like results are stored as they are. With the json codec, dicts and
+    lists are JSON-encoded and other values keep their string form, exactly
+    as results were stored before codecs existed. Payloads of at least
+    ``compress_threshold`` are compressed when a compression is given.
+
+    :return: Tuple of (codec id, payload)
+    """
+    if isinstance(value, (bytes, memoryview)):
+        codec_id, payload = 'raw', value
+    elif isinstance(value, bytearray):
+        codec_id, payload = 'raw', memoryview(value)
+    elif codec == 'json':
+        if isinstance(value, (dict, list)):
+            codec_id, payload = 'json', json.dumps(value)
+        else:
+            codec_id, payload = 'text', value if isinstance(value, str) else str(value)
+    else:
+        codec_id, payload = codec, CODECS[codec][0](value)
+
+    if compression and payload_size(payload) >= compress_threshold:
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        payload = COMPRESSORS[compression][0](payload)
+        codec_id = f'{codec_id}+{compression}'
+
+    return codec_id, payload
+
+
+def decode_result(codec_id, data):
+    """
+    Decode a stored result.
+
+    :param codec_id: Codec id stored next to the result, or None for results
+        written before codecs existed
+    :param data: The stored value
+    """
+    if data is None:
+        return None
+
+    if codec_id is None:
+        # Legacy value: JSON for dicts and lists, plain text otherwise
+        try:
+            return json.loads(data)
+        except ValueError:
+            return CODECS['text'][1](data)
+
+    codec, *compressions = codec_id.split('+')
+    for compression in reversed(compressions):
+        data = COMPRESSORS[compression][1](data)
+    return CODECS[codec][1](data)
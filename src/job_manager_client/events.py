@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import zlib
+from job_manager_client.utils.connections import redis_conn
+
+# How status messages are sent: pubsub (default), streams or both
+STATUS_TRANSPORT = os.getenv('STATUS_TRANSPORT', 'pubsub')
+# Number of shared event streams (0 gives every job its own stream)
+STATUS_STREAM_SHARDS = int(os.getenv('STATUS_STREAM_SHARDS', '0'))
+# Approximate maximum number of events kept per stream
+STATUS_STREAM_MAXLEN = int(os.getenv('STATUS_STREAM_MAXLEN', '1000'))
+# Seconds a per-job stream is kept after its last event
+STATUS_STREAM_TTL = int(os.getenv('STATUS_STREAM_TTL', '86400'))
+
+MODES = ('pubsub', 'streams', 'both')
+
+
+class StatusTransport:
+    """
+    Sends status messages by pub/sub on ``job:{id}``, to Redis Streams, or both.
+
+    With streams, every message is XADDed with a capped MAXLEN to
+    ``job:{id}:events``, or with shards to ``job_events:{n}`` where the entry
+    carries the job id. Clients that were not listening when a message was
+    sent can read it later and resume from the last event id they saw, see
+    iter_status_events.
+
+    Pub/sub stays the default. Subscribers such as JobClient,
+    iter_result_chunks and SingleFlight followers fall back to reading KeyDB
+    when only streams are used, so ``both`` is the choice while they are in use.
+    """
+
+    def __init__(self, mode=STATUS_TRANSPORT, shards=STATUS_STREAM_SHARDS,
+                 maxlen=STATUS_STREAM_MAXLEN, ttl=STATUS_STREAM_TTL):
+        """
+        :param mode: pubsub, streams or both
+        :param shards: Number of shared streams, 0 for one stream per job
+        :param maxlen: Approximate maximum number of events per stream
+        :param ttl: Seconds a per-job stream is kept after its last event
+        """
+        self.configure(mode, shards, maxlen, ttl)
+
+    def configure(self, mode=None, shards=None, maxlen=None, ttl=None):
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f"Unknown status transport: {mode}")
+            self.mode = mode
+            self.pubsub = mode in ('pubsub', 'both')
+            self.streams = mode in ('streams', 'both')
+        if shards is not None:
+            self.shards = shards
+        if maxlen is not None:
+            self.maxlen = maxlen
+        if ttl is not None:
+            self.ttl = ttl
+
+    def stream_key(self, job_id: str) -> str:
+        if self.shards:
+            return f'job_events:{zlib.crc32(job_id.encode()) % self.shards}'
+        return f'job:{job_id}:events'
+
+    def add(self, pipe, job_id: str, message_str: str):
+        """Queue a status message on a pipeline for every configured transport."""
+        if self.pubsub:
+            pipe.publish(f'job:{job_id}', message_str)
+        if self.streams:
+            key = self.stream_key(job_id)
+            pipe.xadd(key, {'job_id': job_id, 'data': message_str},
+                      maxlen=self.maxlen, approximate=True)
+            if not self.shards and self.ttl:
+                pipe.expire(key, self.ttl)
+
+    def send(self, connection, job_id: str, message_str: str):
+        """Send a status message with a connection."""
+        if not self.streams:
+            connection.publish(f'job:{job_id}', message_str)
+            return
+        pipe = connection.pipeline(transaction=False)
+        self.add(pipe, job_id, message_str)
+        pipe.execute()
+
+    async def send_async(self, connection, job_id: str, message_str: str):
+        """Send a status message with a redis.asyncio connection."""
+        if not self.streams:
+            await connection.publish(f'job:{job_id}', message_str)
+            return
+        async with connection.pipeline(transaction=False) as pipe:
+            self.add(pipe, job_id, message_str)
+            await pipe.execute()
+
+
+transport = StatusTransport()
+
+
+def configure_status_transport(mode=None, shards=None, maxlen=None, ttl=None):
+    """
+    Configure how status messages are sent from this process.
+
+    :param mode: pubsub, streams or both
+    :param shards: Number of shared streams, 0 for one stream per job
+    :param maxlen: Approximate maximum number of events per stream
+    :param ttl: Seconds a per-job stream is kept after its last event
+    """
+    transport.configure(mode, shards, maxlen, ttl)
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def iter_status_events(job_id: str, last_id='0', timeout=None, block=1000, connection=None):
+    """
+    Read the status events of a job from its stream with XREAD BLOCK.
+
+    Yields every event after ``last_id`` and stops after the COMPLETE
+    message, so a client can store the last id it handled and resume from
+    there after a disconnect.
+
+    :param job_id: The job id
+    :param last_id: Id of the last event already handled ('0' reads all)
+    :param timeout: Seconds to wait for the next event, None waits forever
+    :param block: Milliseconds a single XREAD blocks
+    :param connection: Redis connection (defaults to redis_conn)
+    :return: Generator of (event id, message dict)
+    :raises TimeoutError: No event arrived within timeout
+    """
+    connection = connection if connection is not None else redis_conn
+    key = transport.stream_key(job_id)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        wait = block
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No status event for job {job_id} within {timeout} seconds")
+            wait = max(1, min(block, int(remaining * 1000)))
+
+        reply = connection.xread({key: last_id}, count=100, block=wait)
+        if not reply:
+            continue
+        for event_id, fields in reply[0][1]:
+            last_id = _text(event_id)
+            fields = {_text(name): value for name, value in fields.items()}
+            # Shared streams carry the events of other jobs too
+            if _text(fields.get('job_id')) != job_id:
+                continue
+            if deadline is not None:
+                deadline = time.monotonic() + timeout
+            message = json.loads(fields['data'])
+            yield _text(event_id), message
+            if message.get('status') == 'COMPLETE':
+                return
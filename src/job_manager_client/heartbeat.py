@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import threading
+import traceback
+from job_manager_client.utils.connections import redis_conn, keydb_conn
+from job_manager_client.metrics import metrics
+from job_manager_client import events
+
+KEEPALIVE_INTERVAL = float(os.getenv('KEEPALIVE_INTERVAL', '0.5'))
+KEEPALIVE_ADAPTIVE = os.getenv('KEEPALIVE_ADAPTIVE', '0').lower() in ('1', 'true', 'yes')
+KEEPALIVE_MAX_INTERVAL = float(os.getenv('KEEPALIVE_MAX_INTERVAL', '5'))
+KEEPALIVE_BACKOFF_AFTER = float(os.getenv('KEEPALIVE_BACKOFF_AFTER', '30'))
+# Minimum time between two progress updates of the same job
+PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', '1.0'))
+
+
+class HeartbeatScheduler:
+    """
+    Sends keepalives for every in-flight job of a process from a single thread.
+
+    On every tick all jobs that are due get their keepalive in one pipelined
+    batch, sharing a single timestamp and serialized message. Registering and
+    unregistering a job is a dict operation under a lock and never waits for
+    the network.
+
+    Progress reported by a job is sent with its keepalive. A job with unsent
+    progress is also due once ``progress_interval`` has passed since its last
+    progress update, so progress is neither delayed by a backed-off keepalive nor
+    sent more than once per interval.
+    """
+
+    def __init__(self, connection=None, interval=KEEPALIVE_INTERVAL, adaptive=KEEPALIVE_ADAPTIVE,
+                 max_interval=KEEPALIVE_MAX_INTERVAL, backoff_after=KEEPALIVE_BACKOFF_AFTER,
+                 progress_interval=PROGRESS_INTERVAL, store_connection=None):
+        """
+        :param connection: Redis connection to publish on (defaults to redis_conn)
+        :param interval: Time between keepalive messages in seconds
+        :param adaptive: Back off the interval for long-running jobs
+        :param max_interval: Upper bound for the adaptive interval
+        :param backoff_after: Job age in seconds after which the adaptive
+            interval doubles, and doubles again for every further period
+        :param progress_interval: Minimum time between progress updates of a job
+        :param store_connection: KeyDB connection progress is stored on
+            (defaults to keydb_conn)
+        """
+        self.connection = connection if connection is not None else redis_conn
+        self.store_connection = store_connection if store_connection is not None else keydb_conn
+        self.interval = interval
+        self.adaptive = adaptive
+        self.max_interval = max_interval
+        self.backoff_after = backoff_after
+        self.progress_interval = progress_interval
+        self._reset()
+
+    def _reset(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._has_jobs = threading.Event()
+        self._thread = None
+
+    def configure(self, interval=None, adaptive=None, max_interval=None, backoff_after=None,
+                  progress_interval=None):
+        """Change the scheduler settings; takes effect from the next tick."""
+        if interval is not None:
+            self.interval = interval
+        if adaptive is not None:
+            self.adaptive = adaptive
+        if max_interval is not None:
+            self.max_interval = max_interval
+        if backoff_after is not None:
+            self.backoff_after = backoff_after
+        if progress_interval is not None:
+            self.progress_interval = progress_interval
+
+    def _job_interval(self, age):
+        if not self.adaptive or age < self.backoff_after:
+            return self.interval
+        periods = int(age // self.backoff_after)
+        return min(self.max_interval, self.interval * (2 ** periods))
+
+    def register(self, job_status):
+        """Start sending keepalives for a job."""
+        now = time.monotonic()
+        with self._lock:
+            self._jobs[job_status.job_id] = [job_status, now, now + self.interval, now - self.progress_interval]
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='job-heartbeat',
+                    daemon=True
+                )
+                self._thread.start()
+        self._has_jobs.set()
+
+    def unregister(self, job_status):
+        """
+        Stop sending keepalives for a job.
+
+        A batch being built leaves the job out once this returns. Only a
+        keepalive already on its way to Redis can still arrive, and clients
+        ignore IN_PROGRESS messages after the COMPLETE.
+        """
+        with self._lock:
+            self._jobs.pop(job_status.job_id, None)
+
+    def _due_jobs(self, now):
+        due = []
+        with self._lock:
+            if not self._jobs:
+                self._has_jobs.clear()
+            for entry in self._jobs.values():
+                job_status, started, next_due, last_progress = entry
+                progress_due = (now - last_progress >= self.progress_interval
+                                and job_status._progress_pending())
+                if next_due <= now or progress_due:
+                    progress = job_status._take_progress() if progress_due else None
+                    due.append((job_status, progress))
+                    entry[2] = now + self._job_interval(now - started)
+                    if progress is not None:
+                        entry[3] = now
+        return due
+
+    def _send(self, due):
+        message = {
+            'status': 'IN_PROGRESS',
+            'keepalive': True,
+            'timestamp': time.time()
+        }
+        keepalive = json.dumps(message)
+        progress_updates = []
+        published = 0
+        pipe = self.connection.pipeline(transaction=False)
+        with self._lock:
+            # Jobs that were unregistered after the batch was built are done
+            due = [(job_status, progress) for job_status, progress in due
+                   if self._jobs.get(job_status.job_id, [None])[0] is job_status]
+        if not due:
+            return
+        for job_status, progress in due:
+            if progress is None:
+                events.transport.add(pipe, job_status.job_id, keepalive)
+                published += len(keepalive)
+            else:
+                update = json.dumps({**message, 'progress': progress})
+                events.transport.add(pipe, job_status.job_id, update)
+                published += len(update)
+                progress_updates.append((job_status, progress))
+        pipe.execute()
+        metrics.keepalives_sent.inc(len(due))
+        metrics.bytes_published.inc(published)
+
+        locks = [job_status._flight_lock for job_status, _ in due if job_status._flight_lock]
+        if progress_updates or locks:
+            store = self.store_connection.pipeline(transaction=False)
+            for job_status, progress in progress_updates:
+                store.hset(job_status._status_key, 'progress', json.dumps(progress))
+            # Single-flight locks of running leaders live as long as their keepalives
+            for key, ttl in locks:
+                store.pexpire(key, int(ttl * 1000))
+            store.execute()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            if not self._has_jobs.is_set():
+                self._has_jobs.wait()
+                next_tick = time.monotonic()
+
+            # Allow a little slack so jobs due just after the tick ride along
+            now = next_tick + self.interval * 0.1
+            due = self._due_jobs(now)
+            if due:
+                try:
+                    self._send(due)
+                except Exception as e:
+                    metrics.error('keepalive')
+                    print(f"Error sending keepalives: {e}")
+                    traceback.print_exc()
+
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+
+
+# Scheduler shared by all jobs of this process
+scheduler = HeartbeatScheduler()
+
+# The sender thread does not survive fork, start over in child processes
+os.register_at_fork(after_in_child=scheduler._reset)
+
+
+def configure_heartbeat(interval=None, adaptive=None, max_interval=None, backoff_after=None,
+                        progress_interval=None):
+    """
+    Configure the keepalive scheduler of this process.
+
+    :param interval: Time between keepalive messages in seconds
+    :param adaptive: Back off the interval for long-running jobs
+    :param max_interval: Upper bound for the adaptive interval
+    :param backoff_after: Job age in seconds after which the interval starts doubling
+    :param progress_interval: Minimum time between progress updates of a job
+    """
+    scheduler.configure(interval, adaptive, max_interval, backoff_after, progress_interval)
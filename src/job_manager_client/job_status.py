@@ -1,17 +1,69 @@
-from .utils.connections import keydb_conn, redis_conn
+from .utils.connections import keydb_conn, keydb_raw_conn, redis_conn
+from .encoding import (
+    RESULT_CODEC, RESULT_COMPRESSION, RESULT_COMPRESS_THRESHOLD, TEXT_CODECS,
+    EncodedResult, check_codec, encode_result, decode_result, payload_size
+)
+from . import retention
+from .metrics import metrics
+from . import events
+from .publisher import publisher
+from .streaming import (
+    RESULT_CHUNK_SIZE, RESULT_CHUNK_THRESHOLD, ChunkedResult, chunk_key, read_chunked_result
+)
 import json
 import time
+import contextvars
 
+# Results whose encoded size is below this are sent inline in the COMPLETE message
+INLINE_RESULT_LIMIT = 1000000
 
-class JobStatus:
+# Status of the job the current thread or asyncio task is working on
+_current_job = contextvars.ContextVar('current_job', default=None)
+
+
+def _encode_value(value):
+    """Encode a value the way it is stored in the status hash."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, str):
+        return value
+    return str(value)
+
+
+def _splice_json(message: dict, key: str, encoded_json: str) -> str:
+    """Serialize message with an already JSON-encoded value appended under key."""
+    head = json.dumps(message)
+    return f'{head[:-1]}, "{key}": {encoded_json}}}'
+
+
+class BaseJobStatus:
     """
-    Handles job status updates and result storage using Redis pub/sub and KeyDB
+    Key layout and message building shared by the sync and asyncio job status
     """
 
-    def __init__(self, job_id: str):
-        self.keydb_conn = keydb_conn
-        self.redis_conn = redis_conn
+    def __init__(self, job_id: str, codec=RESULT_CODEC, compression=RESULT_COMPRESSION,
+                 compress_threshold=RESULT_COMPRESS_THRESHOLD):
+        """
+        :param job_id: The job id
+        :param codec: Codec used to encode results (json, msgpack or a registered codec)
+        :param compression: Optional compression (zlib or lzma) for large results
+        :param compress_threshold: Minimum encoded size in bytes before compressing
+        """
+        check_codec(codec, compression)
         self.job_id = job_id
+        self.codec = codec
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self._progress = None
+        self._progress_sent = None
+        # (key, ttl) of a single-flight lock held by this job
+        self._flight_lock = None
+        # Seconds spent per job phase, see metrics.PHASES
+        self.timings = {}
+        # success, error or cached once complete() was called
+        self.outcome = None
+        # Name of the RQ queue the job came from, labels its queue_wait
+        self.queue = None
 
     @property
     def _status_channel(self):
@@ -21,16 +73,211 @@ class JobStatus:
     def _status_key(self):
         return f'job:{self.job_id}:status'
 
+    def _chunk_key(self, index: int):
+        return chunk_key(self.job_id, index)
+
+    def progress(self, value=None, message=None, **metrics):
+        """
+        Report progress of the running job.
+
+        This only records the report, so it is cheap enough to call from a
+        tight loop. The latest report rides along with the next keepalive and
+        is stored in the ``progress`` field of the status hash, at most once
+        per progress interval; older unsent reports are dropped.
+
+        :param value: Progress, e.g. percent complete
+        :param message: Short human readable description
+        :param metrics: Additional intermediate values to report
+        """
+        update = {}
+        if value is not None:
+            update['value'] = value
+        if message is not None:
+            update['message'] = message
+        if metrics:
+            update['metrics'] = metrics
+        self._progress = update
+
+    def _progress_pending(self):
+        return self._progress is not self._progress_sent
+
+    def _take_progress(self):
+        """Return the latest unsent progress report, or None."""
+        update = self._progress
+        if update is self._progress_sent:
+            return None
+        self._progress_sent = update
+        return update
+
+    def _apply_retention(self, fields: dict):
+        """
+        Apply the retention policy to the completion fields.
+
+        Large results are moved to the policy's result store, leaving a
+        ``result_ref`` in the hash.
+
+        :return: Tuple of (fields, keys to expire, TTL in seconds or 0)
+        """
+        policy = retention.policy
+        if 'result' in fields and policy.offloads(payload_size(fields['result'])):
+            fields = dict(fields)
+            fields['result_ref'] = policy.result_store.put(self.job_id, fields.pop('result'))
+
+        ttl = policy.ttl(success='error' not in fields)
+        if not ttl:
+            return fields, [], 0
+        keys = [self._status_key, f'job:{self.job_id}:params']
+        keys += [self._chunk_key(index) for index in range(int(fields.get('chunks', 0)))]
+        return fields, keys, ttl
+
+    def encode(self, result):
+        """Encode a result with this job's codec settings."""
+        return EncodedResult(*encode_result(result, self.codec, self.compression, self.compress_threshold))
+
+    def _completion(self, result=None, error=None, cached=False):
+        """
+        Build the hash fields and the serialized COMPLETE message.
+
+        The result (or error) is encoded once and the same payload is reused
+        for the hash field, the size check and the inline message. The codec
+        id is stored next to the result so readers can decode it. An
+        EncodedResult is used as it is.
+
+        :param cached: Mark the result as served from the result cache
+        :return: Tuple of (hash fields, message string)
+        """
+        message = {
+            'status': 'COMPLETE',
+            'success': not error,
+            'timestamp': time.time()
+        }
+        if cached:
+            message['cached'] = True
+
+        if error:
+            encoded = _encode_value(error)
+            inline = encoded if isinstance(error, (dict, list)) else json.dumps(error)
+            return {'error': encoded, 'status': 'COMPLETE'}, _splice_json(message, 'error', inline)
+
+        if result is None:
+            return {'status': 'COMPLETE'}, json.dumps(message)
+
+        if isinstance(result, ChunkedResult):
+            message.update({
+                'result_size': result.size,
+                'result_key': self._status_key,
+                'chunked': result.mode,
+                'chunks': result.chunks
+            })
+            fields = {'chunked': result.mode, 'chunks': result.chunks, 'status': 'COMPLETE'}
+            if result.codec:
+                message['codec'] = fields['codec'] = result.codec
+            return fields, json.dumps(message)
+
+        if isinstance(result, EncodedResult):
+            codec_id, encoded = result.codec, result.payload
+            if codec_id in TEXT_CODECS and isinstance(encoded, bytes):
+                encoded = encoded.decode('utf-8')
+        else:
+            codec_id, encoded = encode_result(
+                result, self.codec, self.compression, self.compress_threshold
+            )
+        result_size = payload_size(encoded)
+        message['result_size'] = result_size
+        message['result_key'] = self._status_key
+        message['codec'] = codec_id
+        fields = {'result': encoded, 'codec': codec_id, 'status': 'COMPLETE'}
+
+        # Include result in message only if it's small enough and plain text
+        if codec_id not in TEXT_CODECS or result_size >= INLINE_RESULT_LIMIT:
+            return fields, json.dumps(message)
+        if codec_id == 'json':
+            inline = encoded
+        else:
+            inline = json.dumps(encoded if isinstance(result, EncodedResult) else result)
+        return fields, _splice_json(message, 'result', inline)
+
+
+def current_job_status():
+    """Return the status object of the job being processed, or None outside a job."""
+    return _current_job.get()
+
+
+def report_progress(value=None, message=None, **metrics):
+    """
+    Report progress of the job being processed from inside a task function.
+
+    Does nothing when called outside a job, so tasks can still be run
+    directly. See BaseJobStatus.progress for the arguments.
+    """
+    job_status = _current_job.get()
+    if job_status is not None:
+        job_status.progress(value, message, **metrics)
+
+
+class JobStatus(BaseJobStatus):
+    """
+    Handles job status updates and result storage using Redis pub/sub and KeyDB
+    """
+
+    def __init__(self, job_id: str, chunk_size=RESULT_CHUNK_SIZE,
+                 chunk_threshold=RESULT_CHUNK_THRESHOLD, **codec_options):
+        """
+        :param job_id: The job id
+        :param chunk_size: Size of the chunks large results are split into
+        :param chunk_threshold: Encoded results larger than this are stored as chunks
+        :param codec_options: Codec settings, see BaseJobStatus
+        """
+        super().__init__(job_id, **codec_options)
+        self.keydb_conn = keydb_conn
+        self.keydb_raw_conn = keydb_raw_conn
+        self.redis_conn = redis_conn
+        self.chunk_size = chunk_size
+        self.chunk_threshold = chunk_threshold
+
+    def get_result(self):
+        """
+        Read the stored result and decode it with its codec.
+
+        Chunked results are read completely; items results come back as a list.
+
+        :return: The decoded result, or None if no result is stored
+        """
+        data, codec_id, chunked, result_ref = self.keydb_raw_conn.hmget(
+            self._status_key, ['result', 'codec', 'chunked', 'result_ref']
+        )
+        if chunked is not None:
+            return read_chunked_result(self.job_id, self.keydb_raw_conn)
+        if result_ref is not None:
+            data = retention.read_offloaded(result_ref)
+        if codec_id is not None:
+            codec_id = codec_id.decode()
+        return decode_result(codec_id, data)
+
     def _send_status_message(self, message: dict):
         """Send a status message to the client."""
         try:
             # Ensure message is JSON serializable and includes timestamp
             message['timestamp'] = time.time()
             message_str = json.dumps(message)
-            self.redis_conn.publish(self._status_channel, message_str)
+            if publisher.enabled:
+                publisher.publish(self.job_id, message_str)
+                return
+            events.transport.send(self.redis_conn, self.job_id, message_str)
+            metrics.bytes_published.inc(len(message_str))
         except Exception as e:
+            metrics.error('status_message')
             print(f"Error sending status message: {e}")
 
+    def _failure_message(self, error_info: str) -> str:
+        """COMPLETE message of a job whose result could not be handled."""
+        return json.dumps({
+            'status': 'COMPLETE',
+            'success': False,
+            'error': error_info,
+            'timestamp': time.time()
+        })
+
     def _update_job(self, key: str, value):
         """Update the status of the job in keydb."""
         try:
@@ -41,8 +288,12 @@ class JobStatus:
                 value = str(value)
             
             # Store in KeyDB
+            if publisher.enabled:
+                publisher.update(self._status_key, {key: value})
+                return
             self.keydb_conn.hset(self._status_key, key, value)
         except Exception as e:
+            metrics.error('status_update')
             print(f"Error updating job status: {e}")
 
     def start(self):
@@ -62,63 +313,126 @@ class JobStatus:
                 'keepalive': True,
                 'timestamp': time.time()
             })
+            metrics.keepalives_sent.inc()
         except Exception as e:
             print(f"Error sending keepalive: {e}")
 
-    def complete(self, result=None, error=None):
+    def _write_chunk(self, index: int, payload, codec_id=None):
+        """
+        Store one chunk, bump the chunk count and announce it.
+
+        With the background publisher enabled all of it happens on its
+        thread, still in that order.
+        """
+        key = self._chunk_key(index)
+        mapping = {'data': payload}
+        if codec_id is not None:
+            mapping['codec'] = codec_id
+        message = {
+            'status': 'IN_PROGRESS',
+            'chunk': index,
+            'chunk_key': key,
+            'chunk_size': payload_size(payload),
+            'timestamp': time.time()
+        }
+        if publisher.enabled:
+            publisher.chunk(self, index, mapping, json.dumps(message))
+            return
+
+        pipe = self.keydb_conn.pipeline(transaction=True)
+        pipe.hset(key, mapping=mapping)
+        pipe.hset(self._status_key, 'chunks', index + 1)
+        pipe.execute()
+
+        self._send_status_message(message)
+
+    def write_chunks(self, pieces):
+        """
+        Write the pieces of a streamed result as numbered chunks.
+
+        Pieces are encoded and stored one at a time, so a generator is never
+        collected in memory. Readers can follow along with
+        ``streaming.iter_result_chunks`` while the job is still running.
+
+        :param pieces: Iterable of result pieces
+        :return: ChunkedResult to pass to complete()
+        """
+        index = size = 0
+        for piece in pieces:
+            codec_id, payload = encode_result(
+                piece, self.codec, self.compression, self.compress_threshold
+            )
+            self._write_chunk(index, payload, codec_id)
+            size += payload_size(payload)
+            index += 1
+        return ChunkedResult('items', index, size)
+
+    def _split_into_chunks(self, payload, codec_id):
+        """Store an encoded result as consecutive byte slices."""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        view = memoryview(payload)
+        chunks = 0
+        for start in range(0, view.nbytes, self.chunk_size):
+            self._write_chunk(chunks, view[start:start + self.chunk_size])
+            chunks += 1
+        return ChunkedResult('bytes', chunks, view.nbytes, codec_id)
+
+    def _write_completion(self, fields: dict, message_str: str):
+        """
+        Store the completion fields in one MULTI/EXEC, then publish.
+
+        The publish only happens after the hash write succeeded, so a client
+        can never see the COMPLETE message before the result is stored. The
+        retention TTL is set in the same transaction. With the background
+        publisher enabled both happen on its thread.
+        """
+        if publisher.enabled:
+            publisher.complete(self, fields, message_str)
+            return
+        started = time.perf_counter()
+        fields, expire_keys, ttl = self._apply_retention(fields)
+        pipe = self.keydb_conn.pipeline(transaction=True)
+        pipe.hset(self._status_key, mapping=fields)
+        for key in expire_keys:
+            pipe.expire(key, ttl)
+        pipe.execute()
+        written = time.perf_counter()
+        events.transport.send(self.redis_conn, self.job_id, message_str)
+        self.timings['keydb_write'] = written - started
+        self.timings['publish'] = time.perf_counter() - written
+        metrics.bytes_published.inc(len(message_str))
+
+    def complete(self, result=None, error=None, cached=False):
         """
         Send complete message and set result or error
         
-        :param result: The result data to store
+        :param result: The result data to store, or an EncodedResult
         :param error: Error information if the job failed
+        :param cached: The result was served from the result cache
         """
+        self.outcome = 'error' if error is not None else 'cached' if cached else 'success'
         try:
-            success = error is None
-            self._update_job('status', 'COMPLETE')
-            
-            if error:
-                self._update_job('error', error)
-                self._send_status_message({
-                    'status': 'COMPLETE',
-                    'success': False,
-                    'error': error,
-                    'timestamp': time.time()
-                })
-                return None
-
-            if result is None:
-                self._send_status_message({
-                    'status': 'COMPLETE',
-                    'success': True,
-                    'timestamp': time.time()
-                })
-                return None
-
-            # Store the result
-            self._update_job('result', result)
-            
-            # Convert result to string for size check
-            str_result = json.dumps(result) if isinstance(result, (dict, list)) else str(result)
-            result_size = len(str_result)
-            
-            # Send appropriate message based on result size
-            message = {
-                'status': 'COMPLETE',
-                'success': True,
-                'timestamp': time.time(),
-                'result_size': result_size,
-                'result_key': self._status_key
-            }
-            
-            # Include result in message only if it's small enough
-            if result_size < 1000000:
-                message['result'] = result
-                
-            self._send_status_message(message)
+            started = time.perf_counter()
+            fields, message_str = self._completion(result, error, cached)
+            self.timings['serialize'] = time.perf_counter() - started
+            size = payload_size(fields['result']) if 'result' in fields else 0
+            if size > self.chunk_threshold and not retention.policy.offloads(size):
+                chunked = self._split_into_chunks(fields['result'], fields['codec'])
+                fields, message_str = self._completion(chunked, cached=cached)
+            self._write_completion(fields, message_str)
             
         except Exception as e:
+            self.outcome = 'error'
+            metrics.error('result')
             error_info = f"Failed to handle result: {str(e)}"
+            if publisher.enabled:
+                # Buffered as a completion, which a full buffer never drops
+                publisher.complete(self, {'error': error_info, 'status': 'COMPLETE'},
+                                   self._failure_message(error_info))
+                return None
             self._update_job('error', error_info)
+            self._update_job('status', 'COMPLETE')
             self._send_status_message({
                 'status': 'COMPLETE',
                 'success': False,
@@ -0,0 +1,260 @@
+import os
+import time
+import bisect
+import threading
+import traceback
+from datetime import timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Port to serve metrics on (0 disables the endpoint); pool children use port + slot
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Phases of a job that are timed
+PHASES = ('queue_wait', 'params', 'task', 'serialize', 'keydb_write', 'publish')
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0
+)
+
+
+class Counter:
+    """A monotonically increasing value."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Counts observations into fixed buckets, like a Prometheus histogram."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """
+        :return: Tuple of (cumulative counts per bucket including +Inf, sum, count)
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class Metrics:
+    """
+    In-process job metrics.
+
+    Per-phase latency histograms are fed from the timings every job collects
+    on its JobStatus, and counters track keepalives, published bytes, job
+    outcomes and errors. Hooks receive every job's timings, e.g. to forward
+    them to another metrics system. Collectors add lines computed at scrape
+    time, such as queue depths.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.phases = {phase: Histogram(buckets) for phase in PHASES}
+        # queue_wait per RQ queue
+        self.queue_waits = {}
+        self.keepalives_sent = Counter()
+        self.bytes_published = Counter()
+        self.outcomes = {outcome: Counter() for outcome in ('success', 'error', 'cached')}
+        self.errors = {}
+        self._hooks = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def error(self, kind: str):
+        """Count an error of the given kind."""
+        counter = self.errors.get(kind)
+        if counter is None:
+            with self._lock:
+                counter = self.errors.setdefault(kind, Counter())
+        counter.inc()
+
+    def add_hook(self, hook):
+        """
+        Call ``hook(job_id, timings, outcome)`` after every job.
+
+        ``timings`` maps phase names to seconds, ``outcome`` is ``success``,
+        ``error`` or ``cached``.
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def add_collector(self, collector):
+        """Call ``collector()`` on every render and append the exposition lines it returns."""
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector):
+        self._collectors.remove(collector)
+
+    def _queue_wait(self, queue: str) -> Histogram:
+        histogram = self.queue_waits.get(queue)
+        if histogram is None:
+            with self._lock:
+                histogram = self.queue_waits.setdefault(queue, Histogram(self.buckets))
+        return histogram
+
+    def record_job(self, job_status):
+        """Record the timings and outcome collected on a job status."""
+        timings = job_status.timings
+        for phase, seconds in timings.items():
+            histogram = self.phases.get(phase)
+            if histogram is not None:
+                histogram.observe(seconds)
+        if job_status.queue is not None and 'queue_wait' in timings:
+            self._queue_wait(job_status.queue).observe(timings['queue_wait'])
+        outcome = job_status.outcome
+        if outcome in self.outcomes:
+            self.outcomes[outcome].inc()
+
+        for hook in self._hooks:
+            try:
+                hook(job_status.job_id, timings, outcome)
+            except Exception as e:
+                print(f"Error in metrics hook: {e}")
+                traceback.print_exc()
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = [
+            '# HELP job_phase_seconds Time spent in each phase of a job',
+            '# TYPE job_phase_seconds histogram',
+        ]
+        for phase, histogram in self.phases.items():
+            cumulative, total, count = histogram.snapshot()
+            for bound, value in zip(histogram.buckets, cumulative):
+                lines.append(f'job_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {value}')
+            lines.append(f'job_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {count}')
+            lines.append(f'job_phase_seconds_sum{{phase="{phase}"}} {total}')
+            lines.append(f'job_phase_seconds_count{{phase="{phase}"}} {count}')
+
+        lines += [
+            '# HELP job_queue_wait_seconds Time jobs waited in each queue',
+            '# TYPE job_queue_wait_seconds histogram',
+        ]
+        for queue, histogram in sorted(self.queue_waits.items()):
+            cumulative, total, count = histogram.snapshot()
+            for bound, value in zip(histogram.buckets, cumulative):
+                lines.append(f'job_queue_wait_seconds_bucket{{queue="{queue}",le="{bound}"}} {value}')
+            lines.append(f'job_queue_wait_seconds_bucket{{queue="{queue}",le="+Inf"}} {count}')
+            lines.append(f'job_queue_wait_seconds_sum{{queue="{queue}"}} {total}')
+            lines.append(f'job_queue_wait_seconds_count{{queue="{queue}"}} {count}')
+
+        lines += [
+            '# HELP job_completed_total Completed jobs by outcome',
+            '# TYPE job_completed_total counter',
+        ]
+        for outcome, counter in self.outcomes.items():
+            lines.append(f'job_completed_total{{outcome="{outcome}"}} {counter.value}')
+
+        lines += [
+            '# HELP job_keepalives_sent_total Keepalive messages published',
+            '# TYPE job_keepalives_sent_total counter',
+            f'job_keepalives_sent_total {self.keepalives_sent.value}',
+            '# HELP job_published_bytes_total Bytes of status messages published',
+            '# TYPE job_published_bytes_total counter',
+            f'job_published_bytes_total {self.bytes_published.value}',
+            '# HELP job_errors_total Errors by kind',
+            '# TYPE job_errors_total counter',
+        ]
+        for kind, counter in sorted(self.errors.items()):
+            lines.append(f'job_errors_total{{kind="{kind}"}} {counter.value}')
+
+        for collector in self._collectors:
+            try:
+                lines += collector()
+            except Exception as e:
+                self.error('collector')
+                print(f"Error in metrics collector: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+def queue_wait(job) -> float:
+    """Seconds between a job being enqueued and now, 0 if unknown."""
+    enqueued_at = job.enqueued_at
+    if enqueued_at is None:
+        return 0.0
+    if enqueued_at.tzinfo is None:
+        # RQ stores UTC timestamps without a timezone
+        enqueued_at = enqueued_at.replace(tzinfo=timezone.utc)
+    return max(time.time() - enqueued_at.timestamp(), 0.0)
+
+
+# Metrics of this process
+metrics = Metrics()
+
+
+def add_metrics_hook(hook):
+    """Call ``hook(job_id, timings, outcome)`` after every job of this process."""
+    metrics.add_hook(hook)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent, keep them out of the worker output
+        pass
+
+
+# (addr, port) -> (pid, server) of the metrics servers started in this process
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, addr: str = '0.0.0.0'):
+    """
+    Serve this process's metrics for Prometheus on ``http://{addr}:{port}/metrics``.
+
+    Calling it again for the same address returns the running server, so
+    every start_worker call of a process can ask for it. Port 0 starts a new
+    server on a free port.
+
+    :return: The HTTP server, running on a daemon thread
+    """
+    with _servers_lock:
+        pid, server = _servers.get((addr, port), (None, None))
+        # A forked child inherits the entry but not the serving thread
+        if port and pid == os.getpid():
+            return server
+        server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, name='job-metrics', daemon=True)
+        thread.start()
+        if port:
+            _servers[(addr, port)] = (os.getpid(), server)
+        return server
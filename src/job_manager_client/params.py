@@ -0,0 +1,93 @@
+import json
+from job_manager_client.utils.connections import keydb_raw_conn
+from job_manager_client.encoding import encode_result, decode_result
+
+# Params blobs that are not plain JSON start with this byte, followed by the
+# codec id and another separator byte. JSON text never starts with it.
+PARAMS_HEADER = b'\x00'
+
+
+def params_key(job_id: str) -> str:
+    return f'job:{job_id}:params'
+
+
+def encode_params(params, codec='json', compression=None, compress_threshold=0):
+    """
+    Encode job params for storage in KeyDB.
+
+    JSON params without compression are stored as plain JSON, exactly as
+    before. Any other codec or compression gets a small header naming the
+    codec, so large binary inputs can skip the JSON decode in the worker.
+
+    :param params: The params, or bytes to pass to the task unchanged
+    :param codec: Codec to encode with (json, msgpack or a registered codec)
+    :param compression: Optional compression (zlib or lzma)
+    :param compress_threshold: Minimum encoded size in bytes before compressing
+    :return: str or bytes to store under ``job:{id}:params``
+    """
+    if codec == 'json' and compression is None and isinstance(params, (dict, list)):
+        return json.dumps(params)
+
+    codec_id, payload = encode_result(params, codec, compression, compress_threshold)
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    return PARAMS_HEADER + codec_id.encode() + PARAMS_HEADER + bytes(payload)
+
+
+def decode_params(data):
+    """
+    Decode a params blob written by encode_params or as plain JSON.
+
+    :param data: The stored value as bytes or str
+    """
+    if data is None:
+        return None
+    if isinstance(data, bytes) and data[:1] == PARAMS_HEADER:
+        codec_id, payload = data[1:].split(PARAMS_HEADER, 1)
+        return decode_result(codec_id.decode(), payload)
+    return json.loads(data)
+
+
+def store_params(job_id: str, params, codec='json', compression=None, connection=None, **kwargs):
+    """
+    Store the params of a job in KeyDB, for jobs enqueued without arguments.
+
+    :param job_id: The job id
+    :param params: The params to store
+    :param codec: Codec to encode with, see encode_params
+    :param compression: Optional compression (zlib or lzma)
+    :param connection: KeyDB connection (defaults to keydb_raw_conn)
+    :param kwargs: Passed on to SET, e.g. ``ex`` for an expiry
+    """
+    connection = connection if connection is not None else keydb_raw_conn
+    connection.set(params_key(job_id), encode_params(params, codec, compression), **kwargs)
+
+
+def load_params(jobs, params_list=None, connection=None):
+    """
+    Return the params of several jobs, fetching all that are stored in KeyDB
+    with a single MGET.
+
+    A job's params are its first argument; jobs enqueued without arguments
+    (or with empty params) read them from ``job:{id}:params``.
+
+    :param jobs: The RQ job objects
+    :param params_list: Params already known for some jobs, None where unknown
+    :param connection: KeyDB connection without response decoding
+    :return: List of params in the order of jobs
+    """
+    connection = connection if connection is not None else keydb_raw_conn
+    params_list = list(params_list) if params_list is not None else [None] * len(jobs)
+    missing = []
+    for index, job in enumerate(jobs):
+        if params_list[index] is None:
+            params_list[index] = job.args[0] if job.args else {}
+            if not params_list[index]:
+                missing.append(index)
+
+    if missing:
+        stored = connection.mget([params_key(jobs[index].id) for index in missing])
+        for index, data in zip(missing, stored):
+            if data is not None:
+                params_list[index] = decode_params(data)
+    return params_list
@@ -0,0 +1,145 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import time
+import resource
+import traceback
+
+# Slot number of this process in its WorkerPool, None outside a pool
+_slot = None
+
+# Exit code of a child that stopped to be replaced, e.g. after reaching its memory limit
+RECYCLE_EXIT_CODE = 75
+
+
+def worker_slot():
+    """Return the pool slot of the current child process, or None."""
+    return _slot
+
+
+def rss_bytes() -> int:
+    """Return the resident set size of the current process in bytes."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Without /proc only the peak is known
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class WorkerPool:
+    """
+    Supervises a fixed number of forked worker processes.
+
+    Each child runs ``target(*args, **kwargs)`` on its own. Children that exit
+    cleanly are not replaced unless ``restart_on_exit`` is set, children that
+    crash are restarted after ``restart_delay`` seconds, and SIGTERM/SIGINT received by the parent is forwarded to every
+    child so they can finish their current job before exiting. A target that
+    returns True asks to be recycled and is replaced right away.
+    """
+
+    def __init__(self, target, args=(), size=None, restart_delay=1.0, kwargs=None,
+                 restart_on_exit=False):
+        """
+        :param target: Function run in every child process
+        :param args: Positional arguments passed to ``target``
+        :param size: Number of child processes (defaults to the CPU count)
+        :param restart_delay: Seconds to wait before restarting a crashed child
+        :param kwargs: Keyword arguments passed to ``target``
+        :param restart_on_exit: Also replace children that exit cleanly, for
+            workers that recycle themselves after a number of jobs
+        """
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.size = size or os.cpu_count() or 1
+        self.restart_delay = restart_delay
+        self.restart_on_exit = restart_on_exit
+        self._context = multiprocessing.get_context('fork')
+        self._processes = {}
+        self._restart_at = {}
+        self._stopping = False
+
+    def _child_main(self, slot):
+        """Entry point of a forked child."""
+        global _slot
+        _slot = slot
+        # The parent's forwarding handlers must not run in the child
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        if self.target(*self.args, **self.kwargs) is True:
+            sys.exit(RECYCLE_EXIT_CODE)
+
+    def _spawn(self, slot):
+        process = self._context.Process(
+            target=self._child_main,
+            args=(slot,),
+            name=f'job-worker-{slot}'
+        )
+        process.start()
+        self._processes[slot] = process
+
+    def _request_stop(self, signum, frame):
+        """Forward a shutdown signal to all children."""
+        self._stopping = True
+        self._restart_at.clear()
+        for process in self._processes.values():
+            if process.is_alive():
+                try:
+                    os.kill(process.pid, signum)
+                except ProcessLookupError:
+                    pass
+
+    def _reap(self):
+        """Collect exited children and schedule restarts for crashed ones."""
+        for slot, process in list(self._processes.items()):
+            if process.exitcode is None:
+                continue
+            process.join()
+            del self._processes[slot]
+            if self._stopping:
+                continue
+            if process.exitcode == RECYCLE_EXIT_CODE or (process.exitcode == 0 and self.restart_on_exit):
+                self._restart_at[slot] = time.monotonic()
+            elif process.exitcode != 0:
+                print(f"Worker process {process.pid} exited with code {process.exitcode}, restarting")
+                self._restart_at[slot] = time.monotonic() + self.restart_delay
+
+    def _restart_due(self):
+        now = time.monotonic()
+        for slot, restart_at in list(self._restart_at.items()):
+            if restart_at <= now:
+                del self._restart_at[slot]
+                self._spawn(slot)
+
+    def run(self):
+        """Start the children and supervise them until all have exited."""
+        previous_handlers = {
+            sig: signal.signal(sig, self._request_stop)
+            for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            for slot in range(self.size):
+                self._spawn(slot)
+
+            while self._processes or self._restart_at:
+                sentinels = [p.sentinel for p in self._processes.values()]
+                if sentinels:
+                    multiprocessing.connection.wait(sentinels, timeout=self.restart_delay)
+                else:
+                    time.sleep(self.restart_delay)
+                self._reap()
+                self._restart_due()
+        except Exception as e:
+            print(f"Error supervising worker processes: {e}")
+            traceback.print_exc()
+            self._request_stop(signal.SIGTERM, None)
+            for process in self._processes.values():
+                process.join()
+            raise
+        finally:
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
@@ -0,0 +1,165 @@
+import os
+import io
+import json
+import time
+import pstats
+import random
+import cProfile
+import threading
+import contextlib
+import tracemalloc
+from job_manager_client.utils.connections import keydb_conn
+
+# Fraction of jobs that are profiled (0 profiles only jobs that ask for it)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+# Number of functions and allocation sites kept per profile
+PROFILE_TOP = int(os.getenv('PROFILE_TOP', '25'))
+# Also trace memory allocations of profiled jobs
+PROFILE_MEMORY = os.getenv('PROFILE_MEMORY', '0').lower() in ('1', 'true', 'yes')
+# Seconds a stored profile is kept
+PROFILE_TTL = int(os.getenv('PROFILE_TTL', '86400'))
+# Number of profiles kept in the index of slowest jobs
+PROFILE_INDEX_SIZE = int(os.getenv('PROFILE_INDEX_SIZE', '1000'))
+
+# Held while a job of this process is profiled, Python allows one active profiler
+_profiling_lock = threading.Lock()
+
+
+def profile_key(job_id: str) -> str:
+    return f'job:{job_id}:profile'
+
+
+class Profiler:
+    """
+    Profiles a sample of jobs with cProfile and optionally tracemalloc.
+
+    A job is profiled with probability ``sample_rate``, or whenever its params
+    are a dict with a truthy ``_profile`` entry. The top functions by
+    cumulative time, and with ``memory`` the peak traced memory and top
+    allocation sites, are stored as JSON under ``job:{id}:profile``. A sorted
+    set indexes the profiles by wall time, see ``slowest``.
+
+    Only one job per process is profiled at a time, since Python 3.12 refuses
+    a second active profiler. A sampled job that starts while another job is
+    profiled runs unprofiled. tracemalloc is process wide too: when jobs run
+    on several threads, the memory figures of a profiled job include
+    allocations of the other threads. Profiling errors never fail the job.
+    """
+
+    def __init__(self, sample_rate=PROFILE_SAMPLE_RATE, top=PROFILE_TOP, memory=PROFILE_MEMORY,
+                 ttl=PROFILE_TTL, index_size=PROFILE_INDEX_SIZE, param_key='_profile',
+                 index_key='job_profiles', connection=None):
+        """
+        :param sample_rate: Fraction of jobs to profile
+        :param top: Number of functions and allocation sites to keep
+        :param memory: Also trace memory allocations
+        :param ttl: Seconds a profile is kept
+        :param index_size: Number of profiles kept in the index of slowest jobs
+        :param param_key: Params entry that requests profiling of a job
+        :param index_key: Key of the sorted set indexing profiles by wall time
+        :param connection: KeyDB connection
+        """
+        self.sample_rate = sample_rate
+        self.top = top
+        self.memory = memory
+        self.ttl = ttl
+        self.index_size = index_size
+        self.param_key = param_key
+        self.index_key = index_key
+        self.connection = connection if connection is not None else keydb_conn
+
+    def wants(self, params) -> bool:
+        """Whether the job with these params should be profiled."""
+        if isinstance(params, dict) and params.get(self.param_key):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextlib.contextmanager
+    def profile(self, job_status):
+        """Profile the enclosed task execution and store the result."""
+        if not _profiling_lock.acquire(blocking=False):
+            # Another job is being profiled, run this one unsampled
+            yield
+            return
+
+        tracing = False
+        try:
+            profiler = cProfile.Profile()
+            try:
+                # Leave tracing started by someone else alone
+                tracing = self.memory and not tracemalloc.is_tracing()
+                if tracing:
+                    tracemalloc.start()
+                started = time.perf_counter()
+                profiler.enable()
+            except Exception as e:
+                print(f"Error starting job profile: {e}")
+                profiler = None
+
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    try:
+                        profiler.disable()
+                        report = {'wall_time': time.perf_counter() - started,
+                                  'functions': self._top_functions(profiler)}
+                        if tracing:
+                            report.update(self._memory_report())
+                        self.store(job_status.job_id, report)
+                    except Exception as e:
+                        print(f"Error storing job profile: {e}")
+        finally:
+            if tracing:
+                tracemalloc.stop()
+            _profiling_lock.release()
+
+    def _top_functions(self, profiler):
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        functions = []
+        for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+            functions.append({
+                'function': f'{filename}:{line}({name})',
+                'calls': calls,
+                'total_time': total,
+                'cumulative_time': cumulative
+            })
+        functions.sort(key=lambda entry: entry['cumulative_time'], reverse=True)
+        return functions[:self.top]
+
+    def _memory_report(self):
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        return {
+            'peak_memory': peak,
+            'allocations': [
+                {'location': str(stat.traceback), 'size': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:self.top]
+            ]
+        }
+
+    def store(self, job_id: str, report: dict):
+        """Store a profile report and index it by wall time."""
+        key = profile_key(job_id)
+        pipe = self.connection.pipeline(transaction=True)
+        if self.ttl:
+            pipe.set(key, json.dumps(report), ex=self.ttl)
+        else:
+            pipe.set(key, json.dumps(report))
+        pipe.zadd(self.index_key, {job_id: report['wall_time']})
+        # Keep the slowest index_size entries
+        pipe.zremrangebyrank(self.index_key, 0, -self.index_size - 1)
+        pipe.execute()
+
+    def slowest(self, count=10):
+        """
+        Return the stored profiles of the slowest profiled jobs.
+
+        :return: List of (job_id, report) tuples, slowest first
+        """
+        job_ids = self.connection.zrevrange(self.index_key, 0, count - 1)
+        if not job_ids:
+            return []
+        reports = self.connection.mget([profile_key(job_id) for job_id in job_ids])
+        return [(job_id, json.loads(report)) for job_id, report in zip(job_ids, reports)
+                if report is not None]
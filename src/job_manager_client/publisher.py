@@ -0,0 +1,286 @@
+import os
+import time
+import atexit
+import threading
+import traceback
+import collections
+from redis.exceptions import ConnectionError, TimeoutError
+from job_manager_client.utils.connections import redis_conn, keydb_conn
+from job_manager_client.metrics import metrics
+from job_manager_client import events
+
+# Send status updates from a background thread instead of the task's thread
+STATUS_PUBLISHER = os.getenv('STATUS_PUBLISHER', '0').lower() in ('1', 'true', 'yes')
+# Maximum number of buffered non-terminal updates; more are dropped while the buffer is full
+STATUS_PUBLISHER_QUEUE_SIZE = int(os.getenv('STATUS_PUBLISHER_QUEUE_SIZE', '10000'))
+# Maximum number of updates written per pipelined round trip
+STATUS_PUBLISHER_BATCH_SIZE = int(os.getenv('STATUS_PUBLISHER_BATCH_SIZE', '500'))
+# Longest wait between retries while Redis or KeyDB is unreachable
+STATUS_PUBLISHER_MAX_BACKOFF = float(os.getenv('STATUS_PUBLISHER_MAX_BACKOFF', '5'))
+
+
+class BackgroundPublisher:
+    """
+    Writes status updates on a background thread, in pipelined batches.
+
+    Status hash updates, status messages and completions are appended to an
+    in-memory buffer and return immediately. A single thread drains the
+    buffer in order, so updates of a job are applied in the order they were
+    made: each batch writes its KeyDB updates (completions in MULTI/EXEC)
+    first and then publishes its messages, so a COMPLETE message still never
+    arrives before its result is stored.
+
+    While Redis or KeyDB is unreachable the batch is retried with exponential
+    backoff. Once ``max_size`` updates are buffered, further start and
+    progress messages are dropped and counted; result chunks and completions
+    are always buffered. If KeyDB rejects a batch, e.g. when it is out of
+    memory, its completions, and later completions of jobs that lost a chunk,
+    are published as failed, since their results were not stored. ``flush`` waits until everything buffered is written and is
+    called when a worker exits. Completions that could still not be written
+    are reported by job id.
+    """
+
+    def __init__(self, enabled=STATUS_PUBLISHER, max_size=STATUS_PUBLISHER_QUEUE_SIZE,
+                 batch_size=STATUS_PUBLISHER_BATCH_SIZE, max_backoff=STATUS_PUBLISHER_MAX_BACKOFF,
+                 redis_connection=None, keydb_connection=None):
+        """
+        :param enabled: Route JobStatus updates through this publisher
+        :param max_size: Maximum number of buffered non-terminal updates
+        :param batch_size: Maximum number of updates per round trip
+        :param max_backoff: Longest wait between retries in seconds
+        :param redis_connection: Redis connection messages are sent on
+        :param keydb_connection: KeyDB connection status hashes are written with
+        """
+        self.enabled = enabled
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.redis_connection = redis_connection if redis_connection is not None else redis_conn
+        self.keydb_connection = keydb_connection if keydb_connection is not None else keydb_conn
+        self.dropped = 0
+        self._lost_chunks = set()
+        self._items = collections.deque()
+        self._in_flight = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def configure(self, enabled=None, max_size=None, batch_size=None, max_backoff=None):
+        if enabled is not None:
+            self.enabled = enabled
+        if max_size is not None:
+            self.max_size = max_size
+        if batch_size is not None:
+            self.batch_size = batch_size
+        if max_backoff is not None:
+            self.max_backoff = max_backoff
+
+    def _ensure_thread(self):
+        # A forked child inherits the buffer but not the thread
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._items = collections.deque()
+                self._in_flight = []
+                self._lost_chunks = set()
+                self._cond = threading.Condition()
+                self._thread = threading.Thread(target=self._run, name='job-status-publisher', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _put(self, item, terminal=False):
+        self._ensure_thread()
+        with self._cond:
+            if not terminal and len(self._items) >= self.max_size:
+                self.dropped += 1
+                metrics.error('publisher_overflow')
+                return False
+            self._items.append(item)
+            self._cond.notify_all()
+        return True
+
+    def publish(self, job_id: str, message_str: str):
+        """Buffer a status message."""
+        return self._put(('publish', job_id, message_str))
+
+    def update(self, key: str, mapping: dict):
+        """Buffer a status hash update."""
+        return self._put(('update', key, mapping))
+
+    def chunk(self, job_status, index: int, mapping: dict, message_str: str):
+        """Buffer a result chunk and the chunk count in MULTI/EXEC, then its announcement."""
+        self._put(('chunk', job_status, index, mapping, message_str), terminal=True)
+
+    def complete(self, job_status, fields: dict, message_str: str):
+        """Buffer a completion: the hash fields in MULTI/EXEC, then the COMPLETE message."""
+        self._put(('complete', job_status, fields, message_str), terminal=True)
+
+    def after(self, callback):
+        """Call callback on the publisher thread once everything buffered so far is written."""
+        self._put(('call', callback), terminal=True)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._items) + len(self._in_flight)
+
+    def _run(self):
+        cond = self._cond
+        while True:
+            with cond:
+                while not self._items:
+                    cond.wait()
+                count = min(len(self._items), self.batch_size)
+                batch = [self._items.popleft() for _ in range(count)]
+                self._in_flight = batch
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"Error in status publisher: {e}")
+                traceback.print_exc()
+            with cond:
+                self._in_flight = []
+                cond.notify_all()
+
+    def _write(self, batch):
+        # Hash writes in buffer order; retention is applied once, so a retry
+        # does not offload a result again
+        if self._lost_chunks:
+            batch = [self._failed(item[1]) if item[0] == 'complete' and item[1].job_id in self._lost_chunks
+                     else item for item in batch]
+        writes = []
+        for item in batch:
+            if item[0] == 'update':
+                writes.append((item[1], item[2], [], 0))
+            elif item[0] == 'chunk':
+                job_status, index = item[1], item[2]
+                writes.append((job_status._chunk_key(index), item[3], [], 0))
+                writes.append((job_status._status_key, {'chunks': index + 1}, [], 0))
+            elif item[0] == 'complete':
+                job_status = item[1]
+                writes.append((job_status._status_key, *job_status._apply_retention(item[2])))
+
+        if writes and self._retry(lambda: self._write_store(writes), batch) is not None:
+            # Never announce a chunk or a completion whose result was not stored
+            lost = [item[1].job_id for item in batch if item[0] == 'complete']
+            if lost:
+                print(f"Results of jobs {', '.join(lost)} were not stored, completing them as failed")
+            # Jobs whose chunks were lost fail when they complete in a later batch
+            self._lost_chunks.update(item[1].job_id for item in batch if item[0] == 'chunk')
+            self._lost_chunks.difference_update(lost)
+            batch = [
+                ('complete', item[1], item[2], item[1]._failure_message("Failed to store result"))
+                if item[0] == 'complete' else item
+                for item in batch if item[0] != 'chunk'
+            ]
+        if self._retry(lambda: self._write_messages(batch), batch) is not None:
+            lost = [item[1].job_id for item in batch if item[0] == 'complete']
+            if lost:
+                print(f"COMPLETE of jobs {', '.join(lost)} was not published")
+
+        for item in batch:
+            if item[0] == 'call':
+                try:
+                    item[1]()
+                except Exception as e:
+                    print(f"Error in status publisher callback: {e}")
+
+    def _failed(self, job_status):
+        """Completion of a job that lost a chunk of its result."""
+        self._lost_chunks.discard(job_status.job_id)
+        print(f"Result of job {job_status.job_id} is missing chunks, completing it as failed")
+        error_info = "Failed to store result"
+        return ('complete', job_status, {'error': error_info, 'status': 'COMPLETE'},
+                job_status._failure_message(error_info))
+
+    def _write_store(self, writes):
+        started = time.perf_counter()
+        pipe = self.keydb_connection.pipeline(transaction=True)
+        for status_key, fields, expire_keys, ttl in writes:
+            pipe.hset(status_key, mapping=fields)
+            for expire_key in expire_keys:
+                pipe.expire(expire_key, ttl)
+        pipe.execute()
+        metrics.phases['keydb_write'].observe(time.perf_counter() - started)
+
+    def _write_messages(self, batch):
+        started = time.perf_counter()
+        pipe = self.redis_connection.pipeline(transaction=False)
+        published = 0
+        for item in batch:
+            if item[0] == 'publish':
+                _, job_id, message_str = item
+            elif item[0] == 'chunk':
+                job_id, message_str = item[1].job_id, item[4]
+            elif item[0] == 'complete':
+                job_id, message_str = item[1].job_id, item[3]
+            else:
+                continue
+            events.transport.add(pipe, job_id, message_str)
+            published += len(message_str)
+        if published:
+            pipe.execute()
+            metrics.bytes_published.inc(published)
+            metrics.phases['publish'].observe(time.perf_counter() - started)
+
+    def _retry(self, write, batch):
+        """
+        Run write until it succeeds, backing off while the server is unreachable.
+
+        :return: None once written, or the error that made the batch be dropped
+        """
+        backoff = 0.05
+        while True:
+            try:
+                write()
+                return None
+            except (ConnectionError, TimeoutError) as e:
+                if backoff == 0.05:
+                    print(f"Status updates delayed, retrying: {e}")
+                metrics.error('publisher_retry')
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            except Exception as e:
+                # Not transient, retrying would block every later update
+                metrics.error('publisher')
+                print(f"Error writing {len(batch)} status updates, dropping them: {e}")
+                return e
+
+    def flush(self, timeout=None) -> bool:
+        """
+        Wait until everything buffered is written.
+
+        :return: False if updates are still pending after timeout; pending
+            completions are reported by job id
+        """
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while self._items or self._in_flight:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    lost = [item[1].job_id for item in list(self._in_flight) + list(self._items)
+                            if item[0] == 'complete']
+                    if lost:
+                        print(f"COMPLETE of jobs {', '.join(lost)} still pending after {timeout}s")
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+
+publisher = BackgroundPublisher()
+atexit.register(lambda: publisher.flush(timeout=30))
+
+
+def configure_publisher(enabled=None, max_size=None, batch_size=None, max_backoff=None):
+    """
+    Configure the background status publisher of this process.
+
+    :param enabled: Route JobStatus updates through the publisher
+    :param max_size: Maximum number of buffered non-terminal updates
+    :param batch_size: Maximum number of updates per round trip
+    :param max_backoff: Longest wait between retries in seconds
+    """
+    publisher.configure(enabled, max_size, batch_size, max_backoff)
@@ -0,0 +1,286 @@
+import os
+import threading
+import traceback
+from pathlib import Path
+from redis.exceptions import RedisError
+from job_manager_client.utils.connections import keydb_raw_conn
+
+# Seconds completed job status hashes are kept (0 keeps them forever)
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', '0'))
+# Seconds failed job status hashes are kept (defaults to JOB_RESULT_TTL)
+JOB_ERROR_TTL = int(os.getenv('JOB_ERROR_TTL', str(JOB_RESULT_TTL)))
+# Directory large results are moved to instead of KeyDB (unset keeps them in KeyDB)
+RESULT_OFFLOAD_DIR = os.getenv('RESULT_OFFLOAD_DIR') or None
+# Encoded results of at least this size are moved to RESULT_OFFLOAD_DIR
+RESULT_OFFLOAD_THRESHOLD = int(os.getenv('RESULT_OFFLOAD_THRESHOLD', str(8 * 1024 * 1024)))
+# Params of jobs that never started expire after this many seconds once the sweeper saw them
+PARAMS_GRACE_TTL = int(os.getenv('PARAMS_GRACE_TTL', '86400'))
+
+
+class FileResultStore:
+    """
+    Keeps large encoded results as files instead of in KeyDB.
+
+    The status hash stores a ``result_ref`` of the form ``file:{path}`` in
+    place of the ``result`` field.
+    """
+
+    scheme = 'file'
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def put(self, job_id: str, payload) -> str:
+        """Write a payload and return its reference."""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        path = self.directory / job_id
+        # Write to a temporary name first so readers never see a partial file
+        tmp_path = path.with_name(f'.{job_id}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return f'{self.scheme}:{path}'
+
+    @staticmethod
+    def read(ref: str) -> bytes:
+        with open(ref.split(':', 1)[1], 'rb') as f:
+            return f.read()
+
+    def sweep(self, connection):
+        """
+        Delete files whose job status hash no longer exists.
+
+        :return: Tuple of (files deleted, bytes reclaimed)
+        """
+        paths = [path for path in self.directory.iterdir() if not path.name.startswith('.')]
+        if not paths:
+            return 0, 0
+        pipe = connection.pipeline(transaction=False)
+        for path in paths:
+            pipe.exists(f'job:{path.name}:status')
+        deleted = reclaimed = 0
+        for path, exists in zip(paths, pipe.execute()):
+            if not exists:
+                try:
+                    size = path.stat().st_size
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                deleted += 1
+                reclaimed += size
+        return deleted, reclaimed
+
+
+# ref scheme -> function reading the payload
+RESULT_STORE_READERS = {
+    FileResultStore.scheme: FileResultStore.read,
+}
+
+
+def read_offloaded(ref):
+    """Read an offloaded result payload from its reference."""
+    if isinstance(ref, bytes):
+        ref = ref.decode()
+    scheme = ref.split(':', 1)[0]
+    if scheme not in RESULT_STORE_READERS:
+        raise ValueError(f"Unknown result store: {scheme}")
+    return RESULT_STORE_READERS[scheme](ref)
+
+
+class RetentionPolicy:
+    """
+    How long completed jobs are kept and where large results go.
+
+    The TTL is set in the same MULTI/EXEC that stores the completion, on the
+    status hash, the params and any result chunks of the job.
+    """
+
+    def __init__(self, result_ttl=JOB_RESULT_TTL, error_ttl=JOB_ERROR_TTL, result_store=None,
+                 offload_threshold=RESULT_OFFLOAD_THRESHOLD):
+        """
+        :param result_ttl: Seconds successful jobs are kept (0 keeps them)
+        :param error_ttl: Seconds failed jobs are kept (0 keeps them)
+        :param result_store: Store large results are moved to, e.g. FileResultStore
+        :param offload_threshold: Encoded size from which results are moved
+        """
+        self.result_ttl = result_ttl
+        self.error_ttl = error_ttl
+        self.result_store = result_store
+        self.offload_threshold = offload_threshold
+
+    def configure(self, result_ttl=None, error_ttl=None, result_store=None, offload_threshold=None):
+        if result_ttl is not None:
+            self.result_ttl = result_ttl
+        if error_ttl is not None:
+            self.error_ttl = error_ttl
+        if result_store is not None:
+            self.result_store = result_store
+        if offload_threshold is not None:
+            self.offload_threshold = offload_threshold
+
+    def ttl(self, success: bool) -> int:
+        return self.result_ttl if success else self.error_ttl
+
+    def offloads(self, size: int) -> bool:
+        return self.result_store is not None and size >= self.offload_threshold
+
+
+policy = RetentionPolicy(
+    result_store=FileResultStore(RESULT_OFFLOAD_DIR) if RESULT_OFFLOAD_DIR else None
+)
+
+
+def configure_retention(result_ttl=None, error_ttl=None, result_store=None, offload_threshold=None):
+    """
+    Configure how long completed jobs are kept in this process.
+
+    :param result_ttl: Seconds successful jobs are kept (0 keeps them)
+    :param error_ttl: Seconds failed jobs are kept (0 keeps them)
+    :param result_store: Store large results are moved to, e.g. FileResultStore
+    :param offload_threshold: Encoded size from which results are moved
+    """
+    policy.configure(result_ttl, error_ttl, result_store, offload_threshold)
+
+
+class Sweeper:
+    """
+    Cleans up job keys that nothing will read anymore, using SCAN.
+
+    - ``job:{id}:params`` of completed jobs are deleted.
+    - ``job:{id}:params`` without a status hash and without a TTL belong to
+      jobs that are queued or were lost; they get ``params_grace`` seconds to
+      be picked up before they expire.
+    - ``job:{id}:chunk:{n}`` whose status hash is gone are deleted.
+    - Offloaded result files whose status hash is gone are deleted.
+    """
+
+    def __init__(self, connection=None, params_grace=PARAMS_GRACE_TTL, batch_size=500,
+                 result_store=None):
+        """
+        :param connection: KeyDB connection without response decoding
+        :param params_grace: Seconds before params of jobs that never started expire
+        :param batch_size: Keys per SCAN call and pipeline
+        :param result_store: Store to sweep offloaded results from
+            (defaults to the retention policy's store)
+        """
+        self.connection = connection if connection is not None else keydb_raw_conn
+        self.params_grace = params_grace
+        self.batch_size = batch_size
+        self.result_store = result_store
+        self._memory_usage = True
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _scan(self, match):
+        batch = []
+        for key in self.connection.scan_iter(match=match, count=self.batch_size):
+            batch.append(key)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _sizes(self, keys, fallback):
+        """Memory used by keys, or their payload size if MEMORY USAGE is unavailable."""
+        if not keys:
+            return []
+        if self._memory_usage:
+            pipe = self.connection.pipeline(transaction=False)
+            for key in keys:
+                pipe.memory_usage(key)
+            try:
+                return [size or 0 for size in pipe.execute()]
+            except RedisError:
+                # Disabled on some managed servers, fall back for good
+                self._memory_usage = False
+        pipe = self.connection.pipeline(transaction=False)
+        for key in keys:
+            fallback(pipe, key)
+        return [size or 0 for size in pipe.execute()]
+
+    def _delete(self, keys, fallback):
+        sizes = self._sizes(keys, fallback)
+        if keys:
+            self.connection.delete(*keys)
+        return sum(sizes)
+
+    def _sweep_params(self, stats):
+        for keys in self._scan('job:*:params'):
+            pipe = self.connection.pipeline(transaction=False)
+            for key in keys:
+                pipe.ttl(key)
+                pipe.hget(key[:-len(b':params')] + b':status', 'status')
+            replies = pipe.execute()
+
+            completed, unclaimed = [], []
+            for key, ttl, status in zip(keys, replies[::2], replies[1::2]):
+                if status == b'COMPLETE':
+                    completed.append(key)
+                elif status is None and ttl == -1:
+                    unclaimed.append(key)
+
+            stats['reclaimed_bytes'] += self._delete(completed, lambda pipe, key: pipe.strlen(key))
+            stats['deleted'] += len(completed)
+            if unclaimed:
+                pipe = self.connection.pipeline(transaction=False)
+                for key in unclaimed:
+                    pipe.expire(key, self.params_grace)
+                pipe.execute()
+                stats['expiring'] += len(unclaimed)
+            stats['scanned'] += len(keys)
+
+    def _sweep_chunks(self, stats):
+        for keys in self._scan('job:*:chunk:*'):
+            pipe = self.connection.pipeline(transaction=False)
+            for key in keys:
+                pipe.exists(key.rsplit(b':chunk:', 1)[0] + b':status')
+            orphaned = [key for key, exists in zip(keys, pipe.execute()) if not exists]
+            stats['reclaimed_bytes'] += self._delete(orphaned, lambda pipe, key: pipe.hstrlen(key, 'data'))
+            stats['deleted'] += len(orphaned)
+            stats['scanned'] += len(keys)
+
+    def run_once(self) -> dict:
+        """
+        Run one sweep.
+
+        :return: Dict with the number of keys scanned, deleted and set to
+            expire, and the bytes reclaimed
+        """
+        stats = {'scanned': 0, 'deleted': 0, 'expiring': 0, 'reclaimed_bytes': 0}
+        self._sweep_params(stats)
+        self._sweep_chunks(stats)
+
+        store = self.result_store if self.result_store is not None else policy.result_store
+        if store is not None:
+            deleted, reclaimed = store.sweep(self.connection)
+            stats['deleted'] += deleted
+            stats['reclaimed_bytes'] += reclaimed
+        return stats
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                stats = self.run_once()
+                if stats['deleted'] or stats['expiring']:
+                    print(f"Sweeper deleted {stats['deleted']} keys, reclaimed "
+                          f"{stats['reclaimed_bytes']} bytes, {stats['expiring']} params set to expire")
+            except Exception as e:
+                print(f"Error sweeping job keys: {e}")
+                traceback.print_exc()
+
+    def start(self, interval=300):
+        """Sweep every interval seconds on a daemon thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,),
+                                            name='job-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,199 @@
+import os
+import abc
+import time
+from rq.utils import utcparse
+
+# Seconds a lower priority queue may go unserved while it has jobs
+QUEUE_STARVATION_TIMEOUT = float(os.getenv('QUEUE_STARVATION_TIMEOUT', '30'))
+
+
+def parse_queues(queues) -> dict:
+    """
+    Normalize a queue specification to ``{name: weight}``, highest weight first.
+
+    Accepts a dict of weights, a list of names or ``(name, weight)`` pairs,
+    or a string like ``"interactive:10,batch:1"``. Names without a weight
+    get weight 1.
+    """
+    if isinstance(queues, str):
+        queues = [entry.strip() for entry in queues.split(',') if entry.strip()]
+    if isinstance(queues, dict):
+        items = list(queues.items())
+    else:
+        items = []
+        for entry in queues:
+            if isinstance(entry, str):
+                name, _, weight = entry.partition(':')
+                items.append((name, float(weight) if weight else 1))
+            else:
+                items.append(tuple(entry))
+    for name, weight in items:
+        if weight <= 0:
+            raise ValueError(f"Weight of queue {name} must be positive")
+    return dict(sorted(items, key=lambda item: item[1], reverse=True))
+
+
+class QueueScheduler(abc.ABC):
+    """
+    Decides the order in which a worker polls its queues.
+
+    RQ takes the first job from the first non-empty queue of the order, so
+    ``order`` is called before every dequeue and ``served`` after it.
+    """
+
+    def __init__(self, weights: dict):
+        self.weights = dict(weights)
+        self._last_order = list(self.weights)
+
+    @abc.abstractmethod
+    def _names(self):
+        """Queue names in the order they should be polled."""
+
+    def order(self, queues):
+        """Return queues in the order they should be polled."""
+        by_name = {queue.name: queue for queue in queues}
+        self._last_order = [name for name in self._names() if name in by_name]
+        return [by_name[name] for name in self._last_order]
+
+    def _skipped(self, name):
+        """Queues polled before the one that served a job, which were therefore empty."""
+        if name not in self._last_order:
+            return []
+        return self._last_order[:self._last_order.index(name)]
+
+    @abc.abstractmethod
+    def served(self, name):
+        """Called after a job was taken from the named queue."""
+
+
+class PriorityScheduler(QueueScheduler):
+    """
+    Strict priority: the queue with the highest weight always goes first.
+
+    A non-empty queue that has not been served for ``starvation_timeout``
+    seconds is moved to the front, so low priority jobs still run under a
+    steady stream of high priority ones.
+    """
+
+    def __init__(self, weights: dict, starvation_timeout=QUEUE_STARVATION_TIMEOUT):
+        super().__init__(weights)
+        self.starvation_timeout = starvation_timeout
+        now = time.monotonic()
+        self._last_served = {name: now for name in self.weights}
+
+    def _names(self):
+        names = list(self.weights)
+        if not self.starvation_timeout:
+            return names
+        threshold = time.monotonic() - self.starvation_timeout
+        starved = sorted((name for name in names if self._last_served[name] < threshold),
+                         key=self._last_served.get)
+        return starved + [name for name in names if name not in starved]
+
+    def served(self, name):
+        now = time.monotonic()
+        # Queues polled first were empty, nothing in them is starving
+        for skipped in self._skipped(name):
+            self._last_served[skipped] = now
+        self._last_served[name] = now
+
+
+class WeightedScheduler(QueueScheduler):
+    """
+    Weighted fair scheduling with smooth weighted round robin.
+
+    With ``{"interactive": 10, "batch": 1}`` and both queues busy, 10 of
+    every 11 jobs come from interactive, interleaved rather than in bursts.
+    Empty queues do not build up credit.
+    """
+
+    def __init__(self, weights: dict):
+        super().__init__(weights)
+        self._current = {name: 0 for name in self.weights}
+
+    def _names(self):
+        return sorted(self.weights, key=lambda name: self._current[name] + self.weights[name], reverse=True)
+
+    def served(self, name):
+        # Only queues that may have had jobs take part in this round
+        skipped = self._skipped(name)
+        for queue_name in skipped:
+            self._current[queue_name] = 0
+        active = [queue_name for queue_name in self.weights if queue_name not in skipped]
+        for queue_name in active:
+            self._current[queue_name] += self.weights[queue_name]
+        self._current[name] -= sum(self.weights[queue_name] for queue_name in active)
+
+
+SCHEDULERS = ('priority', 'weighted')
+
+
+def make_scheduler(policy: str, weights: dict, starvation_timeout=QUEUE_STARVATION_TIMEOUT):
+    """
+    :param policy: ``priority`` or ``weighted``
+    :param weights: ``{queue name: weight}``
+    :param starvation_timeout: See PriorityScheduler
+    """
+    if policy == 'priority':
+        return PriorityScheduler(weights, starvation_timeout)
+    if policy == 'weighted':
+        return WeightedScheduler(weights)
+    raise ValueError(f"Unknown scheduling policy: {policy}")
+
+
+def queue_stats(queues, connection) -> dict:
+    """
+    Return the depth and the age of the oldest job of every queue.
+
+    :param queues: RQ queues
+    :param connection: Redis connection of the queues
+    :return: ``{name: {'depth': jobs waiting, 'oldest_wait': seconds}}``
+    """
+    pipe = connection.pipeline(transaction=False)
+    for queue in queues:
+        pipe.llen(queue.key)
+        pipe.lindex(queue.key, 0)
+    replies = pipe.execute()
+    heads = replies[1::2]
+
+    pipe = connection.pipeline(transaction=False)
+    for head in heads:
+        if head is not None:
+            job_id = head.decode() if isinstance(head, bytes) else head
+            pipe.hget(f'rq:job:{job_id}', 'enqueued_at')
+    enqueued = iter(pipe.execute())
+
+    now = time.time()
+    stats = {}
+    for queue, depth, head in zip(queues, replies[::2], heads):
+        oldest_wait = 0.0
+        if head is not None:
+            enqueued_at = next(enqueued)
+            if enqueued_at:
+                if isinstance(enqueued_at, bytes):
+                    enqueued_at = enqueued_at.decode()
+                oldest_wait = max(now - utcparse(enqueued_at).timestamp(), 0.0)
+        stats[queue.name] = {'depth': depth, 'oldest_wait': oldest_wait}
+    return stats
+
+
+def queue_stats_collector(queues, connection):
+    """
+    Metrics collector exporting queue_stats as ``job_queue_depth`` and
+    ``job_queue_oldest_wait_seconds`` gauges, see Metrics.add_collector.
+    """
+    def collect():
+        stats = queue_stats(queues, connection)
+        lines = [
+            '# HELP job_queue_depth Jobs waiting in each queue',
+            '# TYPE job_queue_depth gauge',
+        ]
+        lines += [f'job_queue_depth{{queue="{name}"}} {entry["depth"]}' for name, entry in stats.items()]
+        lines += [
+            '# HELP job_queue_oldest_wait_seconds Age of the oldest job waiting in each queue',
+            '# TYPE job_queue_oldest_wait_seconds gauge',
+        ]
+        lines += [f'job_queue_oldest_wait_seconds{{queue="{name}"}} {entry["oldest_wait"]}'
+                  for name, entry in stats.items()]
+        return lines
+    return collect
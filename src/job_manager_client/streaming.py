@@ -0,0 +1,98 @@
+import os
+import time
+from job_manager_client.utils.connections import redis_conn, keydb_raw_conn
+from job_manager_client.encoding import decode_result
+
+# Size of the pieces a large encoded result is split into
+RESULT_CHUNK_SIZE = int(os.getenv('RESULT_CHUNK_SIZE', str(1024 * 1024)))
+# Encoded results larger than this are stored as chunks instead of one field
+RESULT_CHUNK_THRESHOLD = int(os.getenv('RESULT_CHUNK_THRESHOLD', str(64 * 1024 * 1024)))
+
+
+class ChunkedResult:
+    """
+    Describes a result that was written as numbered chunks.
+
+    ``mode`` is ``items`` when every chunk holds one item yielded by the task,
+    or ``bytes`` when the chunks are consecutive slices of one encoded result
+    whose codec is ``codec``.
+    """
+
+    def __init__(self, mode: str, chunks: int, size: int, codec=None):
+        self.mode = mode
+        self.chunks = chunks
+        self.size = size
+        self.codec = codec
+
+
+def chunk_key(job_id: str, index: int) -> str:
+    return f'job:{job_id}:chunk:{index}'
+
+
+def _read_chunk(job_id, index, connection):
+    data, codec_id = connection.hmget(chunk_key(job_id, index), ['data', 'codec'])
+    if codec_id is None:
+        return data
+    return decode_result(codec_id.decode(), data)
+
+
+def iter_result_chunks(job_id: str, timeout=None, connection=None, pubsub_connection=None):
+    """
+    Lazily yield the chunks of a chunked result, waiting for new ones while
+    the job is still running.
+
+    For ``items`` results every yielded value is one decoded item; for
+    ``bytes`` results the raw slices are yielded.
+
+    :param job_id: The job id
+    :param timeout: Seconds to wait for the next chunk before raising TimeoutError
+    :param connection: KeyDB connection without response decoding
+    :param pubsub_connection: Redis connection the chunk announcements arrive on
+    """
+    connection = connection if connection is not None else keydb_raw_conn
+    pubsub_connection = pubsub_connection if pubsub_connection is not None else redis_conn
+    status_key = f'job:{job_id}:status'
+
+    # Subscribe before reading the hash so no announcement is missed
+    pubsub = pubsub_connection.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(f'job:{job_id}')
+    try:
+        index = 0
+        waiting_since = time.monotonic()
+        while True:
+            chunks, status = connection.hmget(status_key, ['chunks', 'status'])
+            chunks = int(chunks or 0)
+            while index < chunks:
+                yield _read_chunk(job_id, index, connection)
+                index += 1
+                waiting_since = time.monotonic()
+
+            if status == b'COMPLETE':
+                return
+            if timeout is not None and time.monotonic() - waiting_since > timeout:
+                raise TimeoutError(f"No new chunk for job {job_id} within {timeout}s")
+
+            # Wake up on the next announcement, re-check the hash regardless
+            pubsub.get_message(timeout=0.5)
+    finally:
+        pubsub.close()
+
+
+def read_chunked_result(job_id: str, connection=None):
+    """
+    Read a complete chunked result.
+
+    :return: A list of items for ``items`` results, or the decoded value for
+        ``bytes`` results
+    """
+    connection = connection if connection is not None else keydb_raw_conn
+    mode, chunks, codec_id = connection.hmget(f'job:{job_id}:status', ['chunked', 'chunks', 'codec'])
+    pipe = connection.pipeline(transaction=False)
+    for index in range(int(chunks or 0)):
+        pipe.hmget(chunk_key(job_id, index), ['data', 'codec'])
+    parts = pipe.execute()
+
+    if mode == b'bytes':
+        data = b''.join(data for data, _ in parts)
+        return decode_result(codec_id.decode() if codec_id else None, data)
+    return [decode_result(codec.decode(), data) if codec else data for data, codec in parts]
@@ -1,6 +1,7 @@
 import os
-from redis import Redis
-from rq import Queue
+import socket
+import threading
+import weakref
 
 JOB_QUEUE = os.getenv('JOB_QUEUE', 'default')
 
@@ -25,40 +26,270 @@ COMMON_REDIS_KWARGS = {
     'health_check_interval': 30
 }
 
-# setup queue redis (without decode_responses for RQ compatibility)
-redis_conn = Redis(
-    host=REDIS_HOST,
-    port=REDIS_PORT,
-    db=REDIS_DB,
-    password=REDIS_PASSWORD,
-    socket_timeout=5,
-    socket_connect_timeout=5,
-    retry_on_timeout=True,
-    health_check_interval=30,
-    decode_responses=False  # RQ needs this to be False
-)
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, '0').lower() in ('1', 'true', 'yes')
+
+
+def pool_kwargs_from_env(prefix: str) -> dict:
+    """
+    Read connection pool settings for a server from the environment.
+
+    Recognised variables, for prefix REDIS or KEYDB:
+
+    - ``{prefix}_MAX_CONNECTIONS``: cap on connections per process
+    - ``{prefix}_BLOCKING_POOL``: wait for a free connection instead of failing
+    - ``{prefix}_POOL_TIMEOUT``: seconds to wait for a free connection
+    - ``{prefix}_UNIX_SOCKET``: connect through a unix socket instead of TCP
+    - ``{prefix}_SOCKET_TIMEOUT`` / ``{prefix}_CONNECT_TIMEOUT``
+    - ``{prefix}_SOCKET_KEEPALIVE`` with optional ``{prefix}_KEEPALIVE_IDLE``,
+      ``{prefix}_KEEPALIVE_INTERVAL`` and ``{prefix}_KEEPALIVE_COUNT``
+
+    :param prefix: Environment variable prefix
+    :return: Keyword arguments for the connection factory
+    """
+    kwargs = {}
+    if os.getenv(f'{prefix}_MAX_CONNECTIONS'):
+        kwargs['max_connections'] = int(os.getenv(f'{prefix}_MAX_CONNECTIONS'))
+    if _env_flag(f'{prefix}_BLOCKING_POOL'):
+        kwargs['blocking_pool'] = True
+    if os.getenv(f'{prefix}_POOL_TIMEOUT'):
+        kwargs['pool_timeout'] = float(os.getenv(f'{prefix}_POOL_TIMEOUT'))
+    if os.getenv(f'{prefix}_UNIX_SOCKET'):
+        kwargs['unix_socket_path'] = os.getenv(f'{prefix}_UNIX_SOCKET')
+    if os.getenv(f'{prefix}_SOCKET_TIMEOUT'):
+        kwargs['socket_timeout'] = float(os.getenv(f'{prefix}_SOCKET_TIMEOUT'))
+    if os.getenv(f'{prefix}_CONNECT_TIMEOUT'):
+        kwargs['socket_connect_timeout'] = float(os.getenv(f'{prefix}_CONNECT_TIMEOUT'))
+
+    if _env_flag(f'{prefix}_SOCKET_KEEPALIVE'):
+        kwargs['socket_keepalive'] = True
+        options = {}
+        for suffix, option in (('IDLE', 'TCP_KEEPIDLE'), ('INTERVAL', 'TCP_KEEPINTVL'),
+                               ('COUNT', 'TCP_KEEPCNT')):
+            value = os.getenv(f'{prefix}_KEEPALIVE_{suffix}')
+            if value and hasattr(socket, option):
+                options[getattr(socket, option)] = int(value)
+        if options:
+            kwargs['socket_keepalive_options'] = options
+    return kwargs
+
+
+# queue redis (without decode_responses for RQ compatibility)
+REDIS_KWARGS = {
+    'host': REDIS_HOST,
+    'port': REDIS_PORT,
+    'db': REDIS_DB,
+    'password': REDIS_PASSWORD,
+    **COMMON_REDIS_KWARGS,
+    'decode_responses': False,  # RQ needs this to be False
+    **pool_kwargs_from_env('REDIS')
+}
 
 # keydb store used for storing job results
-keydb_conn = Redis(
-    host=KEYDB_HOST,
-    port=KEYDB_PORT,
-    db=KEYDB_DB,
-    password=KEYDB_PASSWORD,
-    **COMMON_REDIS_KWARGS
-)
+KEYDB_KWARGS = {
+    'host': KEYDB_HOST,
+    'port': KEYDB_PORT,
+    'db': KEYDB_DB,
+    'password': KEYDB_PASSWORD,
+    **COMMON_REDIS_KWARGS,
+    **pool_kwargs_from_env('KEYDB')
+}
+
+_lazy_connections = weakref.WeakSet()
+
+
+class LazyConnection:
+    """
+    Creates its client on first use instead of at import time.
+
+    Attribute access is forwarded to the client, so it can be used wherever
+    a Redis client or RQ queue is expected. Forked children create a fresh
+    client, and with it their own connection pool, on first use.
+    """
+
+    def __init__(self, factory, **kwargs):
+        """
+        :param factory: Callable building the client from kwargs
+        :param kwargs: Settings passed to the factory
+        """
+        self._factory = factory
+        self.kwargs = kwargs
+        self._client = None
+        self._lock = threading.Lock()
+        _lazy_connections.add(self)
+
+    def configure(self, **kwargs):
+        """Override settings; an existing client is replaced on next use."""
+        with self._lock:
+            self.kwargs.update(kwargs)
+            self._client = None
+
+    def get_client(self):
+        """Return the client, creating it if needed."""
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory(**self.kwargs)
+                client = self._client
+        return client
+
+    def _reset(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.get_client(), name)
+
+    def __repr__(self):
+        state = 'connected' if self._client is not None else 'not connected'
+        return f'<LazyConnection {self._factory.__name__} ({state})>'
+
+
+def _reset_after_fork():
+    for connection in list(_lazy_connections):
+        connection._reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _build_client(module, max_connections=None, blocking_pool=False, pool_timeout=20,
+                  unix_socket_path=None, **connection_kwargs):
+    """
+    Build a client with an explicitly configured connection pool.
+
+    :param module: ``redis`` or ``redis.asyncio``
+    :param max_connections: Cap on connections in the pool
+    :param blocking_pool: Use a BlockingConnectionPool that waits for a free
+        connection instead of raising when the cap is reached
+    :param pool_timeout: Seconds a blocking pool waits for a free connection
+    :param unix_socket_path: Connect through this unix socket instead of TCP
+    :param connection_kwargs: Settings for each connection
+    """
+    if unix_socket_path:
+        for key in ('host', 'port', 'socket_connect_timeout', 'socket_keepalive',
+                    'socket_keepalive_options'):
+            connection_kwargs.pop(key, None)
+        connection_kwargs['path'] = unix_socket_path
+        connection_kwargs['connection_class'] = module.UnixDomainSocketConnection
+
+    if blocking_pool:
+        pool = module.BlockingConnectionPool(
+            max_connections=max_connections or 50,
+            timeout=pool_timeout,
+            **connection_kwargs
+        )
+    else:
+        pool = module.ConnectionPool(max_connections=max_connections, **connection_kwargs)
+    return module.Redis(connection_pool=pool)
+
+
+def _create_redis(**kwargs):
+    import redis
+    return _build_client(redis, **kwargs)
+
+
+def _create_queue(name, connection):
+    from rq import Queue
+    return Queue(name, connection=connection.get_client())
+
+
+# setup queue redis
+redis_conn = LazyConnection(_create_redis, **REDIS_KWARGS)
+
+# keydb store used for storing job results
+keydb_conn = LazyConnection(_create_redis, **KEYDB_KWARGS)
+
+# keydb store without response decoding, for reading binary results
+keydb_raw_conn = LazyConnection(_create_redis, **{**KEYDB_KWARGS, 'decode_responses': False})
 
 # Queue used to receive jobs
-queue = Queue(JOB_QUEUE, connection=redis_conn)
-
-# Test connections on import
-try:
-    redis_conn.ping()
-    print("Successfully connected to Redis")
-except Exception as e:
-    print(f"Warning: Could not connect to Redis: {e}")
-
-try:
-    keydb_conn.ping()
-    print("Successfully connected to KeyDB")
-except Exception as e:
-    print(f"Warning: Could not connect to KeyDB: {e}")
+queue = LazyConnection(_create_queue, name=JOB_QUEUE, connection=redis_conn)
+
+
+def create_async_connections():
+    """
+    Create asyncio Redis and KeyDB clients with the same settings as the
+    module-level connections.
+
+    The clients bind to the event loop they are first used on, so a new pair
+    should be created for every loop.
+
+    :return: Tuple of (redis_conn, keydb_conn) asyncio clients
+    """
+    from redis import asyncio as aioredis
+
+    async_redis_conn = _build_client(aioredis, **redis_conn.kwargs)
+    async_keydb_conn = _build_client(aioredis, **keydb_conn.kwargs)
+    return async_redis_conn, async_keydb_conn
+
+
+def configure_connections(redis=None, keydb=None):
+    """
+    Override connection settings for this process.
+
+    Takes the same keys as the environment variables read by
+    pool_kwargs_from_env, plus any redis connection argument, e.g.
+    ``configure_connections(keydb={'max_connections': 32, 'blocking_pool': True})``.
+    Existing clients are replaced on their next use.
+
+    :param redis: Settings for the queue / pub-sub connection
+    :param keydb: Settings for the result store connections
+    """
+    if redis:
+        redis_conn.configure(**redis)
+        queue.configure()
+    if keydb:
+        keydb_conn.configure(**keydb)
+        keydb_raw_conn.configure(**keydb)
+
+
+def _pool_stats(pool):
+    # Blocking pools keep all connections in _connections and idle ones in a queue
+    if hasattr(pool, '_connections'):
+        created = len(pool._connections)
+        idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+    else:
+        created = pool._created_connections
+        idle = len(pool._available_connections)
+    return {
+        'blocking': hasattr(pool, '_connections'),
+        'max_connections': pool.max_connections,
+        'created': created,
+        'idle': idle,
+        'in_use': created - idle
+    }
+
+
+def pool_stats():
+    """
+    Report connection pool usage for the clients created in this process.
+
+    :return: Dict of connection name to created, idle and in-use connection counts
+    """
+    stats = {}
+    for name, connection in (('redis', redis_conn), ('keydb', keydb_conn),
+                             ('keydb_raw', keydb_raw_conn)):
+        client = connection._client
+        if client is not None:
+            stats[name] = _pool_stats(client.connection_pool)
+    return stats
+
+
+def check_connections():
+    """
+    Ping Redis and KeyDB and report the outcome.
+
+    :return: True if both servers answered
+    """
+    ok = True
+    for name, connection in (('Redis', redis_conn), ('KeyDB', keydb_conn)):
+        try:
+            connection.ping()
+            print(f"Successfully connected to {name}")
+        except Exception as e:
+            print(f"Warning: Could not connect to {name}: {e}")
+            ok = False
+    return ok
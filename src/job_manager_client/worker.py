@@ -1,87 +1,779 @@
+import gc
 import os
+import sys
 import time
 import json
+import functools
+import signal
+import inspect
+import contextlib
 import threading
+import collections
 import traceback
-from redis import Redis
-from rq import Queue, Worker, SimpleWorker
-from job_manager_client.utils.connections import redis_conn, queue, keydb_conn
-from job_manager_client.job_status import JobStatus
+from concurrent.futures import ThreadPoolExecutor
+from rq import Queue, SimpleWorker
+from rq.job import Job
+from rq.exceptions import NoSuchJobError
+from job_manager_client.utils.connections import redis_conn, queue
+from job_manager_client.job_status import JobStatus, _current_job
+from job_manager_client.pool import WorkerPool, worker_slot, rss_bytes
+from job_manager_client.params import load_params
+from job_manager_client.streaming import ChunkedResult
+from job_manager_client.encoding import EncodedResult
+from job_manager_client.metrics import metrics, queue_wait, start_metrics_server, METRICS_PORT
+from job_manager_client.publisher import publisher
+from job_manager_client.scheduling import (
+    parse_queues, make_scheduler, queue_stats_collector, SCHEDULERS, QUEUE_STARVATION_TIMEOUT
+)
+from job_manager_client import heartbeat
 
-def keepalive_loop(job_status, stop_event, interval=0.5):
-    """
-    Background thread function to send keepalive messages
-    
-    :param job_status: JobStatus instance to send keepalives
-    :param stop_event: Threading event to signal when to stop
-    :param interval: Time between keepalive messages in seconds
-    """
-    while not stop_event.is_set():
-        try:
-            job_status.send_keepalive()
-            time.sleep(interval)
-        except Exception as e:
-            print(f"Error in keepalive loop: {e}")
-            traceback.print_exc()
+# Seconds a persistent worker blocks on the queue per dequeue
+DEQUEUE_TIMEOUT = int(os.getenv('WORKER_DEQUEUE_TIMEOUT', '3'))
+# Resident memory in MB after which a worker stops taking jobs and exits to be replaced
+WORKER_MAX_RSS_MB = int(os.getenv('WORKER_MAX_RSS_MB', '0')) or None
 
-def process_job(task_function, job):
+def process_job(task_function, job, params=None, cache=None, single_flight=None, profiler=None):
     """
     Process a single job and update its status
     
     :param task_function: The function to execute
     :param job: The RQ job object
+    :param params: Params fetched ahead of time; when None they are taken
+        from the job or loaded from KeyDB
+    :param cache: Optional ResultCache. A cached result for the same params
+        completes the job without running the task, new results are cached.
+    :param single_flight: Optional SingleFlight. While a job with the same
+        params is running, wait for it and copy its outcome.
+    :param profiler: Optional Profiler. Sampled jobs run under cProfile and
+        their profile is stored under ``job:{id}:profile``.
     """
-    job_id = job.id
-    params = job.args[0] if job.args else {}
-            
-    job_status = JobStatus(job_id)
+    job_status = _new_job_status(job)
+    try:
+        return _process_job(task_function, job, job_status, params, cache, single_flight, profiler)
+    finally:
+        metrics.record_job(job_status)
+
+
+def _new_job_status(job):
+    job_status = JobStatus(job.id)
+    job_status.queue = job.origin
+    job_status.timings['queue_wait'] = queue_wait(job)
+    return job_status
+
+
+def _load_params(job, job_status):
+    started = time.perf_counter()
+    params = load_params([job])[0]
+    job_status.timings['params'] = time.perf_counter() - started
+    return params
+
+
+def _process_job(task_function, job, job_status, params, cache, single_flight, profiler):
+    if cache is not None:
+        try:
+            if params is None:
+                params = _load_params(job, job_status)
+            cached = cache.get(params)
+        except Exception as e:
+            metrics.error('cache')
+            print(f"Error reading result cache: {e}")
+            cached = None
+        if cached is not None:
+            job_status.complete(result=cached, cached=True)
+            return cached.decode()
+
     job_status.start()
-    
-    # Create and start keepalive thread
-    stop_keepalive = threading.Event()
-    keepalive_thread = threading.Thread(
-        target=keepalive_loop,
-        args=(job_status, stop_keepalive),
-        daemon=True  # Ensure thread stops if main thread crashes
-    )
-    keepalive_thread.start()
+    heartbeat.scheduler.register(job_status)
+    current_job = _current_job.set(job_status)
     
     try:
         # Check for params in KeyDB if not provided
-        if not params:
-            stored_params = keydb_conn.get(f"job:{job_id}:params")
-            if stored_params:
-                params = json.loads(stored_params)
+        if params is None:
+            params = _load_params(job, job_status)
+
+        if single_flight is not None:
+            copied = single_flight.follow(job_status, params)
+            if copied is not None:
+                result, error = copied
+                heartbeat.scheduler.unregister(job_status)
+                job_status.complete(result=result, error=error)
+                return result.decode() if isinstance(result, EncodedResult) else result
         
+        if profiler is not None and profiler.wants(params):
+            profiling = profiler.profile(job_status)
+        else:
+            profiling = contextlib.nullcontext()
+
         # Execute the task
-        result = task_function(params)
-        job_status.complete(result=result)
-        return result
+        started = time.perf_counter()
+        with profiling:
+            result = task_function(params)
+            if inspect.isgenerator(result):
+                # Stream the pieces as chunks while the job is still running
+                result = job_status.write_chunks(result)
+        job_status.timings['task'] = time.perf_counter() - started
             
     except Exception as e:
         error_info = {
             'error': str(e),
             'traceback': traceback.format_exc()
         }
+        heartbeat.scheduler.unregister(job_status)
         job_status.complete(error=error_info)
+        if single_flight is not None:
+            _release(single_flight, job_status)
+        metrics.error('task')
         print(f"Exception during job processing: {e}")
         traceback.print_exc()
         raise
     
     finally:
-        # Stop the keepalive thread
-        stop_keepalive.set()
-        keepalive_thread.join(timeout=1.0)
+        # No keepalive may follow the COMPLETE message
+        heartbeat.scheduler.unregister(job_status)
+        _current_job.reset(current_job)
+
+    if cache is not None and result is not None and not isinstance(result, ChunkedResult):
+        # Encode once for both the cache and the status hash
+        encoded = job_status.encode(result)
+        try:
+            cache.put(params, encoded)
+        except Exception as e:
+            metrics.error('cache')
+            print(f"Error writing result cache: {e}")
+        job_status.complete(result=encoded)
+    else:
+        job_status.complete(result=result)
+
+    if single_flight is not None:
+        # Released after COMPLETE, so later duplicates find the result
+        _release(single_flight, job_status)
+    return result
+
+
+def _release(single_flight, job_status):
+    if publisher.enabled:
+        # The COMPLETE is still buffered, release once it is written
+        publisher.after(lambda: single_flight.release(job_status))
+    else:
+        single_flight.release(job_status)
+
+
+def _error_info(error):
+    """Error details stored for a failed job."""
+    return {
+        'error': str(error),
+        'traceback': ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+    }
+
+
+def _run_batch(task_function, params_list):
+    """
+    Call task_function with a list of params and return one outcome per item.
+
+    If the batch call itself fails, every item is retried on its own so that
+    only the items that actually fail are reported as failed.
+
+    :return: List of (result, error_info) tuples
+    """
+    try:
+        results = task_function(params_list)
+        if not isinstance(results, (list, tuple)) or len(results) != len(params_list):
+            raise ValueError(
+                f"Batch task must return a list of {len(params_list)} results, got {type(results).__name__}"
+                + (f" of length {len(results)}" if isinstance(results, (list, tuple)) else "")
+            )
+    except Exception as e:
+        if len(params_list) == 1:
+            return [(None, _error_info(e))]
+        print(f"Exception in batch of {len(params_list)} jobs, retrying them one at a time: {e}")
+        return [outcome for params in params_list for outcome in _run_batch(task_function, [params])]
+
+    # A returned exception marks only that item as failed
+    return [(None, _error_info(result)) if isinstance(result, Exception) else (result, None)
+            for result in results]
+
+
+def process_batch(task_function, jobs, params_list=None):
+    """
+    Process several jobs with a single call of a batch task function.
+
+    Every job gets its own start message, keepalives and COMPLETE message.
+    ``task_function`` receives the list of params and must return a list of
+    results in the same order. An item may be an exception instance to fail
+    only that job.
+
+    :param task_function: The batch function to execute
+    :param jobs: The RQ job objects
+    :param params_list: Params fetched ahead of time, None where unknown
+    """
+    statuses = [JobStatus(job.id) for job in jobs]
+    for job, job_status in zip(jobs, statuses):
+        job_status.queue = job.origin
+        job_status.timings['queue_wait'] = queue_wait(job)
+        job_status.start()
+        heartbeat.scheduler.register(job_status)
+
+    timings = {}
+    try:
+        # Params that were not passed with the jobs are fetched in one round trip
+        started = time.perf_counter()
+        params_list = load_params(jobs, params_list)
+        timings['params'] = time.perf_counter() - started
+        started = time.perf_counter()
+        outcomes = _run_batch(task_function, params_list)
+        timings['task'] = time.perf_counter() - started
+    except Exception as e:
+        outcomes = [(None, _error_info(e))] * len(jobs)
+    finally:
+        # No keepalive may follow the COMPLETE messages
+        for job_status in statuses:
+            heartbeat.scheduler.unregister(job_status)
+
+    for job_status, (result, error_info) in zip(statuses, outcomes):
+        # The batch phases are shared by all its jobs
+        job_status.timings.update(timings)
+        if error_info is not None:
+            metrics.error('task')
+            print(f"Exception during job processing: {error_info['error']}")
+            job_status.complete(error=error_info)
+        else:
+            job_status.complete(result=result)
+        metrics.record_job(job_status)
+    return outcomes
+
+
+class CustomWorker(SimpleWorker):
+    """
+    RQ worker that runs each job through process_job in the current thread.
+
+    With ``prefetch`` above 1, every blocking dequeue is followed by one
+    pipelined round trip that takes up to ``prefetch - 1`` more jobs off the
+    queue, one that fetches their records and one MGET for the params of
+    those stored in KeyDB, so a busy worker pays the dequeue and params
+    latency once per batch instead of once per job. Prefetched jobs
+    that have not started when the worker stops are pushed back to the front
+    of their queue. Prefetching moves jobs with LMOVE and needs Redis 6.2 or
+    later.
+
+    ``execute`` selects how a job is run:
+
+    - ``direct``: call process_job and only remove the job from RQ's
+      intermediate queue afterwards (batched with the next prefetch). No RQ
+      registries or job status are maintained, which keeps per-job overhead
+      to a minimum.
+    - ``rq``: run process_job through RQ's own job execution, which maintains
+      the started/finished/failed registries and RQ's job status.
 
-def start_worker(task_function):
+    Once the process uses more than ``max_rss_mb`` after a job, the worker
+    stops taking jobs, returns its prefetched ones and sets ``recycle`` so it
+    can be replaced by a fresh process. With ``fork_per_job`` every job runs
+    in a forked child of the worker, which starts with a warm copy of the
+    worker and returns all memory the job allocated when it exits.
+
+    With several queues, ``queue_scheduler`` (see scheduling.make_scheduler) orders
+    them before every dequeue. Prefetched jobs come from the queue that was
+    served.
+    """
+
+    def __init__(self, *args, task_function, prefetch=1, execute='direct', dequeue_timeout=None,
+                 cache=None, single_flight=None, profiler=None, queue_scheduler=None,
+                 max_rss_mb=None, fork_per_job=False, **kwargs):
+        if execute not in ('direct', 'rq'):
+            raise ValueError(f"Unknown execute mode: {execute}")
+        if fork_per_job and execute != 'direct':
+            raise ValueError("Forking per job only supports direct execution")
+        # RQ reads dequeue_timeout while initializing
+        self._dequeue_timeout = dequeue_timeout
+        super().__init__(*args, **kwargs)
+        self.task_function = task_function
+        self.cache = cache
+        self.single_flight = single_flight
+        self.profiler = profiler
+        self.queue_scheduler = queue_scheduler
+        self.max_rss = max_rss_mb * 1024 * 1024 if max_rss_mb else None
+        self.fork_per_job = fork_per_job
+        # Set once the worker stopped to be replaced by a fresh process
+        self.recycle = False
+        self.jobs_dequeued = 0
+        self.prefetch = max(1, prefetch)
+        self.execute = execute
+        self._prefetched = collections.deque()
+        self._finished = collections.deque()
+        self._params = {}
+        self._busy = False
+
+    @property
+    def dequeue_timeout(self):
+        if self._dequeue_timeout is not None:
+            return self._dequeue_timeout
+        return super().dequeue_timeout
+
+    def _shutdown(self):
+        # RQ only defers a warm shutdown while it tracks the job itself, so
+        # direct execution has to tell it that a job is still running
+        if self._busy:
+            self._stop_requested = True
+        else:
+            super()._shutdown()
+
+    def _check_memory(self):
+        """Stop taking jobs once the process uses more than max_rss."""
+        if self.max_rss is None or self.recycle:
+            return
+        rss = rss_bytes()
+        if rss > self.max_rss:
+            print(f"Worker uses {rss // 2**20} MB, more than {self.max_rss // 2**20} MB, recycling")
+            self.recycle = True
+            self._stop_requested = True
+
+    def _flush_finished(self, pipe):
+        """Queue the removal of finished jobs from the intermediate queues on pipe."""
+        while self._finished:
+            queue_key, job_id = self._finished.popleft()
+            pipe.lrem(queue_key, 1, job_id)
+
+    def _prefetch(self, queue, count):
+        """Take up to count more jobs off queue in one pipelined round trip."""
+        pipe = self.connection.pipeline(transaction=False)
+        self._flush_finished(pipe)
+        flushed = len(pipe)
+        for _ in range(count):
+            pipe.lmove(queue.key, queue.intermediate_queue_key)
+        job_ids = [job_id.decode() for job_id in pipe.execute()[flushed:] if job_id is not None]
+        if not job_ids:
+            return
+
+        jobs = Job.fetch_many(job_ids, connection=self.connection, serializer=self.serializer)
+        for job_id, job in zip(job_ids, jobs):
+            if job is None:
+                # Deleted after it was enqueued, nothing to run
+                self._finished.append((queue.intermediate_queue_key, job_id))
+            else:
+                self._prefetched.append((job, queue))
+
+    def _return_prefetched(self):
+        """Push jobs that were prefetched but not started back to the front of their queue."""
+        if not self._prefetched:
+            return
+        pipe = self.connection.pipeline(transaction=False)
+        while self._prefetched:
+            job, queue = self._prefetched.pop()
+            self._params.pop(job.id, None)
+            pipe.lrem(queue.intermediate_queue_key, 1, job.id)
+            pipe.lpush(queue.key, job.id)
+        pipe.execute()
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        if self._prefetched:
+            # RQ counts every job it executes against max_jobs, prefetched or not
+            self.jobs_dequeued += 1
+            return self._prefetched.popleft()
+
+        if self._finished:
+            pipe = self.connection.pipeline(transaction=False)
+            self._flush_finished(pipe)
+            pipe.execute()
+
+        if self.queue_scheduler is not None:
+            self._ordered_queues = self.queue_scheduler.order(self.queues)
+        result = super().dequeue_job_and_maintain_ttl(timeout, max_idle_time)
+        if result is not None:
+            self.jobs_dequeued += 1
+        if result is not None and self.prefetch > 1:
+            self._prefetch(result[1], self.prefetch - 1)
+            self._prefetch_params([result[0]] + [job for job, _ in self._prefetched])
+        return result
+
+    def reorder_queues(self, reference_queue):
+        if self.queue_scheduler is not None:
+            self.queue_scheduler.served(reference_queue.name)
+        else:
+            super().reorder_queues(reference_queue)
+
+    def _prefetch_params(self, jobs):
+        """Load the params of jobs about to run with a single MGET."""
+        try:
+            for job, params in zip(jobs, load_params(jobs)):
+                self._params[job.id] = params
+        except Exception as e:
+            # process_job loads them again
+            metrics.error("prefetch")
+            print(f"Error prefetching job params: {e}")
+
+    def _run_job(self, job, queue):
+        try:
+            params = self._params.pop(job.id, None)
+            if self.fork_per_job:
+                return self._run_forked(job, params)
+            return process_job(self.task_function, job, params, self.cache,
+                               self.single_flight, self.profiler)
+        finally:
+            self._finished.append((queue.intermediate_queue_key, job.id))
+            self._check_memory()
+
+    def _run_forked(self, job, params):
+        """Run a job in a forked child and record its metrics in this process."""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self._forked_child(job, params, write_fd)
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb') as reader:
+            report = reader.read()
+        _, status = os.waitpid(pid, 0)
+
+        job_status = _new_job_status(job)
+        if report:
+            report = json.loads(report)
+            job_status.timings.update(report['timings'])
+            job_status.outcome = report['outcome']
+        else:
+            # The child died before finishing the job, e.g. killed for its memory
+            code = os.waitstatus_to_exitcode(status)
+            reason = f"signal {-code}" if code < 0 else f"exit code {code}"
+            metrics.error('job_process')
+            print(f"Job process of {job.id} ended with {reason}")
+            job_status.complete(error={'error': f"Job process ended with {reason}", 'traceback': ''})
+        metrics.record_job(job_status)
+        if report and report['error'] is not None:
+            raise RuntimeError(report['error'])
+
+    def _forked_child(self, job, params, write_fd):
+        """Run the job in the forked child and report its timings to the worker."""
+        code = 1
+        try:
+            # Like RQ's work horse: Ctrl+C lets the worker finish the job
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            job_status = _new_job_status(job)
+            error = None
+            try:
+                _process_job(self.task_function, job, job_status, params, self.cache,
+                             self.single_flight, self.profiler)
+            except Exception as e:
+                error = str(e)
+            publisher.flush()
+            report = {'timings': job_status.timings, 'outcome': job_status.outcome, 'error': error}
+            with os.fdopen(write_fd, 'wb') as writer:
+                writer.write(json.dumps(report).encode())
+            code = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def execute_job(self, job, queue):
+        if self.execute == 'rq':
+            # RQ's perform_job calls job._execute(), run our job processing instead
+            params = self._params.pop(job.id, None)
+            job._execute = lambda: process_job(self.task_function, job, params, self.cache,
+                                                  self.single_flight, self.profiler)
+            try:
+                return super().execute_job(job, queue)
+            finally:
+                self._check_memory()
+
+        self._busy = True
+        try:
+            return self._run_job(job, queue)
+        except Exception:
+            # Already reported to the client by process_job
+            pass
+        finally:
+            self._busy = False
+
+    def teardown(self):
+        try:
+            self._return_prefetched()
+            if self._finished:
+                pipe = self.connection.pipeline(transaction=False)
+                self._flush_finished(pipe)
+                pipe.execute()
+        except Exception as e:
+            print(f"Error returning prefetched jobs: {e}")
+        super().teardown()
+
+
+class ThreadedWorker(CustomWorker):
+    """
+    RQ worker that runs up to ``threads`` jobs at once on a bounded thread pool.
+
+    A free slot is reserved before every dequeue, so the worker never takes
+    more jobs off the queue than it has idle threads. All threads share the
+    module-level connections, whose connection pools are thread-safe.
+    """
+
+    def __init__(self, *args, threads, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.execute != 'direct':
+            raise ValueError("Threaded workers only support direct execution")
+        self._slots = threading.BoundedSemaphore(threads)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job')
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        self._slots.acquire()
+        if self.recycle:
+            # Over the memory limit while waiting for a slot
+            self._slots.release()
+            return None
+        try:
+            result = super().dequeue_job_and_maintain_ttl(timeout, max_idle_time)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        if result is None:
+            self._slots.release()
+        return result
+
+    def execute_job(self, job, queue):
+        future = self._executor.submit(self._run_job, job, queue)
+        future.add_done_callback(self._release_slot)
+
+    def _release_slot(self, future):
+        self._slots.release()
+
+    def teardown(self):
+        # Let in-flight jobs finish first, so the jobs they finish are removed
+        # from the intermediate queue with the rest
+        self._executor.shutdown(wait=True)
+        super().teardown()
+
+
+class BatchWorker(CustomWorker):
+    """
+    RQ worker that runs jobs in micro-batches through process_batch.
+
+    After a job is dequeued, up to ``batch_size - 1`` more are taken from the
+    queue, waiting at most ``max_wait_ms`` for them to arrive, and the whole
+    batch is passed to the task function in one call. Like prefetching, this
+    moves jobs with LMOVE/BLMOVE and needs Redis 6.2 or later.
+    """
+
+    def __init__(self, *args, batch_size, max_wait_ms=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.execute != 'direct':
+            raise ValueError("Batch workers only support direct execution")
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+
+    def _collect_batch(self, queue):
+        """Take up to batch_size - 1 more jobs, waiting at most max_wait for them."""
+        batch = []
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            while self._prefetched and len(batch) < self.batch_size - 1:
+                batch.append(self._prefetched.popleft())
+            missing = self.batch_size - 1 - len(batch)
+            if not missing:
+                return batch
+
+            self._prefetch(queue, missing)
+            if self._prefetched:
+                continue
+
+            # Queue is empty, block for the next job until the deadline
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return batch
+            job_id = self.connection.blmove(queue.key, queue.intermediate_queue_key, remaining)
+            if job_id is None:
+                return batch
+            job_id = job_id.decode()
+            try:
+                job = Job.fetch(job_id, connection=self.connection, serializer=self.serializer)
+            except NoSuchJobError:
+                # Deleted after it was enqueued, nothing to run
+                self._finished.append((queue.intermediate_queue_key, job_id))
+                continue
+            batch.append((job, queue))
+
+    def execute_job(self, job, queue):
+        self._busy = True
+        entries = [(job, queue)]
+        try:
+            entries += self._collect_batch(queue)
+            jobs = [job for job, _ in entries]
+            process_batch(self.task_function, jobs, [self._params.pop(job.id, None) for job in jobs])
+        except Exception as e:
+            print(f"Exception during batch processing: {e}")
+            traceback.print_exc()
+        finally:
+            self._busy = False
+            for job, queue in entries:
+                self._finished.append((queue.intermediate_queue_key, job.id))
+            self._check_memory()
+
+
+def _run_worker(task_function, threads=1, burst=True, **options):
+    """
+    Run a worker in the current process.
+
+    :param task_function: The actual function to execute for each job.
+    :param threads: Number of jobs to run at once on a thread pool.
+    :param burst: Exit once the queue is empty instead of waiting for jobs.
+    :param options: queues, scheduling, starvation_timeout, prefetch,
+        execute, dequeue_timeout, max_jobs, max_idle_time, batch_size,
+        max_wait_ms, cache, single_flight, profiler, max_rss_mb and
+        fork_per_job as described for start_worker.
+    :return: True if the worker stopped to be replaced, after max_jobs or
+        past max_rss_mb
+    """
+    max_jobs = options.pop('max_jobs', None)
+    max_idle_time = options.pop('max_idle_time', None)
+    batch_size = options.pop('batch_size', 1)
+    max_wait_ms = options.pop('max_wait_ms', 0)
+    metrics_port = options.pop('metrics_port', 0)
+    weights = options.pop('queues', None)
+    scheduling = options.pop('scheduling', 'priority')
+    starvation_timeout = options.pop('starvation_timeout', QUEUE_STARVATION_TIMEOUT)
+
+    connection = redis_conn.get_client()
+    if weights:
+        weights = parse_queues(weights)
+        queues = [Queue(name, connection=connection) for name in weights]
+        if len(queues) > 1:
+            options['queue_scheduler'] = make_scheduler(scheduling, weights, starvation_timeout)
+    else:
+        queues = [queue.get_client()]
+
+    collector = None
+    if metrics_port:
+        # Every child of a pool serves its own metrics
+        start_metrics_server(metrics_port + (worker_slot() or 0))
+        if weights:
+            collector = queue_stats_collector(queues, connection)
+            metrics.add_collector(collector)
+
+    if batch_size > 1:
+        worker = BatchWorker(queues, connection=connection, task_function=task_function,
+                             batch_size=batch_size, max_wait_ms=max_wait_ms, **options)
+    elif threads > 1:
+        worker = ThreadedWorker(queues, connection=connection, task_function=task_function,
+                                threads=threads, **options)
+    else:
+        worker = CustomWorker(queues, connection=connection, task_function=task_function, **options)
+    try:
+        worker.work(burst=burst, max_jobs=max_jobs, max_idle_time=max_idle_time)
+    finally:
+        # Buffered status updates must be written before the process exits
+        publisher.flush()
+        if collector is not None:
+            metrics.remove_collector(collector)
+    return worker.recycle or (max_jobs is not None and worker.jobs_dequeued >= max_jobs)
+
+def _with_context(task_function, context):
+    """Pass the context from a worker's init to every call of task_function."""
+    @functools.wraps(task_function)
+    def call(params):
+        return task_function(params, context)
+    return call
+
+
+def start_worker(task_function, concurrency=1, threads=1, burst=True, prefetch=1,
+                 execute='direct', dequeue_timeout=DEQUEUE_TIMEOUT, max_jobs=None,
+                 max_idle_time=None, batch_size=1, max_wait_ms=0, cache=None,
+                 single_flight=None, metrics_port=METRICS_PORT, profiler=None, queues=None,
+                 scheduling='priority', starvation_timeout=QUEUE_STARVATION_TIMEOUT,
+                 max_rss_mb=WORKER_MAX_RSS_MB, fork_per_job=False, init=None):
     """
     Starts a worker that processes jobs from the queue.
     
     :param task_function: The actual function to execute for each job.
+        With ``init`` it is called as ``task_function(params, context)``.
+    :param concurrency: Number of worker processes. With a value above 1 a
+        supervised pool of forked child processes is started, each dequeuing
+        and running jobs on its own. Crashed children are restarted and
+        SIGTERM shuts the whole pool down after the current jobs finish.
+    :param threads: Number of jobs each worker process runs at once on a
+        thread pool. Useful for I/O-bound task functions.
+    :param burst: Exit once the queue is empty. With False the worker keeps
+        running, blocking on the queue for new jobs, until it receives SIGTERM
+        or reaches max_jobs / max_idle_time.
+    :param prefetch: Number of jobs to take off the queue per round trip.
+        Values above 1 need Redis 6.2 or later.
+    :param execute: ``direct`` (minimal per-job overhead) or ``rq`` (maintain
+        RQ's job registries and status), see CustomWorker.
+    :param dequeue_timeout: Seconds a blocking dequeue waits before the worker
+        runs its maintenance and blocks again. Keep it below the socket timeout.
+    :param max_jobs: Exit after this many jobs so the process can be recycled.
+        Children of a pool are replaced by fresh ones.
+    :param max_rss_mb: Once the process uses more resident memory than this
+        after a job, stop taking jobs and exit so the process can be recycled.
+        Children of a pool are replaced by fresh ones.
+    :param fork_per_job: Run every job in a forked child of the worker, which
+        starts warm and returns all memory the job allocated when it exits.
+        Only for direct execution without threads.
+    :param init: Called once without arguments before the worker starts; its
+        return value is passed as context to every task_function call. With
+        concurrency above 1 it runs in the parent before the pool forks, so
+        children share the loaded state copy-on-write. Connections and other
+        resources that cannot be shared across fork should be opened lazily
+        in the children.
+    :param max_idle_time: Exit after this many seconds without a job.
+    :param batch_size: Run up to this many jobs with one call of
+        task_function, which then receives a list of params and returns a list
+        of results, see process_batch. max_jobs counts batches in this mode.
+        Needs Redis 6.2 or later.
+    :param max_wait_ms: How long to wait for a batch to fill up.
+    :param cache: A ResultCache to memoize results by params. Not used in
+        batch mode.
+    :param single_flight: A SingleFlight to coalesce identical jobs that run
+        at the same time. Not used in batch mode.
+    :param profiler: A Profiler to profile a sample of jobs. Not used in
+        batch mode.
+    :param metrics_port: Serve Prometheus metrics on this port (0 disables
+        it). Children of a pool use ``metrics_port + n`` for child n.
+    :param queues: Queues to take jobs from instead of the default queue,
+        with weights, e.g. ``{'interactive': 10, 'batch': 1}``,
+        ``['interactive', 'batch']`` or ``'interactive:10,batch:1'``.
+    :param scheduling: How several queues share the worker. ``priority``
+        always takes the next job from the non-empty queue with the highest
+        weight; ``weighted`` serves the queues in proportion to their weights.
+    :param starvation_timeout: With ``priority``, seconds a non-empty queue
+        may go unserved before its next job is taken first (0 disables it).
     """
-    class CustomWorker(SimpleWorker):
-        def execute_job(self, job, queue):
-            return process_job(task_function, job)
+    if batch_size > 1 and threads > 1:
+        raise ValueError("batch_size cannot be combined with threads")
+    if fork_per_job and (threads > 1 or batch_size > 1):
+        raise ValueError("fork_per_job cannot be combined with threads or batch_size")
+    if scheduling not in SCHEDULERS:
+        raise ValueError(f"Unknown scheduling policy: {scheduling}")
+
+    options = {
+        'burst': burst,
+        'prefetch': prefetch,
+        'execute': execute,
+        'dequeue_timeout': dequeue_timeout,
+        'max_jobs': max_jobs,
+        'max_idle_time': max_idle_time,
+        'batch_size': batch_size,
+        'max_wait_ms': max_wait_ms,
+        'cache': cache,
+        'single_flight': single_flight,
+        'metrics_port': metrics_port,
+        'profiler': profiler,
+        'queues': queues,
+        'scheduling': scheduling,
+        'starvation_timeout': starvation_timeout,
+        'max_rss_mb': max_rss_mb,
+        'fork_per_job': fork_per_job
+    }
+    if init is not None:
+        task_function = _with_context(task_function, init())
+        if concurrency > 1 or fork_per_job:
+            # Objects created so far are never collected, so the collector
+            # does not write to their pages and forked children keep sharing them
+            gc.freeze()
+
+    if concurrency > 1:
+        # Persistent children that exit after max_jobs / max_idle_time are replaced
+        pool = WorkerPool(_run_worker, args=(task_function, threads), kwargs=options,
+                          size=concurrency, restart_on_exit=not burst)
+        pool.run()
+        return
 
-    worker = CustomWorker([queue], connection=redis_conn)
-    worker.work(burst=True)
\ No newline at end of file
+    _run_worker(task_function, threads, **options)
@@ -0,0 +1,108 @@
+import time
+import json
+import asyncio
+from job_manager_client import start_async_worker, heartbeat
+from job_manager_client.async_worker import keepalive_task
+from job_manager_client.heartbeat import HeartbeatScheduler
+from job_manager_client.utils.connections import queue, keydb_conn, redis_conn
+
+
+def test_async_jobs_run_concurrently():
+    """Test that coroutine jobs share one event loop and overlap"""
+    
+    async def async_task(params):
+        await asyncio.sleep(1)
+        return {"index": params["index"]}
+    
+    job_ids = [f'test_async_{i}' for i in range(20)]
+    for i, job_id in enumerate(job_ids):
+        queue.enqueue(async_task, job_id=job_id, args=({"index": i},))
+    
+    start_time = time.time()
+    start_async_worker(async_task, concurrency=20)
+    elapsed = time.time() - start_time
+    
+    for i, job_id in enumerate(job_ids):
+        status = keydb_conn.hget(f'job:{job_id}:status', 'status')
+        assert status == 'COMPLETE', f"Job {job_id} did not complete"
+        result_data = json.loads(keydb_conn.hget(f'job:{job_id}:status', 'result'))
+        assert result_data == {"index": i}, "Unexpected result"
+    
+    # 20 jobs of 1s each should overlap on the event loop
+    assert elapsed < 10, "Jobs did not run concurrently"
+
+
+def test_async_job_error():
+    """Test error handling in a coroutine job"""
+    
+    async def error_task(params):
+        raise ValueError("Async test error")
+    
+    job_id = 'test_async_error'
+    queue.enqueue(error_task, job_id=job_id, args=({},))
+    
+    start_async_worker(error_task)
+    
+    error = keydb_conn.hget(f'job:{job_id}:status', 'error')
+    assert error is not None, "No error stored"
+    error_data = json.loads(error)
+    assert "Async test error" in error_data['error'], "Error message not correctly stored"
+    assert 'traceback' in error_data, "Traceback not included in error"
+
+
+def test_async_jobs_leave_intermediate_queue():
+    """Test that finished jobs are removed from RQ's intermediate queue"""
+    
+    async def quick_task(params):
+        return {"index": params["index"]}
+    
+    client = redis_conn.get_client()
+    queue.empty()
+    client.delete(queue.intermediate_queue_key)
+    # Have RQ dequeue with LMOVE as it does on Redis 6.2+
+    setattr(client, '__rq_redis_server_version', (7, 0, 0))
+    try:
+        job_ids = [f'test_async_intermediate_{i}' for i in range(5)]
+        for i, job_id in enumerate(job_ids):
+            queue.enqueue(quick_task, job_id=job_id, args=({"index": i},))
+        
+        start_async_worker(quick_task, concurrency=5)
+    finally:
+        setattr(client, '__rq_redis_server_version', None)
+    
+    for job_id in job_ids:
+        assert keydb_conn.hget(f'job:{job_id}:status', 'status') == 'COMPLETE'
+    assert client.llen(queue.intermediate_queue_key) == 0
+
+
+class RecordingStatus:
+    """Job status stub recording when keepalives are sent"""
+    
+    def __init__(self):
+        self.sent = []
+    
+    def _progress_pending(self):
+        return False
+    
+    async def send_keepalive(self, progress=None):
+        self.sent.append(time.monotonic())
+
+
+def test_keepalive_follows_heartbeat_settings(monkeypatch):
+    """Test that async keepalives use the configured interval and adaptive back-off"""
+    monkeypatch.setattr(heartbeat, 'scheduler',
+                        HeartbeatScheduler(interval=0.05, adaptive=True, backoff_after=0.3, max_interval=0.2))
+    job_status = RecordingStatus()
+    
+    async def main():
+        stop = asyncio.Event()
+        task = asyncio.create_task(keepalive_task(job_status, stop))
+        await asyncio.sleep(1.2)
+        stop.set()
+        await task
+    asyncio.run(main())
+    
+    gaps = [later - earlier for earlier, later in zip(job_status.sent, job_status.sent[1:])]
+    # Every 0.05s at first, backing off to at most 0.2s
+    assert gaps[0] < 0.1
+    assert 0.15 < gaps[-1] < 0.3
@@ -0,0 +1,84 @@
+import json
+from job_manager_client.worker import start_worker, BatchWorker
+from job_manager_client.utils.connections import queue, keydb_conn, redis_conn
+
+
+def enqueue_jobs(task, prefix, params_list):
+    queue.empty()
+    job_ids = [f'{prefix}_{i}' for i in range(len(params_list))]
+    for job_id, params in zip(job_ids, params_list):
+        keydb_conn.delete(f'job:{job_id}:status')
+        queue.enqueue(task, job_id=job_id, args=(params,))
+    return job_ids
+
+
+def test_batched_execution():
+    """Test that jobs are passed to the task in batches and results split back out"""
+    batch_sizes = []
+    
+    def double_task(params_list):
+        batch_sizes.append(len(params_list))
+        return [{"value": params["value"] * 2} for params in params_list]
+    
+    job_ids = enqueue_jobs(double_task, 'test_batch', [{"value": i} for i in range(5)])
+    start_worker(double_task, batch_size=4, max_wait_ms=50)
+    
+    assert batch_sizes == [4, 1]
+    for i, job_id in enumerate(job_ids):
+        assert keydb_conn.hget(f'job:{job_id}:status', 'status') == 'COMPLETE'
+        result = json.loads(keydb_conn.hget(f'job:{job_id}:status', 'result'))
+        assert result == {"value": i * 2}
+
+
+def test_batch_failures_are_isolated():
+    """Test that a failing item only fails its own job"""
+    
+    def picky_task(params_list):
+        if any(params.get("explode") for params in params_list) and len(params_list) > 1:
+            # Fails the whole batch, items are then retried on their own
+            raise RuntimeError("batch failed")
+        results = []
+        for params in params_list:
+            if params.get("explode"):
+                raise RuntimeError("exploded")
+            if params.get("fail"):
+                results.append(ValueError("bad item"))
+            else:
+                results.append({"ok": True})
+        return results
+    
+    params_list = [{}, {"fail": True}, {}, {"explode": True}, {}]
+    job_ids = enqueue_jobs(picky_task, 'test_batch_fail', params_list)
+    start_worker(picky_task, batch_size=5)
+    
+    errors = {job_id: keydb_conn.hget(f'job:{job_id}:status', 'error') for job_id in job_ids}
+    assert "bad item" in json.loads(errors[job_ids[1]])['error']
+    assert "exploded" in json.loads(errors[job_ids[3]])['error']
+    for index in (0, 2, 4):
+        assert errors[job_ids[index]] is None
+        assert json.loads(keydb_conn.hget(f'job:{job_ids[index]}:status', 'result')) == {"ok": True}
+
+
+
+def test_deleted_job_is_skipped():
+    """Test that a job deleted while the batch fills up is skipped without losing the others"""
+    
+    def double_task(params_list):
+        return [{"value": params["value"] * 2} for params in params_list]
+    
+    job_ids = enqueue_jobs(double_task, 'test_batch_deleted', [{"value": 1}])
+    redis_conn.rpush(queue.key, 'test_batch_deleted_missing')
+    queue.enqueue(double_task, job_id='test_batch_deleted_late', args=({"value": 2},))
+    
+    rq_queue = queue.get_client()
+    worker = BatchWorker([rq_queue], connection=redis_conn.get_client(), task_function=double_task,
+                         batch_size=3, max_wait_ms=100)
+    # Take the rest one job at a time, as if each arrived during the blocking wait
+    worker._prefetch = lambda queue, count: None
+    
+    batch = worker._collect_batch(rq_queue)
+    assert [job.id for job, _ in batch] == [job_ids[0], 'test_batch_deleted_late']
+    assert (rq_queue.intermediate_queue_key, 'test_batch_deleted_missing') in worker._finished
+    worker.teardown()
+    queue.empty()
+    redis_conn.delete(rq_queue.intermediate_queue_key)
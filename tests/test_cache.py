@@ -0,0 +1,94 @@
+import json
+import uuid
+from job_manager_client.cache import ResultCache, params_digest
+from job_manager_client.worker import start_worker
+from job_manager_client.utils.connections import redis_conn, queue, keydb_conn
+
+
+def test_params_digest_is_canonical():
+    """Test that key order does not change the digest but the version does"""
+    assert params_digest({"a": 1, "b": [1, 2]}) == params_digest({"b": [1, 2], "a": 1})
+    assert params_digest({"a": 1}, 'v1') != params_digest({"a": 1}, 'v2')
+    assert params_digest(b'{"a":1}') != params_digest({"a": 1})
+
+
+def test_cached_result_skips_task():
+    """Test that a repeated job is completed from the cache without running the task"""
+    cache = ResultCache(version=str(uuid.uuid4()), prefix=f'test_cache_{uuid.uuid4().hex}')
+    calls = []
+    
+    def counting_task(params):
+        calls.append(params)
+        return {"sum": params["a"] + params["b"]}
+    
+    queue.empty()
+    queue.enqueue(counting_task, job_id='test_cache_first', args=({"a": 1, "b": 2},))
+    start_worker(counting_task, cache=cache)
+    
+    # Collect the COMPLETE message of the repeated job
+    messages = []
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe('job:test_cache_second')
+    queue.enqueue(counting_task, job_id='test_cache_second', args=({"b": 2, "a": 1},))
+    start_worker(counting_task, cache=cache)
+    for _ in range(10):
+        message = pubsub.get_message(timeout=0.2)
+        if message is not None:
+            messages.append(json.loads(message['data']))
+    pubsub.close()
+    
+    assert len(calls) == 1, "Task ran again for identical params"
+    result = json.loads(keydb_conn.hget('job:test_cache_second:status', 'result'))
+    assert result == {"sum": 3}
+    complete = [m for m in messages if m['status'] == 'COMPLETE']
+    assert complete and complete[0]['cached'] is True
+    assert complete[0]['result'] == {"sum": 3}
+    
+    stats = cache.stats()
+    assert stats['misses'] == 1 and stats['hits'] == 1 and stats['stores'] == 1
+    assert stats['local_hits'] == 1
+
+
+def test_cache_eviction_and_shared_entries():
+    """Test that the least recently used entries are evicted and entries are shared between caches"""
+    prefix = f'test_cache_{uuid.uuid4().hex}'
+    cache = ResultCache(max_entries=2, local_size=0, prefix=prefix)
+    for i in range(3):
+        assert cache.put({"i": i}, cache_entry(i))
+    
+    other = ResultCache(local_size=0, prefix=prefix)
+    assert other.get({"i": 0}) is None, "Oldest entry was not evicted"
+    assert other.get({"i": 2}).decode() == {"value": 2}
+    assert cache.stats()['evictions'] == 1
+    assert keydb_conn.zcard(f'{prefix}:index') == 2
+
+
+def cache_entry(i):
+    from job_manager_client.encoding import EncodedResult
+    return EncodedResult('json', json.dumps({"value": i}))
+
+
+def test_none_result_is_not_cached():
+    """Test that a task returning None completes without a result when a cache is set"""
+    cache = ResultCache(version=str(uuid.uuid4()), prefix=f'test_cache_{uuid.uuid4().hex}')
+    
+    def none_task(params):
+        return None
+    
+    messages = []
+    keydb_conn.delete('job:test_cache_none:status')
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe('job:test_cache_none')
+    queue.empty()
+    queue.enqueue(none_task, job_id='test_cache_none', args=({"a": 1},))
+    start_worker(none_task, cache=cache)
+    for _ in range(10):
+        message = pubsub.get_message(timeout=0.2)
+        if message is not None:
+            messages.append(json.loads(message['data']))
+    pubsub.close()
+    
+    assert keydb_conn.hgetall('job:test_cache_none:status') == {'status': 'COMPLETE'}
+    complete = [m for m in messages if m['status'] == 'COMPLETE']
+    assert complete and 'result' not in complete[0]
+    assert cache.get({"a": 1}) is None
@@ -0,0 +1,132 @@
+import time
+import uuid
+import socket
+import asyncio
+import threading
+import pytest
+from redis import Redis
+from job_manager_client import client as client_module
+from job_manager_client.client import JobClient, AsyncJobClient, JobFailed
+from job_manager_client.worker import start_worker
+from job_manager_client.utils.connections import queue
+
+
+def double_task(params):
+    if params.get("fail"):
+        raise ValueError("failed on purpose")
+    if params.get("large"):
+        return {"data": "x" * 2_000_000}
+    return {"value": params["n"] * 2}
+
+
+def wait_in_thread(wait):
+    """Call wait on a thread, RQ workers need the main thread for their signal handlers"""
+    outcome = {}
+    
+    def run():
+        outcome['results'] = wait()
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def test_submit_many_and_wait():
+    """Test that many jobs are submitted in bulk and resolved through one subscriber"""
+    queue.empty()
+    with JobClient(double_task) as client:
+        job_ids = client.submit_many([{"n": i} for i in range(50)] + [{"fail": True}, {"large": True}])
+        waiter, outcome = wait_in_thread(lambda: client.results(job_ids, timeout=30))
+        threading.Event().wait(0.3)
+        start_worker(double_task)
+        waiter.join()
+        results = outcome['results']
+        
+        assert results[:50] == [{"value": i * 2} for i in range(50)]
+        assert isinstance(results[50], JobFailed)
+        assert "failed on purpose" in str(results[50])
+        # Too large to be sent inline, read from the status hash
+        assert len(results[51]["data"]) == 2_000_000
+        assert client._futures == {}
+
+
+def test_result_of_finished_job():
+    """Test that a job that completed before anyone waited is read from the hash"""
+    queue.empty()
+    with JobClient(double_task) as client:
+        job_id = client.submit({"n": 21})
+        failed_id = client.submit({"fail": True})
+        start_worker(double_task)
+        
+        assert client.result(job_id, timeout=5) == {"value": 42}
+        with pytest.raises(JobFailed):
+            client.result(failed_id, timeout=5)
+        with pytest.raises(TimeoutError):
+            client.result(f'test_client_missing_{uuid.uuid4().hex}', timeout=0.5)
+        # A job that timed out is no longer polled
+        assert client._futures == {}
+        assert client._waiters == {}
+
+
+def test_results_check_finished_jobs_at_once(monkeypatch):
+    """Test that waiting on many jobs checks them in KeyDB with a single pipeline"""
+    queue.empty()
+    with JobClient(double_task) as client:
+        job_ids = client.submit_many([{"n": i} for i in range(20)])
+        start_worker(double_task)
+        
+        checks = []
+        check = client._check
+        monkeypatch.setattr(client, '_check', lambda ids: checks.append(list(ids)) or check(ids))
+        assert client.results(job_ids, timeout=5) == [{"value": i * 2} for i in range(20)]
+        assert checks == [job_ids]
+
+
+def test_async_client():
+    """Test the asyncio client"""
+    queue.empty()
+    
+    submitted = threading.Event()
+    
+    async def main():
+        async with AsyncJobClient(double_task) as client:
+            job_ids = await client.submit_many([{"n": i} for i in range(10)])
+            job_ids.append(await client.submit({"large": True}))
+            submitted.set()
+            return await client.results(job_ids, timeout=30)
+    
+    waiter, outcome = wait_in_thread(lambda: asyncio.run(main()))
+    assert submitted.wait(10)
+    start_worker(double_task)
+    waiter.join()
+    results = outcome['results']
+    assert results[:10] == [{"value": i * 2} for i in range(10)]
+    assert len(results[10]["data"]) == 2_000_000
+
+
+def test_unreachable_redis(monkeypatch):
+    """Test that waiting for a result gives up when the subscriber cannot connect"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(client_module, 'redis_conn', Redis(port=port, socket_connect_timeout=0.2))
+    
+    with JobClient(double_task) as client:
+        started = time.monotonic()
+        with pytest.raises(ConnectionError):
+            client.result('test_client_unreachable', timeout=1)
+        assert time.monotonic() - started < 5
+        assert client._futures == {}
+
+
+def test_async_result_timeout():
+    """Test that an async result that timed out stops being watched"""
+    
+    async def main():
+        async with AsyncJobClient(double_task) as client:
+            with pytest.raises(TimeoutError):
+                await client.result(f'test_client_missing_{uuid.uuid4().hex}', timeout=0.5)
+            # Done callbacks run on the next loop iteration
+            await asyncio.sleep(0)
+            return dict(client._futures), dict(client._waiters)
+    
+    assert asyncio.run(main()) == ({}, {})
@@ -0,0 +1,54 @@
+import json
+import time
+import uuid
+from job_manager_client.coalesce import SingleFlight
+from job_manager_client.worker import start_worker
+from job_manager_client.utils.connections import queue, keydb_conn
+
+
+def test_identical_jobs_run_once():
+    """Test that identical jobs in flight at the same time run the task once"""
+    flight = SingleFlight(version=str(uuid.uuid4()))
+    calls = []
+    
+    def expensive_task(params):
+        calls.append(params)
+        time.sleep(1)
+        return {"square": params["n"] ** 2}
+    
+    queue.empty()
+    job_ids = [f'test_flight_{i}' for i in range(3)]
+    for job_id in job_ids:
+        keydb_conn.delete(f'job:{job_id}:status')
+        queue.enqueue(expensive_task, job_id=job_id, args=({"n": 7},))
+    
+    start_worker(expensive_task, threads=3, single_flight=flight)
+    
+    assert len(calls) == 1, f"Task ran {len(calls)} times"
+    for job_id in job_ids:
+        assert keydb_conn.hget(f'job:{job_id}:status', 'status') == 'COMPLETE'
+        assert json.loads(keydb_conn.hget(f'job:{job_id}:status', 'result')) == {"square": 49}
+    # The lock is released once the leader completed
+    assert keydb_conn.get(flight.key({"n": 7})) is None
+
+
+def test_crashed_leader_is_taken_over():
+    """Test that a job waiting on a leader that died runs the task itself"""
+    flight = SingleFlight(version=str(uuid.uuid4()), lock_ttl=0.5)
+    calls = []
+    
+    def task(params):
+        calls.append(params)
+        return {"ok": True}
+    
+    # A leader that claimed the lock and then crashed
+    keydb_conn.set(flight.key({"n": 1}), 'test_flight_ghost', px=500)
+    keydb_conn.delete('job:test_flight_ghost:status')
+    
+    queue.empty()
+    keydb_conn.delete('job:test_flight_follower:status')
+    queue.enqueue(task, job_id='test_flight_follower', args=({"n": 1},))
+    start_worker(task, single_flight=flight)
+    
+    assert len(calls) == 1, "Follower did not take over"
+    assert keydb_conn.hget('job:test_flight_follower:status', 'status') == 'COMPLETE'
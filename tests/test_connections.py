@@ -116,3 +116,77 @@ def test_connection_parameters():
     # Cleanup
     redis_conn.delete(test_key)
     keydb_conn.delete(test_key)
+
+def test_lazy_connection():
+    """Test that clients are only created on first use"""
+    from job_manager_client.utils.connections import LazyConnection, KEYDB_KWARGS, _create_redis
+    
+    lazy_conn = LazyConnection(_create_redis, **KEYDB_KWARGS)
+    assert lazy_conn._client is None, "Client created before first use"
+    
+    assert lazy_conn.ping(), "Lazy connection failed"
+    client = lazy_conn.get_client()
+    assert lazy_conn.get_client() is client, "Client not reused"
+    
+    # Reconfiguring replaces the client on next use
+    lazy_conn.configure(socket_timeout=10)
+    assert lazy_conn.get_client() is not client
+    assert lazy_conn.get_client().connection_pool.connection_kwargs['socket_timeout'] == 10
+
+def test_fresh_client_after_fork():
+    """Test that forked children do not share the parent's client"""
+    import os
+    
+    parent_client = keydb_conn.get_client()
+    pid = os.fork()
+    if pid == 0:
+        # Child: a new client must be created and usable
+        ok = keydb_conn._client is None and keydb_conn.get_client() is not parent_client
+        ok = ok and keydb_conn.ping()
+        os._exit(0 if ok else 1)
+    
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0, "Child reused the parent's client"
+    assert keydb_conn.get_client() is parent_client
+
+def test_configured_pool():
+    """Test that pool settings are applied and reported"""
+    import threading
+    from redis import BlockingConnectionPool
+    from job_manager_client.utils.connections import LazyConnection, KEYDB_KWARGS, _create_redis, _pool_stats
+    
+    lazy_conn = LazyConnection(_create_redis, **KEYDB_KWARGS)
+    lazy_conn.configure(max_connections=2, blocking_pool=True, pool_timeout=5)
+    pool = lazy_conn.get_client().connection_pool
+    assert isinstance(pool, BlockingConnectionPool)
+    assert pool.max_connections == 2
+    
+    # Four threads share the two connections without errors
+    errors = []
+    def ping():
+        try:
+            for _ in range(20):
+                lazy_conn.ping()
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=ping) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, f"Pool errors: {errors}"
+    
+    stats = _pool_stats(pool)
+    assert stats['blocking'] and stats['max_connections'] == 2
+    assert 1 <= stats['created'] <= 2
+    assert stats['in_use'] == 0
+
+def test_pool_settings_from_env(monkeypatch):
+    """Test that pool settings are read from the environment"""
+    from job_manager_client.utils.connections import pool_kwargs_from_env
+    
+    monkeypatch.setenv('TESTPOOL_MAX_CONNECTIONS', '8')
+    monkeypatch.setenv('TESTPOOL_BLOCKING_POOL', 'true')
+    monkeypatch.setenv('TESTPOOL_UNIX_SOCKET', '/tmp/keydb.sock')
+    kwargs = pool_kwargs_from_env('TESTPOOL')
+    assert kwargs == {'max_connections': 8, 'blocking_pool': True, 'unix_socket_path': '/tmp/keydb.sock'}
@@ -0,0 +1,66 @@
+import json
+import pytest
+from job_manager_client.job_status import JobStatus
+from job_manager_client.encoding import encode_result, decode_result
+from job_manager_client.utils.connections import keydb_conn, keydb_raw_conn
+
+
+def test_default_codec_unchanged():
+    """Test that dict results are still stored as plain JSON"""
+    job_id = 'test_codec_json'
+    result = {"values": [1, 2, 3]}
+    
+    job_status = JobStatus(job_id)
+    job_status.complete(result=result)
+    
+    stored = keydb_conn.hgetall(f'job:{job_id}:status')
+    assert json.loads(stored['result']) == result
+    assert stored['codec'] == 'json'
+    assert job_status.get_result() == result
+
+
+def test_bytes_result_stored_raw():
+    """Test that bytes and memoryview results are stored without conversion"""
+    data = bytes(range(256)) * 4
+    
+    for job_id, result in (('test_codec_bytes', data), ('test_codec_memoryview', memoryview(data))):
+        job_status = JobStatus(job_id)
+        job_status.complete(result=result)
+        
+        assert keydb_raw_conn.hget(f'job:{job_id}:status', 'result') == data
+        assert keydb_raw_conn.hget(f'job:{job_id}:status', 'codec') == b'raw'
+        assert job_status.get_result() == data
+
+
+@pytest.mark.parametrize('compression', ['zlib', 'lzma'])
+def test_compression_above_threshold(compression):
+    """Test that large results are compressed and decoded again"""
+    job_id = f'test_codec_{compression}'
+    result = {"data": "x" * 100000}
+    
+    job_status = JobStatus(job_id, compression=compression, compress_threshold=1000)
+    job_status.complete(result=result)
+    
+    stored = keydb_raw_conn.hget(f'job:{job_id}:status', 'result')
+    assert len(stored) < 10000, "Result was not compressed"
+    assert keydb_raw_conn.hget(f'job:{job_id}:status', 'codec') == f'json+{compression}'.encode()
+    assert job_status.get_result() == result
+
+
+def test_small_result_not_compressed():
+    """Test that results below the threshold are left alone"""
+    codec_id, payload = encode_result({"a": 1}, compression='zlib', compress_threshold=1000)
+    assert codec_id == 'json'
+    assert payload == '{"a": 1}'
+
+
+def test_unknown_codec():
+    """Test that unknown codecs are rejected up front"""
+    with pytest.raises(ValueError):
+        JobStatus('test_codec_unknown', codec='nope')
+
+
+def test_legacy_values_decode():
+    """Test decoding of results stored before codecs existed"""
+    assert decode_result(None, b'{"a": 1}') == {"a": 1}
+    assert decode_result(None, b'plain text') == 'plain text'
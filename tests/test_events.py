@@ -0,0 +1,57 @@
+import uuid
+import pytest
+from job_manager_client import events
+from job_manager_client.events import configure_status_transport, iter_status_events
+from job_manager_client.worker import start_worker
+from job_manager_client.utils.connections import queue, redis_conn
+
+
+@pytest.fixture
+def streams_transport():
+    """Send status messages to streams as well for the duration of a test"""
+    previous = (events.transport.mode, events.transport.shards)
+    configure_status_transport('both')
+    yield events.transport
+    configure_status_transport(*previous)
+
+
+def simple_task(params):
+    return {"sum": params["a"] + params["b"]}
+
+
+def test_events_can_be_read_after_completion(streams_transport):
+    """Test that a client that was not listening reads all events and can resume"""
+    job_id = f'test_events_{uuid.uuid4().hex}'
+    queue.empty()
+    queue.enqueue(simple_task, job_id=job_id, args=({"a": 1, "b": 2},))
+    start_worker(simple_task)
+    
+    received = list(iter_status_events(job_id, timeout=5))
+    statuses = [message['status'] for _, message in received]
+    assert statuses[0] == 'IN_PROGRESS'
+    assert statuses[-1] == 'COMPLETE'
+    assert received[-1][1]['result'] == {"sum": 3}
+    assert redis_conn.ttl(f'job:{job_id}:events') > 0
+    
+    # Resuming from the first event skips it
+    resumed = list(iter_status_events(job_id, last_id=received[0][0], timeout=5))
+    assert resumed == received[1:]
+
+
+def test_sharded_streams(streams_transport):
+    """Test that jobs sharing a stream only see their own events"""
+    configure_status_transport(shards=1, mode='streams')
+    job_ids = [f'test_events_{uuid.uuid4().hex}' for _ in range(2)]
+    queue.empty()
+    for i, job_id in enumerate(job_ids):
+        queue.enqueue(simple_task, job_id=job_id, args=({"a": i, "b": 0},))
+    start_worker(simple_task)
+    
+    assert streams_transport.stream_key(job_ids[0]) == streams_transport.stream_key(job_ids[1])
+    for i, job_id in enumerate(job_ids):
+        received = list(iter_status_events(job_id, timeout=5))
+        assert received[-1][1]['result'] == {"sum": i}
+    
+    with pytest.raises(TimeoutError):
+        list(iter_status_events(f'test_events_{uuid.uuid4().hex}', timeout=0.5))
+    redis_conn.delete(streams_transport.stream_key(job_ids[0]))
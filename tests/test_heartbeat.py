@@ -0,0 +1,128 @@
+import time
+import json
+import threading
+from job_manager_client.job_status import JobStatus
+from job_manager_client.heartbeat import HeartbeatScheduler
+from job_manager_client.utils.connections import redis_conn
+
+
+def collect_messages(pattern, duration):
+    """Collect messages published on channels matching pattern for duration seconds"""
+    messages = []
+    pubsub = redis_conn.pubsub()
+    pubsub.psubscribe(pattern)
+    end_time = time.time() + duration
+    while time.time() < end_time:
+        message = pubsub.get_message(timeout=0.1)
+        if message and message['type'] == 'pmessage':
+            messages.append((message['channel'].decode(), json.loads(message['data'])))
+    pubsub.punsubscribe()
+    return messages
+
+
+def test_shared_scheduler_batches_jobs():
+    """Test that one scheduler sends keepalives for many jobs"""
+    scheduler = HeartbeatScheduler(interval=0.2)
+    statuses = [JobStatus(f'test_heartbeat_{i}') for i in range(10)]
+    
+    threads_before = threading.active_count()
+    for job_status in statuses:
+        scheduler.register(job_status)
+    
+    # Only a single sender thread is started for all jobs
+    assert threading.active_count() == threads_before + 1
+    
+    messages = collect_messages('job:test_heartbeat_*', 1.0)
+    for job_status in statuses:
+        scheduler.unregister(job_status)
+    
+    for job_status in statuses:
+        keepalives = [m for channel, m in messages
+                      if channel == job_status._status_channel and m.get('keepalive')]
+        assert len(keepalives) >= 3, f"Not enough keepalives for {job_status.job_id}"
+    
+    # No keepalives after unregistering
+    assert collect_messages('job:test_heartbeat_*', 0.5) == []
+
+
+def test_adaptive_interval():
+    """Test that the adaptive interval backs off for long-running jobs"""
+    scheduler = HeartbeatScheduler(interval=0.5, adaptive=True, max_interval=4, backoff_after=10)
+    
+    assert scheduler._job_interval(5) == 0.5
+    assert scheduler._job_interval(10) == 1.0
+    assert scheduler._job_interval(25) == 2.0
+    assert scheduler._job_interval(300) == 4
+
+
+def test_progress_is_coalesced():
+    """Test that frequent progress reports are sent at most once per progress interval"""
+    from job_manager_client.utils.connections import keydb_conn
+    
+    scheduler = HeartbeatScheduler(interval=0.1, progress_interval=0.5)
+    job_status = JobStatus('test_heartbeat_progress')
+    keydb_conn.delete(job_status._status_key)
+    scheduler.register(job_status)
+    
+    stop = threading.Event()
+    def report():
+        step = 0
+        while not stop.is_set():
+            step += 1
+            job_status.progress(step, message='working', rows=step * 10)
+            time.sleep(0.001)
+    reporter = threading.Thread(target=report)
+    reporter.start()
+    
+    messages = collect_messages('job:test_heartbeat_progress', 1.6)
+    stop.set()
+    reporter.join()
+    scheduler.unregister(job_status)
+    
+    updates = [m['progress'] for _, m in messages if 'progress' in m]
+    assert 2 <= len(updates) <= 4, f"Expected coalesced progress, got {len(updates)} updates"
+    # Keepalives without progress still go out in between
+    assert len(messages) > len(updates)
+    assert all(m['keepalive'] for _, m in messages)
+    
+    stored = json.loads(keydb_conn.hget(job_status._status_key, 'progress'))
+    assert stored == updates[-1]
+    assert stored['message'] == 'working' and stored['metrics']['rows'] == stored['value'] * 10
+    keydb_conn.delete(job_status._status_key)
+
+
+class SlowConnection:
+    """Connection whose pipelines take a while to execute"""
+    
+    def __init__(self, connection, delay):
+        self.connection = connection
+        self.delay = delay
+        self.sending = threading.Event()
+    
+    def pipeline(self, **kwargs):
+        pipe = self.connection.pipeline(**kwargs)
+        execute = pipe.execute
+        
+        def slow_execute():
+            self.sending.set()
+            time.sleep(self.delay)
+            return execute()
+        pipe.execute = slow_execute
+        return pipe
+
+
+def test_unregister_does_not_wait_for_send():
+    """Test that unregistering a job returns while a keepalive batch is on the network"""
+    connection = SlowConnection(redis_conn, 1.0)
+    scheduler = HeartbeatScheduler(connection=connection, interval=0.1)
+    job_status = JobStatus('test_heartbeat_slow')
+    scheduler.register(job_status)
+    assert connection.sending.wait(5)
+    
+    started = time.monotonic()
+    scheduler.unregister(job_status)
+    assert time.monotonic() - started < 0.5
+    
+    # Once the batch in flight is sent, nothing follows for the job
+    time.sleep(1.2)
+    assert collect_messages('job:test_heartbeat_slow', 0.5) == []
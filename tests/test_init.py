@@ -0,0 +1,74 @@
+import os
+import json
+import uuid
+from job_manager_client.worker import start_worker
+from job_manager_client.utils.connections import queue, keydb_conn
+
+init_calls = []
+
+
+def load_model():
+    init_calls.append(os.getpid())
+    return {"weights": list(range(1000)), "pid": os.getpid()}
+
+
+def predict_task(params, context):
+    return {
+        "value": context["weights"][params["index"]],
+        "init_pid": context["pid"],
+        "pid": os.getpid(),
+    }
+
+
+def batch_predict_task(params_list, context):
+    return [{"value": context["weights"][params["index"]]} for params in params_list]
+
+
+def enqueue(task, count):
+    job_ids = [f'test_init_{uuid.uuid4().hex}' for _ in range(count)]
+    for i, job_id in enumerate(job_ids):
+        queue.enqueue(task, job_id=job_id, args=({"index": i * 10},))
+    return job_ids
+
+
+def result(job_id):
+    assert keydb_conn.hget(f'job:{job_id}:status', 'status') == 'COMPLETE'
+    return json.loads(keydb_conn.hget(f'job:{job_id}:status', 'result'))
+
+
+def test_init_context_is_passed():
+    """Test that init runs once and its context reaches every job"""
+    queue.empty()
+    init_calls.clear()
+    job_ids = enqueue(predict_task, 3)
+
+    start_worker(predict_task, init=load_model)
+
+    assert init_calls == [os.getpid()]
+    assert [result(job_id)["value"] for job_id in job_ids] == [0, 10, 20]
+
+
+def test_init_runs_before_fork():
+    """Test that a pool initializes once in the parent and children inherit the context"""
+    queue.empty()
+    init_calls.clear()
+    job_ids = enqueue(predict_task, 4)
+
+    start_worker(predict_task, concurrency=2, init=load_model)
+
+    assert init_calls == [os.getpid()]
+    for i, job_id in enumerate(job_ids):
+        data = result(job_id)
+        assert data["value"] == i * 10
+        assert data["init_pid"] == os.getpid()
+        assert data["pid"] != os.getpid()
+
+
+def test_init_with_batches():
+    """Test that batch task functions receive the context too"""
+    queue.empty()
+    job_ids = enqueue(batch_predict_task, 4)
+
+    start_worker(batch_predict_task, batch_size=4, init=load_model)
+
+    assert [result(job_id)["value"] for job_id in job_ids] == [0, 10, 20, 30]
@@ -0,0 +1,70 @@
+import json
+from job_manager_client.job_status import JobStatus
+from job_manager_client.utils.connections import redis_conn, keydb_conn
+
+
+def complete_and_collect(job_id, **kwargs):
+    """Call complete() on a fresh JobStatus and return the published message"""
+    pubsub = redis_conn.pubsub()
+    pubsub.subscribe(f'job:{job_id}')
+    pubsub.get_message(timeout=1)  # subscription message
+    
+    JobStatus(job_id).complete(**kwargs)
+    
+    message = pubsub.get_message(timeout=1)
+    pubsub.unsubscribe()
+    assert message is not None, "No COMPLETE message received"
+    return json.loads(message['data'])
+
+
+def test_complete_with_dict_result():
+    """Test that the stored and published result match"""
+    job_id = 'test_complete_dict'
+    result = {"values": [1, 2, 3], "name": "test"}
+    
+    message = complete_and_collect(job_id, result=result)
+    
+    assert message['status'] == 'COMPLETE'
+    assert message['success'] is True
+    assert message['result'] == result
+    assert message['result_size'] == len(json.dumps(result))
+    assert message['result_key'] == f'job:{job_id}:status'
+    
+    stored = keydb_conn.hgetall(f'job:{job_id}:status')
+    assert stored['status'] == 'COMPLETE'
+    assert json.loads(stored['result']) == result
+
+
+def test_complete_with_scalar_result():
+    """Test that non-container results keep their string form in the hash"""
+    job_id = 'test_complete_scalar'
+    
+    message = complete_and_collect(job_id, result="done")
+    
+    assert message['result'] == "done"
+    assert keydb_conn.hget(f'job:{job_id}:status', 'result') == "done"
+
+
+def test_complete_with_error():
+    """Test that errors are stored and published"""
+    job_id = 'test_complete_error'
+    error = {"error": "boom", "traceback": "..."}
+    
+    message = complete_and_collect(job_id, error=error)
+    
+    assert message['success'] is False
+    assert message['error'] == error
+    assert json.loads(keydb_conn.hget(f'job:{job_id}:status', 'error')) == error
+    assert keydb_conn.hget(f'job:{job_id}:status', 'status') == 'COMPLETE'
+
+
+def test_large_result_not_inlined():
+    """Test that large results are only referenced in the message"""
+    job_id = 'test_complete_large'
+    result = {"data": "x" * 1000000}
+    
+    message = complete_and_collect(job_id, result=result)
+    
+    assert 'result' not in message
+    assert message['result_size'] > 1000000
+    assert json.loads(keydb_conn.hget(f'job:{job_id}:status', 'result')) == result
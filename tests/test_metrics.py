@@ -0,0 +1,106 @@
+import uuid
+import socket
+import urllib.request
+from rq import Queue
+from job_manager_client.metrics import Metrics, Histogram, metrics, start_metrics_server
+from job_manager_client.worker import start_worker
+from job_manager_client.utils.connections import queue, redis_conn
+
+
+def test_histogram_buckets():
+    """Test that observations are counted into cumulative buckets"""
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    
+    cumulative, total, count = histogram.snapshot()
+    assert cumulative == [2, 3, 4]
+    assert count == 4
+    assert abs(total - 2.65) < 1e-9
+
+
+def test_render_prometheus_text():
+    """Test that the registry renders the Prometheus text format"""
+    registry = Metrics(buckets=(1.0,))
+    registry.phases['task'].observe(0.5)
+    registry.keepalives_sent.inc(3)
+    registry.error('cache')
+    
+    text = registry.render()
+    assert 'job_phase_seconds_bucket{phase="task",le="1.0"} 1' in text
+    assert 'job_phase_seconds_count{phase="task"} 1' in text
+    assert 'job_keepalives_sent_total 3' in text
+    assert 'job_errors_total{kind="cache"} 1' in text
+
+
+def simple_task(params):
+    return {"sum": params["a"] + params["b"]}
+
+
+def failing_task(params):
+    raise ValueError("failed on purpose")
+
+
+def test_jobs_record_phase_timings():
+    """Test that processed jobs report their phase timings to hooks and histograms"""
+    recorded = {}
+    
+    def hook(job_id, timings, outcome):
+        recorded[job_id] = (dict(timings), outcome)
+    
+    _, _, tasks_before = metrics.phases['task'].snapshot()
+    metrics.add_hook(hook)
+    try:
+        queue.empty()
+        ok_id = f'test_metrics_{uuid.uuid4().hex}'
+        failed_id = f'test_metrics_{uuid.uuid4().hex}'
+        queue.enqueue(simple_task, job_id=ok_id, args=({"a": 1, "b": 2},))
+        start_worker(simple_task)
+        queue.enqueue(failing_task, job_id=failed_id, args=({"a": 1},))
+        start_worker(failing_task)
+    finally:
+        metrics.remove_hook(hook)
+    
+    timings, outcome = recorded[ok_id]
+    assert outcome == 'success'
+    for phase in ('queue_wait', 'task', 'serialize', 'keydb_write', 'publish'):
+        assert timings[phase] >= 0, f"Missing {phase} timing"
+    assert recorded[failed_id][1] == 'error'
+    
+    _, _, tasks_after = metrics.phases['task'].snapshot()
+    assert tasks_after - tasks_before == 1
+
+
+def test_metrics_endpoint():
+    """Test that the metrics server serves the registry"""
+    server = start_metrics_server(0, '127.0.0.1')
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+            assert response.status == 200
+            body = response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    assert '# TYPE job_phase_seconds histogram' in body
+    assert 'job_completed_total{outcome="success"}' in body
+
+
+def test_repeated_workers_share_metrics_server():
+    """Test that several start_worker calls in one process reuse the metrics server"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    rq_queue = Queue(f'test_metrics_{uuid.uuid4().hex}', connection=redis_conn.get_client())
+    collectors = len(metrics._collectors)
+    
+    for _ in range(2):
+        rq_queue.enqueue(simple_task, args=({"a": 1, "b": 2},))
+        start_worker(simple_task, metrics_port=port, queues=[rq_queue.name])
+        assert len(metrics._collectors) == collectors
+    
+    server = start_metrics_server(port)
+    assert start_metrics_server(port) is server
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+        assert response.status == 200
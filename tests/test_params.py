@@ -0,0 +1,65 @@
+import json
+from job_manager_client.params import encode_params, decode_params, store_params, load_params
+from job_manager_client.worker import start_worker
+from job_manager_client.utils.connections import queue, keydb_conn, keydb_raw_conn
+
+
+def test_params_encoding():
+    """Test that params blobs round trip and plain JSON stays unchanged"""
+    params = {"values": list(range(100))}
+    
+    assert encode_params(params) == json.dumps(params)
+    assert decode_params(json.dumps(params).encode()) == params
+    
+    compressed = encode_params(params, compression='zlib')
+    assert compressed.startswith(b'\x00json+zlib\x00')
+    assert decode_params(compressed) == params
+    
+    blob = bytes(range(256)) * 10
+    assert decode_params(encode_params(blob)) == blob
+
+
+def test_worker_prefetches_stored_params():
+    """Test that a prefetching worker reads stored, binary and compressed params"""
+    received = {}
+    
+    def params_task(params):
+        if isinstance(params, bytes):
+            received['binary'] = params
+            return {"size": len(params)}
+        return {"index": params["index"]}
+    
+    queue.empty()
+    job_ids = [f'test_params_{i}' for i in range(4)]
+    for i, job_id in enumerate(job_ids):
+        keydb_conn.delete(f'job:{job_id}:status')
+        store_params(job_id, {"index": i}, compression='zlib' if i % 2 else None)
+        queue.enqueue(params_task, job_id=job_id)
+    
+    blob = b'\x00\x01binary input' * 1000
+    store_params('test_params_binary', blob, compression='zlib')
+    keydb_conn.delete('job:test_params_binary:status')
+    queue.enqueue(params_task, job_id='test_params_binary')
+    
+    start_worker(params_task, prefetch=5)
+    
+    for i, job_id in enumerate(job_ids):
+        result = json.loads(keydb_conn.hget(f'job:{job_id}:status', 'result'))
+        assert result == {"index": i}
+    assert received['binary'] == blob
+
+
+def test_load_params_single_round_trip():
+    """Test that params of several jobs come back in job order"""
+    class FakeJob:
+        def __init__(self, job_id, args=()):
+            self.id = job_id
+            self.args = args
+    
+    store_params('test_load_params_a', {"a": 1})
+    store_params('test_load_params_c', b'raw', codec='raw')
+    jobs = [FakeJob('test_load_params_a'), FakeJob('test_load_params_b', ({"b": 2},)),
+            FakeJob('test_load_params_c'), FakeJob('test_load_params_missing')]
+    
+    assert load_params(jobs) == [{"a": 1}, {"b": 2}, b'raw', {}]
+    keydb_raw_conn.delete('job:test_load_params_a:params', 'job:test_load_params_c:params')
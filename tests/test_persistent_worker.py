@@ -0,0 +1,125 @@
+import os
+import time
+import signal
+from job_manager_client.worker import start_worker
+from job_manager_client.utils.connections import redis_conn, queue, keydb_conn
+
+
+def wait_for_condition(condition_func, timeout=5, interval=0.1):
+    """Helper function to wait for a condition with timeout"""
+    start_time = time.time()
+    while time.time() - start_time < timeout:
+        if condition_func():
+            return True
+        time.sleep(interval)
+    return False
+
+
+def quick_task(params):
+    return {"index": params["index"]}
+
+
+def slow_task(params):
+    time.sleep(1)
+    return {"index": params["index"]}
+
+
+def test_persistent_worker_with_prefetch():
+    """Test that a persistent worker drains the queue in prefetched batches and exits when idle"""
+    queue.empty()
+    job_ids = [f'test_persistent_{i}' for i in range(7)]
+    for i, job_id in enumerate(job_ids):
+        keydb_conn.delete(f'job:{job_id}:status')
+        queue.enqueue(quick_task, job_id=job_id, args=({"index": i},))
+    
+    start_time = time.time()
+    start_worker(quick_task, burst=False, prefetch=3, dequeue_timeout=1, max_idle_time=1)
+    assert time.time() - start_time < 10, "Worker did not exit after being idle"
+    
+    for job_id in job_ids:
+        assert keydb_conn.hget(f'job:{job_id}:status', 'status') == 'COMPLETE', f"Job {job_id} did not complete"
+    
+    # Finished jobs are removed from RQ's intermediate queue
+    assert redis_conn.llen(queue.intermediate_queue_key) == 0
+
+
+def test_max_jobs():
+    """Test that a persistent worker exits after max_jobs so it can be recycled"""
+    queue.empty()
+    job_ids = [f'test_max_jobs_{i}' for i in range(5)]
+    for i, job_id in enumerate(job_ids):
+        keydb_conn.delete(f'job:{job_id}:status')
+        queue.enqueue(quick_task, job_id=job_id, args=({"index": i},))
+    
+    start_worker(quick_task, burst=False, prefetch=2, dequeue_timeout=1, max_jobs=3)
+    
+    completed = [job_id for job_id in job_ids
+                 if keydb_conn.hget(f'job:{job_id}:status', 'status') == 'COMPLETE']
+    assert completed == job_ids[:3]
+    # The prefetched job that did not run is back at the front of the queue
+    assert queue.job_ids == job_ids[3:]
+    queue.empty()
+
+
+def test_sigterm_drains_and_returns_prefetched_jobs():
+    """Test that SIGTERM lets the running job finish and requeues prefetched jobs"""
+    queue.empty()
+    job_ids = [f'test_drain_{i}' for i in range(4)]
+    for i, job_id in enumerate(job_ids):
+        keydb_conn.delete(f'job:{job_id}:status')
+        queue.enqueue(slow_task, job_id=job_id, args=({"index": i},))
+    
+    pid = os.fork()
+    if pid == 0:
+        try:
+            start_worker(slow_task, burst=False, prefetch=4, dequeue_timeout=1)
+        finally:
+            os._exit(0)
+    
+    started = lambda: keydb_conn.hget(f'job:{job_ids[0]}:status', 'status') == 'IN_PROGRESS'
+    assert wait_for_condition(started), "First job did not start"
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
+    
+    assert keydb_conn.hget(f'job:{job_ids[0]}:status', 'status') == 'COMPLETE', "Running job was not finished"
+    for job_id in job_ids[1:]:
+        assert keydb_conn.hget(f'job:{job_id}:status', 'status') is None, f"Job {job_id} was started"
+    assert queue.job_ids == job_ids[1:], "Prefetched jobs were not returned in order"
+    queue.empty()
+
+
+def test_rq_execute_mode():
+    """Test that the rq execute mode maintains RQ's job status"""
+    queue.empty()
+    job_id = 'test_rq_execute'
+    keydb_conn.delete(f'job:{job_id}:status')
+    queue.enqueue(quick_task, job_id=job_id, args=({"index": 1},))
+    
+    start_worker(quick_task, execute='rq')
+    
+    assert keydb_conn.hget(f'job:{job_id}:status', 'status') == 'COMPLETE'
+    assert queue.fetch_job(job_id).get_status() == 'finished'
+
+
+def test_threaded_worker_stops_with_jobs_running():
+    """Test that jobs still running when a threaded worker stops are removed from the intermediate queue"""
+    def sleepy_task(params):
+        time.sleep(0.5)
+        return {"index": params["index"]}
+
+    queue.empty()
+    redis_conn.delete(queue.intermediate_queue_key)
+    job_ids = [f'test_threaded_stop_{i}' for i in range(6)]
+    for i, job_id in enumerate(job_ids):
+        keydb_conn.delete(f'job:{job_id}:status')
+        queue.enqueue(sleepy_task, job_id=job_id, args=({"index": i},))
+
+    # The worker stops after handing 3 jobs to its threads, while they still
+    # run; prefetched jobs always pass through the intermediate queue
+    start_worker(sleepy_task, threads=3, prefetch=3, burst=False, dequeue_timeout=1, max_jobs=3)
+
+    for job_id in job_ids[:3]:
+        assert keydb_conn.hget(f'job:{job_id}:status', 'status') == 'COMPLETE'
+    assert redis_conn.llen(queue.intermediate_queue_key) == 0
+    assert queue.count == 3
+    queue.empty()
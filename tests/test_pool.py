@@ -0,0 +1,75 @@
+import os
+import time
+import json
+from job_manager_client.worker import start_worker
+from job_manager_client.utils.connections import queue, keydb_conn
+
+
+def test_concurrent_workers():
+    """Test that a pool of worker processes drains the queue"""
+    
+    def pid_task(params):
+        time.sleep(0.2)
+        return {"pid": os.getpid(), "index": params["index"]}
+    
+    # Enqueue several jobs
+    job_ids = [f'test_pool_{i}' for i in range(6)]
+    for i, job_id in enumerate(job_ids):
+        queue.enqueue(pid_task, job_id=job_id, args=({"index": i},))
+    
+    # Process the jobs with two child processes
+    start_worker(pid_task, concurrency=2)
+    
+    # Verify all jobs completed
+    for i, job_id in enumerate(job_ids):
+        status = keydb_conn.hget(f'job:{job_id}:status', 'status')
+        assert status == 'COMPLETE', f"Job {job_id} did not complete"
+        result_data = json.loads(keydb_conn.hget(f'job:{job_id}:status', 'result'))
+        assert result_data["index"] == i, "Unexpected result"
+        assert result_data["pid"] != os.getpid(), "Job ran in the parent process"
+
+
+def test_crashed_worker_is_restarted():
+    """Test that a crashed child is replaced and remaining jobs still run"""
+    
+    def crash_task(params):
+        if params.get("crash"):
+            os._exit(1)
+        return {"ok": True}
+    
+    crash_id = 'test_pool_crash'
+    job_ids = [f'test_pool_after_crash_{i}' for i in range(3)]
+    queue.enqueue(crash_task, job_id=crash_id, args=({"crash": True},))
+    for job_id in job_ids:
+        queue.enqueue(crash_task, job_id=job_id, args=({},))
+    
+    start_worker(crash_task, concurrency=2)
+    
+    for job_id in job_ids:
+        status = keydb_conn.hget(f'job:{job_id}:status', 'status')
+        assert status == 'COMPLETE', f"Job {job_id} did not complete"
+
+
+def test_threaded_worker():
+    """Test that a threaded worker runs jobs concurrently in one process"""
+    
+    def io_task(params):
+        time.sleep(1)
+        return {"pid": os.getpid()}
+    
+    job_ids = [f'test_threaded_{i}' for i in range(8)]
+    for job_id in job_ids:
+        queue.enqueue(io_task, job_id=job_id, args=({},))
+    
+    start_time = time.time()
+    start_worker(io_task, threads=4)
+    elapsed = time.time() - start_time
+    
+    for job_id in job_ids:
+        status = keydb_conn.hget(f'job:{job_id}:status', 'status')
+        assert status == 'COMPLETE', f"Job {job_id} did not complete"
+        result_data = json.loads(keydb_conn.hget(f'job:{job_id}:status', 'result'))
+        assert result_data["pid"] == os.getpid(), "Job did not run in this process"
+    
+    # 8 jobs of 1s on 4 threads should take about 2s, not 8s
+    assert elapsed < 6, "Jobs did not run concurrently"
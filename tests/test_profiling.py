@@ -0,0 +1,61 @@
+import time
+import json
+import uuid
+from job_manager_client.profiling import Profiler, profile_key
+from job_manager_client.worker import start_worker
+from job_manager_client.utils.connections import queue, keydb_conn
+
+
+def busy_task(params):
+    data = [str(i) for i in range(20000)]
+    return {"count": len(data)}
+
+
+def test_requested_profile_is_stored():
+    """Test that a job asking for a profile stores one with memory statistics"""
+    profiler = Profiler(memory=True, index_key=f'test_profiles_{uuid.uuid4().hex}')
+    profiled_id = f'test_profile_{uuid.uuid4().hex}'
+    plain_id = f'test_profile_{uuid.uuid4().hex}'
+    
+    queue.empty()
+    queue.enqueue(busy_task, job_id=profiled_id, args=({"_profile": True},))
+    queue.enqueue(busy_task, job_id=plain_id, args=({"a": 1},))
+    start_worker(busy_task, profiler=profiler)
+    
+    report = json.loads(keydb_conn.get(profile_key(profiled_id)))
+    assert report['wall_time'] > 0
+    assert any('busy_task' in entry['function'] for entry in report['functions'])
+    assert report['peak_memory'] > 0
+    assert keydb_conn.ttl(profile_key(profiled_id)) > 0
+    
+    # Unsampled jobs are not profiled
+    assert keydb_conn.get(profile_key(plain_id)) is None
+    assert [job_id for job_id, _ in profiler.slowest()] == [profiled_id]
+
+
+def test_sample_rate():
+    """Test that the sample rate selects jobs"""
+    assert Profiler(sample_rate=1).wants({"a": 1})
+    assert not Profiler(sample_rate=0).wants({"a": 1})
+    assert Profiler(sample_rate=0).wants({"_profile": 1})
+
+
+def sleepy_task(params):
+    time.sleep(0.3)
+    return {"index": params["index"]}
+
+
+def test_one_profile_at_a_time():
+    """Test that concurrently sampled jobs all succeed while only one is profiled"""
+    profiler = Profiler(index_key=f'test_profiles_{uuid.uuid4().hex}')
+    job_ids = [f'test_profile_{uuid.uuid4().hex}' for _ in range(2)]
+    
+    queue.empty()
+    for i, job_id in enumerate(job_ids):
+        queue.enqueue(sleepy_task, job_id=job_id, args=({"_profile": True, "index": i},))
+    start_worker(sleepy_task, threads=2, profiler=profiler)
+    
+    for job_id in job_ids:
+        assert keydb_conn.hget(f'job:{job_id}:status', 'status') == 'COMPLETE'
+        assert keydb_conn.hget(f'job:{job_id}:status', 'error') is None
+    assert len(profiler.slowest()) == 1
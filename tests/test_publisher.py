@@ -0,0 +1,183 @@
+import json
+import uuid
+import threading
+import pytest
+from redis.exceptions import ConnectionError, ResponseError
+from job_manager_client.publisher import BackgroundPublisher, publisher, configure_publisher
+from job_manager_client import job_status as job_status_module
+from job_manager_client.job_status import JobStatus
+from job_manager_client.worker import start_worker
+from job_manager_client.utils.connections import redis_conn, keydb_conn, queue
+
+
+class FlakyConnection:
+    """Connection whose pipelines fail a number of times before working"""
+    
+    def __init__(self, connection, failures, error=ConnectionError("server restarting")):
+        self.connection = connection
+        self.failures = failures
+        self.error = error
+    
+    def pipeline(self, **kwargs):
+        pipe = self.connection.pipeline(**kwargs)
+        if self.failures:
+            self.failures -= 1
+            
+            def fail():
+                raise self.error
+            pipe.execute = fail
+        return pipe
+
+
+@pytest.fixture
+def enabled_publisher():
+    configure_publisher(enabled=True)
+    yield publisher
+    publisher.flush(timeout=10)
+    configure_publisher(enabled=False)
+
+
+def simple_task(params):
+    return {"sum": params["a"] + params["b"]}
+
+
+def test_worker_with_background_publisher(enabled_publisher):
+    """Test that jobs complete with status updates written by the publisher"""
+    job_id = f'test_publisher_{uuid.uuid4().hex}'
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(f'job:{job_id}')
+    
+    queue.empty()
+    queue.enqueue(simple_task, job_id=job_id, args=({"a": 1, "b": 2},))
+    start_worker(simple_task)
+    
+    # The worker flushed before returning
+    assert enabled_publisher.pending() == 0
+    assert keydb_conn.hget(f'job:{job_id}:status', 'status') == 'COMPLETE'
+    messages = []
+    for _ in range(10):
+        message = pubsub.get_message(timeout=0.2)
+        if message is not None:
+            messages.append(json.loads(message['data'])['status'])
+    pubsub.close()
+    assert messages == ['IN_PROGRESS', 'COMPLETE']
+
+
+def test_retries_keep_order():
+    """Test that updates are retried during an outage and applied in order"""
+    flaky = BackgroundPublisher(enabled=True, keydb_connection=FlakyConnection(keydb_conn, 3),
+                                max_backoff=0.1)
+    job_status = JobStatus(f'test_publisher_{uuid.uuid4().hex}')
+    
+    flaky.update(job_status._status_key, {'status': 'IN_PROGRESS'})
+    flaky.update(job_status._status_key, {'progress': '1'})
+    flaky.complete(job_status, {'status': 'COMPLETE', 'result': '3'}, '{"status": "COMPLETE"}')
+    released = threading.Event()
+    flaky.after(released.set)
+    
+    assert flaky.flush(timeout=10)
+    assert released.is_set()
+    stored = keydb_conn.hgetall(job_status._status_key)
+    assert stored == {'status': 'COMPLETE', 'progress': '1', 'result': '3'}
+
+
+def test_full_buffer_keeps_completions():
+    """Test that a full buffer drops progress messages but never completions"""
+    blocked = BackgroundPublisher(enabled=True, max_size=2,
+                                  redis_connection=FlakyConnection(redis_conn, 1000), max_backoff=0.05)
+    job_status = JobStatus(f'test_publisher_{uuid.uuid4().hex}')
+    
+    results = [blocked.publish(job_status.job_id, '{}') for _ in range(5)]
+    blocked.complete(job_status, {'status': 'COMPLETE'}, '{"status": "COMPLETE"}')
+    
+    assert results.count(False) >= 2
+    assert blocked.dropped == results.count(False)
+    # Still pending while the server is unreachable, and reported as such
+    assert not blocked.flush(timeout=0.3)
+    assert keydb_conn.hget(job_status._status_key, 'status') == 'COMPLETE'
+    blocked.redis_connection.failures = 0
+    assert blocked.flush(timeout=5)
+
+
+def test_rejected_store_completes_as_failed():
+    """Test that a completion whose result KeyDB rejected is not announced as a success"""
+    rejecting = BackgroundPublisher(
+        enabled=True, keydb_connection=FlakyConnection(keydb_conn, 1, ResponseError("OOM command not allowed"))
+    )
+    job_status = JobStatus(f'test_publisher_{uuid.uuid4().hex}')
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(f'job:{job_status.job_id}')
+    pubsub.get_message(timeout=0.2)
+    
+    rejecting.complete(job_status, {'status': 'COMPLETE', 'result': '3'},
+                       '{"status": "COMPLETE", "success": true}')
+    assert rejecting.flush(timeout=10)
+    
+    message = pubsub.get_message(timeout=2)
+    pubsub.close()
+    assert keydb_conn.hget(job_status._status_key, 'result') is None
+    data = json.loads(message['data'])
+    assert data['status'] == 'COMPLETE'
+    assert data['success'] is False
+
+
+def test_failed_result_completes_with_full_buffer(enabled_publisher):
+    """Test that a job whose result cannot be handled still completes when the buffer is full"""
+    max_size = enabled_publisher.max_size
+    configure_publisher(max_size=0)
+    try:
+        job_status = JobStatus(f'test_publisher_{uuid.uuid4().hex}')
+        job_status.complete(result=object())
+        assert enabled_publisher.flush(timeout=10)
+    finally:
+        configure_publisher(max_size=max_size)
+    
+    stored = keydb_conn.hgetall(job_status._status_key)
+    assert stored['status'] == 'COMPLETE'
+    assert stored['error'].startswith('Failed to handle result')
+
+
+def test_chunks_are_written_by_publisher(monkeypatch):
+    """Test that chunk writes are buffered and announced after they are stored"""
+    flaky = BackgroundPublisher(enabled=True, keydb_connection=FlakyConnection(keydb_conn, 1000),
+                                max_backoff=0.05)
+    monkeypatch.setattr(job_status_module, 'publisher', flaky)
+    job_status = JobStatus(f'test_publisher_{uuid.uuid4().hex}', chunk_size=4, chunk_threshold=8)
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(f'job:{job_status.job_id}')
+    pubsub.get_message(timeout=0.2)
+    
+    # Returns while KeyDB is unreachable, nothing is written yet
+    job_status.complete(result="0123456789")
+    assert not keydb_conn.exists(job_status._chunk_key(0))
+    flaky.keydb_connection.failures = 0
+    assert flaky.flush(timeout=10)
+    
+    messages = []
+    for _ in range(10):
+        message = pubsub.get_message(timeout=0.2)
+        if message is not None:
+            messages.append(json.loads(message['data']))
+    pubsub.close()
+    assert [m.get('chunk') for m in messages] == [0, 1, 2, None]
+    assert messages[-1]['status'] == 'COMPLETE' and messages[-1]['chunks'] == 3
+    assert job_status.get_result() == "0123456789"
+
+
+def test_rejected_chunk_completes_as_failed():
+    """Test that a job whose chunk KeyDB rejected completes as failed in a later batch"""
+    rejecting = BackgroundPublisher(
+        enabled=True, keydb_connection=FlakyConnection(keydb_conn, 1, ResponseError("OOM command not allowed"))
+    )
+    job_status = JobStatus(f'test_publisher_{uuid.uuid4().hex}')
+    
+    rejecting.chunk(job_status, 0, {'data': 'ab'}, '{"status": "IN_PROGRESS", "chunk": 0}')
+    assert rejecting.flush(timeout=10)
+    rejecting.complete(job_status, {'status': 'COMPLETE', 'chunked': 'items', 'chunks': 1},
+                       '{"status": "COMPLETE", "success": true}')
+    assert rejecting.flush(timeout=10)
+    
+    stored = keydb_conn.hgetall(job_status._status_key)
+    assert stored['status'] == 'COMPLETE'
+    assert stored['error'] == 'Failed to store result'
+    assert 'chunked' not in stored
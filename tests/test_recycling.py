@@ -0,0 +1,109 @@
+import os
+import json
+import uuid
+from job_manager_client.worker import start_worker
+from job_manager_client.metrics import metrics
+from job_manager_client.pool import rss_bytes
+from job_manager_client.utils.connections import queue, keydb_conn
+
+leaked = []
+
+
+def leaky_task(params):
+    leaked.append(params["index"])
+    return {"pid": os.getpid(), "index": params["index"]}
+
+
+def crash_task(params):
+    if params.get("crash"):
+        os._exit(3)
+    return {"ok": True}
+
+
+def enqueue(task, count, **params):
+    job_ids = [f'test_recycle_{uuid.uuid4().hex}' for _ in range(count)]
+    for i, job_id in enumerate(job_ids):
+        queue.enqueue(task, job_id=job_id, args=({"index": i, **params},))
+    return job_ids
+
+
+def status(job_id):
+    return keydb_conn.hget(f'job:{job_id}:status', 'status')
+
+
+def test_rss():
+    """Test that the resident set size is measured"""
+    assert rss_bytes() > 1024 * 1024
+
+
+def test_memory_limit_stops_worker():
+    """Test that a worker over its memory limit stops after the current job"""
+    queue.empty()
+    job_ids = enqueue(leaky_task, 4)
+
+    # Any process is over 1 MB, so the worker stops after its first job
+    start_worker(leaky_task, prefetch=3, max_rss_mb=1)
+
+    assert status(job_ids[0]) == 'COMPLETE'
+    assert all(status(job_id) is None for job_id in job_ids[1:])
+    # Prefetched jobs went back to the queue
+    assert queue.count == 3
+    queue.empty()
+
+
+def test_pool_replaces_recycled_children():
+    """Test that pool children over their memory limit are replaced until the queue is drained"""
+    queue.empty()
+    job_ids = enqueue(leaky_task, 4)
+
+    start_worker(leaky_task, concurrency=2, max_rss_mb=1)
+
+    pids = set()
+    for job_id in job_ids:
+        assert status(job_id) == 'COMPLETE'
+        pids.add(json.loads(keydb_conn.hget(f'job:{job_id}:status', 'result'))["pid"])
+    # One job per child process
+    assert len(pids) == 4
+
+
+def test_fork_per_job():
+    """Test that jobs run in forked children that leave the worker untouched"""
+    queue.empty()
+    leaked.clear()
+    completed = metrics.outcomes['success'].value
+    job_ids = enqueue(leaky_task, 3)
+
+    start_worker(leaky_task, fork_per_job=True)
+
+    for job_id in job_ids:
+        assert status(job_id) == 'COMPLETE'
+        assert json.loads(keydb_conn.hget(f'job:{job_id}:status', 'result'))["pid"] != os.getpid()
+    assert leaked == []
+    # Metrics of the children are recorded by the worker
+    assert metrics.outcomes['success'].value == completed + 3
+
+
+def test_fork_per_job_crash():
+    """Test that a job process that dies is reported as failed and the worker continues"""
+    queue.empty()
+    crashed_id, = enqueue(crash_task, 1, crash=True)
+    job_id, = enqueue(crash_task, 1)
+
+    start_worker(crash_task, fork_per_job=True)
+
+    assert status(crashed_id) == 'COMPLETE'
+    error = json.loads(keydb_conn.hget(f'job:{crashed_id}:status', 'error'))
+    assert error['error'] == 'Job process ended with exit code 3'
+    assert status(job_id) == 'COMPLETE'
+
+
+def test_pool_replaces_children_after_max_jobs_with_prefetch():
+    """Test that prefetched jobs count towards max_jobs so burst children are replaced"""
+    queue.empty()
+    job_ids = enqueue(leaky_task, 8)
+
+    start_worker(leaky_task, concurrency=2, prefetch=2, max_jobs=2)
+
+    for job_id in job_ids:
+        assert status(job_id) == 'COMPLETE'
+    assert queue.count == 0
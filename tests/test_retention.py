@@ -0,0 +1,64 @@
+import pytest
+from job_manager_client import retention
+from job_manager_client.job_status import JobStatus
+from job_manager_client.retention import FileResultStore, Sweeper, configure_retention
+from job_manager_client.utils.connections import keydb_conn
+
+
+@pytest.fixture
+def restore_policy():
+    saved = vars(retention.policy).copy()
+    yield retention.policy
+    vars(retention.policy).update(saved)
+
+
+def test_ttl_set_on_completion(restore_policy):
+    """Test that completion sets different TTLs for successful and failed jobs"""
+    configure_retention(result_ttl=600, error_ttl=60)
+    
+    for job_id in ('test_retention_ok', 'test_retention_error'):
+        keydb_conn.delete(f'job:{job_id}:status')
+        keydb_conn.set(f'job:{job_id}:params', '{"a": 1}')
+    
+    JobStatus('test_retention_ok').complete(result={"done": True})
+    JobStatus('test_retention_error').complete(error={"error": "failed"})
+    
+    assert 590 < keydb_conn.ttl('job:test_retention_ok:status') <= 600
+    assert 590 < keydb_conn.ttl('job:test_retention_ok:params') <= 600
+    assert 50 < keydb_conn.ttl('job:test_retention_error:status') <= 60
+
+
+def test_large_result_offloaded(restore_policy, tmp_path):
+    """Test that large results are moved to the result store and still readable"""
+    configure_retention(result_store=FileResultStore(tmp_path), offload_threshold=10000)
+    job_status = JobStatus('test_retention_offload')
+    keydb_conn.delete(job_status._status_key)
+    
+    result = {"data": "x" * 50000}
+    job_status.complete(result=result)
+    
+    assert keydb_conn.hget(job_status._status_key, 'result') is None
+    assert keydb_conn.hget(job_status._status_key, 'result_ref') == f'file:{tmp_path / job_status.job_id}'
+    assert job_status.get_result() == result
+    
+    # The file goes once the status hash is gone
+    keydb_conn.delete(job_status._status_key)
+    assert FileResultStore(tmp_path).sweep(keydb_conn) == (1, len('{"data": ""}') + 50000)
+
+
+def test_sweeper_cleans_orphans():
+    """Test that the sweeper removes params of completed jobs and orphaned chunks"""
+    keydb_conn.hset('job:test_sweep_done:status', 'status', 'COMPLETE')
+    keydb_conn.set('job:test_sweep_done:params', '{"a": 1}')
+    keydb_conn.delete('job:test_sweep_queued:status', 'job:test_sweep_lost:status')
+    keydb_conn.set('job:test_sweep_queued:params', '{"b": 2}')
+    keydb_conn.hset('job:test_sweep_lost:chunk:0', mapping={'data': 'x' * 1000})
+    
+    stats = Sweeper(params_grace=3600).run_once()
+    
+    assert keydb_conn.exists('job:test_sweep_done:params') == 0
+    assert keydb_conn.exists('job:test_sweep_lost:chunk:0') == 0
+    # Params of a job that has not started yet only get a grace period
+    assert 3590 < keydb_conn.ttl('job:test_sweep_queued:params') <= 3600
+    assert stats['deleted'] >= 2 and stats['expiring'] >= 1
+    assert stats['reclaimed_bytes'] >= 1000
@@ -0,0 +1,124 @@
+import time
+import uuid
+import pytest
+from types import SimpleNamespace
+from rq import Queue
+from job_manager_client.scheduling import (
+    parse_queues, QueueScheduler, PriorityScheduler, WeightedScheduler, queue_stats, queue_stats_collector
+)
+from job_manager_client.worker import start_worker
+from job_manager_client.metrics import metrics
+from job_manager_client.utils.connections import redis_conn
+
+processed = []
+
+
+def record_task(params):
+    processed.append(params["queue"])
+    return {"queue": params["queue"]}
+
+
+def make_queues(*names):
+    queues = {}
+    for name in names:
+        queues[name] = Queue(f'test_{name}_{uuid.uuid4().hex}', connection=redis_conn.get_client())
+    return queues
+
+
+def fill(queues, count):
+    for name, rq_queue in queues.items():
+        for i in range(count):
+            rq_queue.enqueue(record_task, args=({"queue": name, "i": i},))
+
+
+def test_parse_queues():
+    """Test the accepted queue specifications"""
+    assert parse_queues('batch:1,interactive:10') == {'interactive': 10, 'batch': 1}
+    assert parse_queues({'batch': 1, 'interactive': 10}) == {'interactive': 10, 'batch': 1}
+    assert parse_queues([('batch', 2), 'other']) == {'batch': 2, 'other': 1}
+
+
+def test_priority_serves_highest_weight_first():
+    """Test that strict priority drains the high priority queue first"""
+    queues = make_queues('interactive', 'batch')
+    fill(queues, 3)
+    processed.clear()
+
+    start_worker(record_task, queues={queues['interactive'].name: 10, queues['batch'].name: 1},
+                 starvation_timeout=0)
+
+    assert processed == ['interactive'] * 3 + ['batch'] * 3
+    # queue_wait is also recorded per queue
+    assert metrics.queue_waits[queues['batch'].name].snapshot()[2] == 3
+
+
+def test_weighted_shares_by_weight():
+    """Test that weighted scheduling interleaves queues in proportion to their weights"""
+    queues = make_queues('interactive', 'batch')
+    fill(queues, 6)
+    processed.clear()
+
+    start_worker(record_task, queues={queues['interactive'].name: 2, queues['batch'].name: 1},
+                 scheduling='weighted')
+
+    assert processed[:6].count('interactive') == 4
+    assert processed[:6].count('batch') == 2
+    assert sorted(processed) == ['batch'] * 6 + ['interactive'] * 6
+
+
+def test_starved_queue_goes_first():
+    """Test that a queue unserved for longer than the starvation timeout is moved to the front"""
+    queues = [SimpleNamespace(name='low'), SimpleNamespace(name='high')]
+    scheduler = PriorityScheduler({'high': 10, 'low': 1}, starvation_timeout=0.05)
+
+    assert [q.name for q in scheduler.order(queues)] == ['high', 'low']
+    scheduler.served('high')
+    time.sleep(0.1)
+    scheduler.served('high')
+    assert [q.name for q in scheduler.order(queues)] == ['low', 'high']
+
+    # low was polled first and empty, so it is not starving any more
+    scheduler.served('high')
+    assert [q.name for q in scheduler.order(queues)] == ['high', 'low']
+
+
+def test_weighted_empty_queue_gets_no_credit():
+    """Test that a queue that was empty does not catch up in a burst"""
+    queues = [SimpleNamespace(name='a'), SimpleNamespace(name='b')]
+    scheduler = WeightedScheduler({'a': 1, 'b': 1})
+
+    # Only b has jobs for a while
+    for _ in range(5):
+        scheduler.order(queues)
+        scheduler.served('b')
+    order = [q.name for q in scheduler.order(queues)]
+    scheduler.served(order[0])
+    second = [q.name for q in scheduler.order(queues)]
+    assert order[0] != second[0]
+
+
+def test_queue_stats():
+    """Test queue depth and oldest wait, also as metrics"""
+    queues = make_queues('busy', 'idle')
+    fill({'busy': queues['busy']}, 2)
+    time.sleep(0.05)
+
+    stats = queue_stats(list(queues.values()), redis_conn)
+    assert stats[queues['busy'].name]['depth'] == 2
+    assert stats[queues['busy'].name]['oldest_wait'] > 0
+    assert stats[queues['idle'].name] == {'depth': 0, 'oldest_wait': 0.0}
+
+    lines = queue_stats_collector(list(queues.values()), redis_conn)()
+    assert f'job_queue_depth{{queue="{queues["busy"].name}"}} 2' in lines
+    queues['busy'].empty()
+
+
+def test_incomplete_scheduler_is_rejected():
+    """Test that a scheduler missing a method fails when it is created"""
+
+    class OrderOnly(QueueScheduler):
+        def _names(self):
+            return list(self.weights)
+
+    with pytest.raises(TypeError):
+        OrderOnly({'a': 1})
@@ -0,0 +1,72 @@
+import time
+import threading
+from job_manager_client.worker import start_worker
+from job_manager_client.job_status import JobStatus
+from job_manager_client.streaming import iter_result_chunks
+from job_manager_client.utils.connections import queue, keydb_conn
+
+
+def test_generator_result_is_streamed():
+    """Test that a generator task writes one chunk per yielded item"""
+    
+    def generator_task(params):
+        for i in range(5):
+            yield {"index": i}
+    
+    job_id = 'test_stream_generator'
+    queue.enqueue(generator_task, job_id=job_id, args=({},))
+    
+    start_worker(generator_task)
+    
+    status = keydb_conn.hgetall(f'job:{job_id}:status')
+    assert status['status'] == 'COMPLETE'
+    assert status['chunked'] == 'items'
+    assert status['chunks'] == '5'
+    
+    items = list(iter_result_chunks(job_id))
+    assert items == [{"index": i} for i in range(5)]
+    assert JobStatus(job_id).get_result() == items
+
+
+def test_chunks_readable_while_running():
+    """Test that readers receive chunks before the job completes"""
+    
+    def slow_generator_task(params):
+        for i in range(3):
+            yield f"piece {i}"
+            time.sleep(0.5)
+    
+    job_id = 'test_stream_lazy'
+    keydb_conn.delete(f'job:{job_id}:status')
+    queue.enqueue(slow_generator_task, job_id=job_id, args=({},))
+    
+    received = []
+    
+    def read_chunks():
+        for item in iter_result_chunks(job_id, timeout=5):
+            status = keydb_conn.hget(f'job:{job_id}:status', 'status')
+            received.append((item, status))
+    
+    # The worker installs signal handlers, so it has to run in the main thread
+    reader_thread = threading.Thread(target=read_chunks)
+    reader_thread.start()
+    start_worker(slow_generator_task)
+    reader_thread.join(timeout=5)
+    
+    assert [item for item, _ in received] == ["piece 0", "piece 1", "piece 2"]
+    assert received[0][1] == 'IN_PROGRESS', "First chunk was not readable while running"
+
+
+def test_large_result_split_into_chunks():
+    """Test that results above the threshold are stored as byte chunks"""
+    job_id = 'test_stream_split'
+    result = {"data": "x" * 10000}
+    
+    job_status = JobStatus(job_id, chunk_size=1000, chunk_threshold=5000)
+    job_status.complete(result=result)
+    
+    status = keydb_conn.hgetall(f'job:{job_id}:status')
+    assert status['chunked'] == 'bytes'
+    assert int(status['chunks']) == 11
+    assert 'result' not in status
+    assert job_status.get_result() == result